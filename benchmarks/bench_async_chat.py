@@ -0,0 +1,38 @@
+"""Turns per second of AsyncChatEngine at 1, 100 and 1000 concurrent sessions.
+
+Run from the repository root: python -m benchmarks.bench_async_chat
+"""
+import asyncio
+import time
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+
+TURNS_PER_SESSION = 5
+
+
+async def run_session(engine: AsyncChatEngine, chat: Chat) -> None:
+    for turn in range(TURNS_PER_SESSION):
+        await engine.run_turn(chat, f'Pregunta {turn} sobre casas en Guadalajara')
+
+
+async def bench(sessions: int) -> float:
+    async with StubServer() as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base)
+        chats = [Chat(config=config) for _ in range(sessions)]
+        async with AsyncChatEngine(config) as engine:
+            start = time.perf_counter()
+            await asyncio.gather(*(run_session(engine, chat) for chat in chats))
+            elapsed = time.perf_counter() - start
+    return sessions * TURNS_PER_SESSION / elapsed
+
+
+def main() -> None:
+    for sessions in (1, 100, 1000):
+        print(f'{sessions:>5} sessions: {asyncio.run(bench(sessions)):>10.1f} turns/s')
+
+
+if __name__ == '__main__':
+    main()
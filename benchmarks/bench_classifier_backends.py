@@ -0,0 +1,109 @@
+"""Accuracy parity, latency and memory of the message classifier backends.
+
+A tiny randomly-initialized BERT NLI model is built in a temporary directory, so the benchmark runs
+offline; `--model` benchmarks a real checkpoint instead. The labels of the quantized and ONNX backends
+are compared with the fp32 PyTorch pipeline: a backend fails when a score drifts by more than MAX_DRIFT,
+or when its top label differs on more than 1 - MIN_PARITY of the messages the reference classifies
+with a clear margin. A backend that cannot be exported or loaded fails too; only a backend whose
+optional dependency is not installed is skipped. The script exits with status 1 on any failure.
+
+Run from the repository root: python -m benchmarks.bench_classifier_backends [--model PATH]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import torch
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+from config import APIConfiguration
+from domain.chat_bot.message import Message
+from infrastructure.message_classifier.classifier_backends import BACKENDS
+from infrastructure.message_classifier.message_classifier_facade_impl import MessageClassifierFacadeImpl
+
+MESSAGES = [
+    'quiero agendar una visita al departamento',
+    'cuanto cuesta el servicio de avaluo',
+    'que informacion tienen del INEGI sobre vivienda',
+    'hola buenos dias',
+    'me interesa una casa en Zapopan',
+    'gracias por la informacion',
+] * 8
+MIN_PARITY: float = 0.95
+MAX_DRIFT: float = 0.05
+
+
+def build_tiny_model(path: str) -> None:
+    words = sorted({word for text in MESSAGES for word in text.split()} | {'servicio', 'informacion', 'otro', 'este',
+                                                                            'ejemplo', 'es', '.'})
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', *words]
+    with open(os.path.join(path, 'vocab.txt'), 'w') as file:
+        file.write('\n'.join(vocab))
+    BertTokenizerFast(os.path.join(path, 'vocab.txt'), do_lower_case=True, model_max_length=128).save_pretrained(path)
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=128, num_labels=3, initializer_range=0.2,
+                        id2label={0: 'entailment', 1: 'neutral', 2: 'contradiction'},
+                        label2id={'entailment': 0, 'neutral': 1, 'contradiction': 2})
+    BertForSequenceClassification(config).save_pretrained(path)
+
+
+def rss_mb() -> float:
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def parity_and_drift(reference: list[dict], predictions: list[dict]) -> tuple[float, float]:
+    """Get the top-label parity on the clearly classified messages and the maximum score drift."""
+    drift = max(abs(dict(zip(a['labels'], a['scores']))[label] - score)
+                for a, b in zip(reference, predictions) for label, score in zip(b['labels'], b['scores']))
+    # A drift of MAX_DRIFT on both scores may swap two labels whose scores are closer than twice that
+    clear = [(a, b) for a, b in zip(reference, predictions) if a['scores'][0] - a['scores'][1] > 2 * MAX_DRIFT]
+    parity = sum(a['labels'][0] == b['labels'][0] for a, b in clear) / len(clear) if clear else 1.0
+    return parity, drift
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Accuracy parity, latency and memory of the classifier backends.')
+    parser.add_argument('--model', help='the NLI model to benchmark, by default a tiny random one')
+    args = parser.parse_args()
+    messages = [Message.from_user(text) for text in MESSAGES]
+    failures = []
+    with tempfile.TemporaryDirectory() as model_dir:
+        if args.model is None:
+            build_tiny_model(model_dir)
+        reference: list[dict] | None = None
+        for backend in BACKENDS:
+            facade = MessageClassifierFacadeImpl()
+            before = rss_mb()
+            try:
+                facade.initialize(APIConfiguration(CLASSIFIER_MODEL=args.model or model_dir,
+                                                   CLASSIFIER_BACKEND=backend))
+            except ImportError as error:
+                print(f'{backend:>9}: skipped ({error})')
+                continue
+            except Exception as error:
+                print(f'{backend:>9}: FAILED to load ({error})')
+                failures.append(backend)
+                continue
+            loaded = rss_mb() - before
+            start = time.perf_counter()
+            predictions = [facade.predict(msg) for msg in messages]
+            latency = (time.perf_counter() - start) / len(messages)
+            reference = reference or predictions
+            parity, drift = parity_and_drift(reference, predictions)
+            passed = parity >= MIN_PARITY and drift <= MAX_DRIFT
+            if not passed:
+                failures.append(backend)
+            print(f'{backend:>9}: {latency * 1000:>7.2f} ms/message, +{loaded:>6.1f} MB RSS, '
+                  f'{parity:>6.1%} top-label parity with pytorch, max score drift {drift:.4f}'
+                  f'{"" if passed else "  FAILED"}')
+    if failures:
+        sys.exit(f'Backends failing to load or beyond {MIN_PARITY:.0%} parity and {MAX_DRIFT} drift: '
+                 f'{", ".join(failures)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""CPU throughput of the message classifier, one call at a time against micro-batched calls.
+
+Downloads Recognai/bert-base-spanish-wwm-cased-xnli on first run.
+Run from the repository root: python -m benchmarks.bench_classifier_batching
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import APIConfiguration
+from domain.chat_bot.message import Message
+from infrastructure.message_classifier.message_classifier_facade_impl import MessageClassifierFacadeImpl
+from infrastructure.message_classifier.message_classifier_service_impl import MessageClassifierService
+
+MESSAGES = 128
+CONCURRENT_CALLERS = 32
+
+
+def main() -> None:
+    config = APIConfiguration()
+    facade = MessageClassifierFacadeImpl()
+    facade.initialize(config)
+    messages = [Message.from_user(f'¿Cuanto cuesta una casa de {n} recamaras en Monterrey?') for n in range(MESSAGES)]
+
+    start = time.perf_counter()
+    for msg in messages:
+        facade.predict(msg)
+    sequential = time.perf_counter() - start
+
+    service = MessageClassifierService(config, facade)
+    service.initialize()
+    with ThreadPoolExecutor(max_workers=CONCURRENT_CALLERS) as callers:
+        start = time.perf_counter()
+        list(callers.map(service.predict, messages))
+        batched = time.perf_counter() - start
+    service.close()
+
+    print(f'one at a time: {MESSAGES / sequential:>8.1f} messages/s')
+    print(f'micro-batched: {MESSAGES / batched:>8.1f} messages/s '
+          f'(max_batch_size={service.max_batch_size}, max_wait={service.max_wait}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Requests per second and wall time of CompletionFacadeImpl.create_many against a one-by-one loop.
+
+Run from the repository root: python -m benchmarks.bench_completion_batching
+"""
+import asyncio
+import time
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from infrastructure.cache.response_cache_impl import ResponseCache
+from infrastructure.completion.completion_facade_impl import CompletionFacadeImpl
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+
+PROMPTS = [f'Describe en una frase la colonia numero {n} de Puebla' for n in range(200)]
+
+
+def bench(facade: CompletionFacadeImpl, server: StubServer) -> None:
+    start = time.perf_counter()
+    one_by_one = [facade.create(prompt=prompt, cache=False) for prompt in PROMPTS]
+    loop_time = time.perf_counter() - start
+    loop_hits = server.hits['completion']
+
+    start = time.perf_counter()
+    batched = facade.create_many(PROMPTS, max_tokens=50)
+    batch_time = time.perf_counter() - start
+    batch_hits = server.hits['completion'] - loop_hits
+
+    assert [r.message for r in one_by_one] == [r.message for r in batched]
+    print(f'one by one : {loop_hits:>4} requests, {loop_time:>6.2f} s, {len(PROMPTS) / loop_time:>8.1f} prompts/s')
+    print(f'create_many: {batch_hits:>4} requests, {batch_time:>6.2f} s, {len(PROMPTS) / batch_time:>8.1f} prompts/s')
+
+
+async def main() -> None:
+    async with StubServer(latency=0.02) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, MODEL='text-davinci-003',
+                                  TEMPERATURE='0')
+        facade = CompletionFacadeImpl(config, ResponseCache(config), RequestScheduler(config))
+        await asyncio.to_thread(bench, facade, server)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
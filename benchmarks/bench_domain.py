@@ -0,0 +1,291 @@
+"""Microbenchmarks of the domain hot paths, on synthetic conversations of 10 to 10k turns.
+
+Every case is timed as the best per-call time of several rounds, and its allocations are the peak
+memory traced by tracemalloc during one call. Chat cases run on conversations of every size; the
+others do not depend on the size of a conversation.
+
+With `--save`, the results are written to a baseline file. With `--compare`, they are compared with a
+baseline, and a case slower, or allocating more, than the baseline by more than `--threshold` is
+flagged as a regression; the script then exits with status 1. Timings depend on the machine and on its
+load, so every case is timed in `PASSES` passes spread over the run, keeping its best time. A case is
+only flagged as slower if it is slower than the baseline both in absolute time and after dividing its
+time by the median change of all the cases: a machine that is slower as a whole slows every case,
+while a regression slows a few of them. Load does not slow every case alike either, so the absolute
+check keeps a case that only lost ground to the others from being flagged on an unchanged tree. As a
+consequence, a change slowing most cases alike, or a regression on a machine faster than the baseline
+by more than the regression, is not detected. A case that looks slower is measured again, in a new
+process, up to `--retries` times before it is flagged. The baseline should still be saved on the
+machine that compares against it.
+
+Run from the repository root:
+    python -m benchmarks.bench_domain --save benchmarks/baseline_domain.json
+    python -m benchmarks.bench_domain --compare benchmarks/baseline_domain.json --threshold 0.3
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from domain.chat_bot.prediction import Prediction
+from domain.completion.completion_response import CompletionResponse
+
+SIZES: tuple[int, ...] = (10, 100, 1000, 10_000)
+PASSES: int = 3
+ROUNDS: int = 5
+MIN_ROUND_SECONDS: float = 0.02
+MUTATING_CALLS: int = 20
+# Allocation growths below this many bytes are noise, not regressions
+MIN_ALLOC_DELTA: int = 1024
+RETRIES: int = 3
+
+PREDICTION_JSON: dict = {
+    'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 1680000000, 'model': 'gpt-3.5-turbo-0301',
+    'usage': {'prompt_tokens': 120, 'completion_tokens': 40, 'total_tokens': 160},
+    'choices': [{'index': 0, 'finish_reason': 'stop',
+                 'message': {'role': 'assistant', 'content': 'En el norte de Merida hay casas desde 3 millones.'}}],
+}
+COMPLETION_JSON: dict = {
+    'id': 'cmpl-1', 'object': 'text_completion', 'created': 1680000000, 'model': 'text-davinci-003',
+    'usage': {'prompt_tokens': 800, 'completion_tokens': 300, 'total_tokens': 1100},
+    'choices': [{'index': 0, 'finish_reason': 'stop', 'logprobs': None,
+                 'text': ' El usuario busca una casa en Merida con un credito Infonavit.'}],
+}
+
+
+@dataclass
+class Case:
+    """
+    A benchmarked operation.
+
+    Attributes:
+    ----------
+    name : str
+        The name of the case.
+    setup : Callable[[int | None], Any]
+        Build the state of the operation for a conversation size, untimed.
+    run : Callable[[Any], Any]
+        The timed operation.
+    sized : bool
+        Whether the case runs on conversations of every size.
+    mutates : bool
+        Whether the operation changes its state, which is then built again for every round.
+    """
+    name: str
+    setup: Callable[[int | None], Any]
+    run: Callable[[Any], Any]
+    sized: bool = True
+    mutates: bool = False
+
+
+def build_chat(turns: int) -> Chat:
+    """Build a chat of `turns` user and assistant messages, without any API call."""
+    chat = Chat(config=APIConfiguration())
+    for turn in range(turns):
+        chat.add(Message.from_user(f'Pregunta {turn}: ¿hay casas con alberca y jardin en el norte de Merida?'))
+        chat.add(Message.from_assistant(f'Respuesta {turn}: en el norte de Merida hay casas desde 3 millones.'))
+    return chat
+
+
+_chats: dict[int, Chat] = {}
+
+
+def shared_chat(turns: int) -> Chat:
+    """Get the chat of `turns` turns shared by the cases that do not change it."""
+    if turns not in _chats:
+        _chats[turns] = build_chat(turns)
+    return _chats[turns]
+
+
+_resumable_chats: dict[int, Chat] = {}
+
+
+def resumable_chat(turns: int) -> Chat:
+    """Get a chat of `turns` turns whose whole history is due to be summarized, apart from the shared chats."""
+    if turns not in _resumable_chats:
+        chat = _resumable_chats[turns] = build_chat(turns)
+        chat._resume_index = len(chat.history)
+    return _resumable_chats[turns]
+
+
+def add_message(chat: Chat) -> None:
+    chat.add(Message.from_user('¿Y cuanto cuesta el mantenimiento de una casa con alberca?'))
+
+
+CASES: tuple[Case, ...] = (
+    Case('message_construction', lambda size: None,
+         lambda _: Message.from_user('¿Hay casas con alberca en Merida?'), sized=False),
+    Case('message_to_json', lambda size: Message.from_assistant('En Merida hay casas desde 3 millones.'),
+         lambda msg: msg.to_json(), sized=False),
+    Case('message_from_json', lambda size: {'role': 'user', 'content': '¿Hay casas con alberca en Merida?'},
+         Message.from_json, sized=False),
+    Case('prediction_from_json', lambda size: PREDICTION_JSON, Prediction.from_json, sized=False),
+    Case('prediction_message', lambda size: PREDICTION_JSON,
+         lambda json: Prediction.from_json(json).message, sized=False),
+    Case('completion_from_json', lambda size: COMPLETION_JSON, CompletionResponse.from_json, sized=False),
+    Case('chat_messages', shared_chat, lambda chat: chat.messages),
+    Case('chat_add', build_chat, add_message, mutates=True),
+    Case('resume_corpus', shared_chat, lambda chat: chat.build_resume_prompt(len(chat.history))),
+    Case('add_resume_to_chat', lambda size: (resumable_chat(size), CompletionResponse.from_json(COMPLETION_JSON)),
+         lambda state: state[0].add_resume_to_chat(state[1])),
+)
+
+
+def measure(case: Case, size: int | None) -> dict[str, float]:
+    """Get the best time per call, in microseconds, and the peak allocation of one call, in bytes."""
+    state = case.setup(size)
+    # The number of calls of a round is calibrated once, so every round lasts about MIN_ROUND_SECONDS
+    start = time.perf_counter()
+    case.run(state)
+    once = time.perf_counter() - start
+    number = max(1, int(MIN_ROUND_SECONDS / max(once, 1e-9)))
+    if case.mutates:
+        # A mutating round changes its state a little, not enough to change the size of the case
+        number = min(number, MUTATING_CALLS)
+    best = float('inf')
+    for _ in range(ROUNDS):
+        if case.mutates:
+            state = case.setup(size)
+        start = time.perf_counter()
+        for _ in range(number):
+            case.run(state)
+        best = min(best, (time.perf_counter() - start) / number)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    case.run(state)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return {'time_us': best * 1e6, 'alloc_bytes': max(0, peak)}
+
+
+def select_cases(sizes: tuple[int, ...], names: set[str] | None) -> dict[str, tuple[Case, int | None]]:
+    """Get the case and the conversation size of every result key, in the order the cases run."""
+    selected = {}
+    for case in CASES:
+        if names and case.name not in names:
+            continue
+        for size in sizes if case.sized else (None,):
+            selected[case.name if size is None else f'{case.name}[{size}]'] = case, size
+    return selected
+
+
+def run_cases(selected: dict[str, tuple[Case, int | None]]) -> dict[str, dict[str, float]]:
+    """Time every case in `PASSES` passes over all of them, keeping its best time, so a burst of load does
+    not slow every round of a case."""
+    results = {}
+    for _ in range(PASSES):
+        for key, (case, size) in selected.items():
+            result = measure(case, size)
+            if key not in results or result['time_us'] < results[key]['time_us']:
+                results[key] = result
+    for key, result in results.items():
+        print(f'{key:<28} {result["time_us"]:>12.2f} us {result["alloc_bytes"] / 1024:>12.1f} KB')
+    return results
+
+
+def measure_apart(selected: dict[str, tuple[Case, int | None]]) -> dict[str, dict[str, float]]:
+    """Time cases again in a new interpreter, whose memory layout differs from the one of this process."""
+    names = ','.join(dict.fromkeys(case.name for case, _ in selected.values()))
+    sizes = ','.join(str(size) for size in dict.fromkeys(size for _, size in selected.values()) if size is not None)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.json')
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_domain', '--cases', names,
+                        '--sizes', sizes or str(SIZES[0]), '--save', path], check=True, stdout=subprocess.DEVNULL)
+        with open(path) as file:
+            return json.load(file)['results']
+
+
+def machine_scale(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]]) -> float:
+    """Get the median time ratio of the cases to the baseline, how much slower the machine is as a whole."""
+    ratios = [result['time_us'] / baseline[key]['time_us'] for key, result in results.items() if key in baseline]
+    # With a couple of cases the median would be the change of the cases themselves
+    return statistics.median(ratios) if len(ratios) >= 5 else 1.0
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]],
+            threshold: float, *, quiet: bool = False) -> list[str]:
+    """
+    Print the change of every case against the baseline and return the regressed ones.
+
+    A case is slower if its time is beyond the threshold both as is and divided by the median change of
+    all the cases, so a machine that is slower as a whole, or busier, than when the baseline was saved
+    does not flag every case, and a case that only lost ground to the others is not flagged either.
+    """
+    regressions = []
+    scale = machine_scale(results, baseline)
+    if not quiet:
+        print(f'\nmachine speed: median case {scale - 1:+.1%} against the baseline')
+        print(f'\n{"case":<28} {"time":>10} {"scaled":>10} {"allocs":>10}')
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            if not quiet:
+                print(f'{key:<28} {"new":>10}')
+            continue
+        absolute_change = result['time_us'] / base['time_us'] - 1
+        time_change = result['time_us'] / (base['time_us'] * scale) - 1
+        alloc_delta = result['alloc_bytes'] - base['alloc_bytes']
+        alloc_change = alloc_delta / base['alloc_bytes'] if base['alloc_bytes'] else 0.0
+        regressed = min(time_change, absolute_change) > threshold \
+            or (alloc_change > threshold and alloc_delta > MIN_ALLOC_DELTA)
+        if regressed:
+            regressions.append(key)
+        if not quiet:
+            print(f'{key:<28} {absolute_change:>+10.1%} {time_change:>+10.1%} {alloc_change:>+10.1%}'
+                  f'{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Microbenchmarks of the domain hot paths.')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='conversation sizes, in turns')
+    parser.add_argument('--cases', help='comma-separated names of the cases to run, by default all')
+    parser.add_argument('--save', metavar='PATH', help='write the results to a baseline file')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results with a baseline file')
+    parser.add_argument('--threshold', type=float, default=0.3, help='the relative change flagged as a regression')
+    parser.add_argument('--retries', type=int, default=RETRIES,
+                        help='the times a case that looks slower is measured again before it is flagged')
+    args = parser.parse_args()
+    sizes = tuple(int(size) for size in args.sizes.split(','))
+    names = set(args.cases.split(',')) if args.cases else None
+
+    print(f'{"case":<28} {"time":>15} {"allocs":>15}')
+    selected = select_cases(sizes, names)
+    results = run_cases(selected)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      file, indent=2)
+            file.write('\n')
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        for _ in range(args.retries):
+            suspects = compare(results, baseline, args.threshold, quiet=True)
+            if not suspects:
+                break
+            # A burst of load, or the memory layout of this process, can slow every round of a case
+            print(f'measuring {len(suspects)} slower cases again in a new process')
+            for key, result in measure_apart({key: selected[key] for key in suspects}).items():
+                if key in results and result['time_us'] < results[key]['time_us']:
+                    results[key] = result
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions beyond {args.threshold:.0%}: {", ".join(regressions)}',
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Latency percentiles of chat completion calls with and without hedging.
+
+The stand-in server answers most requests in about 20 ms and 5% of them in 500 ms, the kind of slow tail
+that dominates p99. With hedging, a duplicate is sent after the observed p95 and the first answer wins.
+
+Run from the repository root: python -m benchmarks.bench_hedging
+"""
+import asyncio
+import random
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+from infrastructure.scheduler.hedging import Hedger
+
+CALLS = 400
+CONCURRENCY = 20
+BOUNDS = [0.025, 0.05, 0.1, 0.25, 0.5]
+
+
+def tail_latency(rng: random.Random = random.Random(0)) -> float:
+    return 0.5 if rng.random() < 0.05 else rng.uniform(0.015, 0.025)
+
+
+async def bench(hedge: bool) -> None:
+    async with StubServer(latency=tail_latency) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base,
+                                  HEDGE_REQUESTS=str(hedge), HEDGE_BUDGET='0.1', REQUEST_DEADLINE='5')
+        hedger = Hedger(config)
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        async with AsyncChatEngine(config, hedger=hedger) as engine:
+            async def turn(n: int) -> None:
+                async with semaphore:
+                    await engine.run_turn(Chat(config=config), f'Pregunta {n}')
+
+            await asyncio.gather(*(turn(n) for n in range(CALLS)))
+    ms = {name: value * 1000 for name, value in hedger.latencies.percentiles().items()}
+    print(f'hedging {"on " if hedge else "off"}: p50 {ms["p50"]:>6.1f} ms, p95 {ms["p95"]:>6.1f} ms, '
+          f'p99 {ms["p99"]:>6.1f} ms, extra load {hedger.hedges / hedger.calls:>5.1%}')
+    print(f'  histogram (<= {", ".join(f"{b * 1000:g}" for b in BOUNDS)} ms, more): '
+          f'{hedger.latencies.histogram(BOUNDS)}')
+
+
+async def main() -> None:
+    await bench(hedge=False)
+    await bench(hedge=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
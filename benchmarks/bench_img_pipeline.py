@@ -0,0 +1,55 @@
+"""Throughput of the DALL-E image pipeline, from prompts to image files.
+
+The stand-in server takes 100 ms to generate each request and serves 256 KiB fake images. 200 prompts, a
+fifth of them repeated, are generated with one worker as the interactive facade did, then with more
+workers, by URL and as base64 JSON. A second run of the same batch is answered from the disk cache.
+tracemalloc shows the memory held while writing the images to disk: URL images are streamed, while a
+base64 JSON body is parsed whole before its image is decoded.
+
+Run from the repository root: python -m benchmarks.bench_img_pipeline
+"""
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from infrastructure.dalle_img.img_pipeline_impl import ImgPipeline
+
+PROMPTS = [f'Casa moderna en Merida con alberca, estilo {n % 160}' for n in range(200)]
+IMAGE_SIZE = 256 * 1024
+
+
+async def bench(workers: int, response_format: str) -> None:
+    async with StubServer(latency=0.1, image_size=IMAGE_SIZE) as server:
+        with tempfile.TemporaryDirectory() as directory:
+            config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, IMG_DIR=directory,
+                                      IMG_MAX_WORKERS=str(workers), IMG_RESPONSE_FORMAT=response_format)
+            pipeline = ImgPipeline(config)
+            tracemalloc.start()
+            start = time.perf_counter()
+            results = await pipeline.agenerate(PROMPTS)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            failed = sum(not result.ok for result in results)
+            size = sum(os.path.getsize(path) for path in {path for result in results for path in result.paths})
+            start = time.perf_counter()
+            await pipeline.agenerate(PROMPTS)
+            cached = time.perf_counter() - start
+    print(f'{workers:>2} workers, {response_format:<8}: {len(PROMPTS) / elapsed:>6.1f} prompts/s, '
+          f'{pipeline.generated} generated, {failed} failed, {size / elapsed / 2 ** 20:>5.1f} MB/s to disk, '
+          f'peak {peak / 2 ** 20:.1f} MB traced; cached rerun {cached * 1000:.0f} ms')
+
+
+async def main() -> None:
+    await bench(1, 'url')
+    for workers in (8, 32):
+        await bench(workers, 'url')
+    await bench(32, 'b64_json')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
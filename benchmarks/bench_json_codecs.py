@@ -0,0 +1,84 @@
+"""Decoding 100k recorded chat completion responses.
+
+A tenth of the responses carry a field the models do not know (`system_fingerprint`), as newer API
+versions send. The old `cls(**json)` decoding fails on them; `from_json` drops the unknown keys. The
+raw bodies are parsed with the standard library, then with the fastest backend installed (orjson).
+
+Run from the repository root: python -m benchmarks.bench_json_codecs
+"""
+import json
+import random
+import time
+from dataclasses import dataclass
+
+from domain import _json_serialize
+from domain.chat_bot.prediction import Prediction
+
+RESPONSES = 100_000
+
+
+@dataclass
+class LegacyPrediction:
+    id: str
+    object: str
+    created: int
+    model: str
+    usage: dict[str, int]
+    choices: list[dict[str, any]]
+
+
+def recorded_responses() -> list[bytes]:
+    rng = random.Random(0)
+    responses = []
+    for i in range(RESPONSES):
+        body = {'id': f'chatcmpl-{i}', 'object': 'chat.completion', 'created': 1680000000 + i,
+                'model': 'gpt-3.5-turbo-0301',
+                'usage': {'prompt_tokens': rng.randint(50, 900), 'completion_tokens': 60, 'total_tokens': 960},
+                'choices': [{'message': {'role': 'assistant', 'content': 'Merida tiene buena plusvalia. ' * 8},
+                             'finish_reason': 'stop', 'index': 0}]}
+        if i % 10 == 0:
+            body['system_fingerprint'] = 'fp_44709d6fcb'
+        responses.append(json.dumps(body).encode())
+    return responses
+
+
+def run(name: str, decode, responses: list[bytes]) -> None:
+    failures = 0
+    start = time.perf_counter()
+    for raw in responses:
+        try:
+            decode(raw)
+        except TypeError:
+            failures += 1
+    elapsed = time.perf_counter() - start
+    print(f'{name:>30}: {elapsed:5.2f} s, {elapsed / len(responses) * 1e6:5.2f} us/response, {failures} failed')
+
+
+def main() -> None:
+    responses = recorded_responses()
+    parsed = [json.loads(raw) for raw in responses]
+    start = time.perf_counter()
+    for body in parsed:
+        try:
+            LegacyPrediction(**body)
+        except TypeError:
+            pass
+    legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    for body in parsed:
+        Prediction.from_json(body)
+    decoded = time.perf_counter() - start
+    print(f'decode parsed bodies: cls(**json) {legacy * 1e9 / RESPONSES:.0f} ns, '
+          f'from_json {decoded * 1e9 / RESPONSES:.0f} ns per response')
+
+    run('json + cls(**json)', lambda raw: LegacyPrediction(**json.loads(raw)), responses)
+    run('json + from_json', lambda raw: Prediction.from_json(json.loads(raw)), responses)
+    if _json_serialize.orjson is not None:
+        run('orjson + from_json', Prediction.from_json_bytes, responses)
+    else:
+        print('orjson is not installed: from_json_bytes uses the standard library')
+    run('from_json_bytes, read .message', lambda raw: Prediction.from_json_bytes(raw).message, responses)
+
+
+if __name__ == '__main__':
+    main()
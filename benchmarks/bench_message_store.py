@@ -0,0 +1,71 @@
+"""Memory of the chat histories of 1k sessions x 500 messages, in the old and the new layouts.
+
+The old layout keeps every message as a dataclass with a per-instance __dict__, in two lists per chat
+(the current chat and the history). The new layout keeps the history in a MessageStore, whose contents
+live in one contiguous buffer, and the current chat is a view of it. Sizes are measured with tracemalloc.
+
+Run from the repository root: python -m benchmarks.bench_message_store
+"""
+import gc
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+from domain.chat_bot.message import Message
+from domain.chat_bot.message_store import MessageStore
+
+SESSIONS = 1_000
+MESSAGES = 500
+WORDS = ('casa departamento terreno renta credito infonavit zona plusvalia Merida Zapopan INEGI vivienda '
+         'precio metro cuadrado escrituras notario avaluo').split()
+
+
+@dataclass
+class LegacyMessage:
+    role: str
+    content: str
+    tokens: int | None = field(default=None, init=False, repr=False, compare=False)
+    classification: dict | None = field(default=None, init=False, repr=False, compare=False)
+
+
+def contents(session: int) -> list[tuple[str, str]]:
+    rng = random.Random(session)
+    return [('user' if i % 2 == 0 else 'assistant', ' '.join(rng.choices(WORDS, k=rng.randint(5, 40))))
+            for i in range(MESSAGES)]
+
+
+def legacy_session(session: int) -> tuple[list, list]:
+    # Roles are built at runtime, as when they are parsed from the API responses
+    history = [LegacyMessage(''.join(role), content) for role, content in contents(session)]
+    return list(history), history
+
+
+def store_session(session: int) -> MessageStore:
+    return MessageStore(Message(''.join(role), content) for role, content in contents(session))
+
+
+def measure(build) -> tuple[float, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    sessions = [build(session) for session in range(SESSIONS)]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sessions
+    return size / 2 ** 20, elapsed
+
+
+def main() -> None:
+    content_mb = sum(len(content.encode()) for session in range(SESSIONS) for _, content in contents(session)) / 2 ** 20
+    print(f'{SESSIONS} sessions x {MESSAGES} messages, {content_mb:.1f} MB of message content')
+    for name, build in (('dataclass lists', legacy_session), ('message store', store_session)):
+        size, elapsed = measure(build)
+        print(f'{name:>15}: {size:7.1f} MB traced, {size * 2 ** 20 / (SESSIONS * MESSAGES):6.0f} B per message, '
+              f'built in {elapsed:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
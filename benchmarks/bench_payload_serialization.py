@@ -0,0 +1,48 @@
+"""Per-turn cost of serializing the chat completion request body as the history grows.
+
+The old path rebuilds a dict per message through `Chat.messages` and JSON-encodes the whole body again,
+as the SDK does. The new path splices the JSON each message cached once: the pinned prefix and one slice
+of the history store. The whole history is kept in the context to show the growth.
+
+Run from the repository root: python -m benchmarks.bench_payload_serialization
+"""
+import json
+import time
+
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+
+HISTORY_SIZES = (100, 1_000, 10_000)
+TURNS = 50
+
+
+def new_chat(config: APIConfiguration, size: int) -> Chat:
+    chat = Chat(config=config, _context_window=10 ** 9)
+    for i in range(size // 2):
+        chat.history.append(Message.from_user(f'¿Cuanto cuesta un departamento de {i} m2 en Guadalajara?'))
+        chat.history.append(Message.from_assistant(f'Un departamento de {i} m2 cuesta alrededor de {i * 30} mil pesos.'))
+    return chat
+
+
+def per_turn(chat: Chat, serialize) -> float:
+    elapsed = 0.0
+    for turn in range(TURNS):
+        chat.history.append(Message.from_user(f'Turno {turn}: ¿y en Zapopan?'))
+        start = time.perf_counter()
+        serialize(chat)
+        elapsed += time.perf_counter() - start
+    return elapsed / TURNS
+
+
+def main() -> None:
+    config = APIConfiguration()
+    for size in HISTORY_SIZES:
+        old = per_turn(new_chat(config, size), lambda chat: json.dumps(chat.payload).encode())
+        new = per_turn(new_chat(config, size), lambda chat: chat.payload_bytes_for())
+        print(f'{size:>6} messages: to_json + re-encode {old * 1e6:9.0f} us/turn, '
+              f'spliced bytes {new * 1e6:6.0f} us/turn')
+
+
+if __name__ == '__main__':
+    main()
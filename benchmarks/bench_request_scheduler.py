@@ -0,0 +1,50 @@
+"""RequestScheduler against a stand-in server that injects 429 and 503 responses.
+
+Every interactive turn and background summary must succeed through retries, the request rate must
+stay within the RPM budget, and interactive calls must finish ahead of the background ones.
+
+Run from the repository root: python -m benchmarks.bench_request_scheduler
+"""
+import asyncio
+import time
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.scheduler.priority import Priority
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+
+SESSIONS = 100
+RPM = 6000
+
+
+async def main() -> None:
+    async with StubServer(error_rate=0.3, retry_after=0.05) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, RATE_LIMIT_RPM=str(RPM),
+                                  RETRY_BASE_DELAY='0.05', MAX_RETRIES='10')
+        scheduler = RequestScheduler(config)
+        # Start with an empty bucket, so every call queues and priorities decide the order
+        scheduler.requests.take(RPM)
+        finished: dict[Priority, list[float]] = {Priority.INTERACTIVE: [], Priority.BACKGROUND: []}
+        async with AsyncChatEngine(config, scheduler=scheduler) as engine:
+            async def call(chat: Chat, priority: Priority) -> None:
+                await scheduler.asubmit(lambda: engine._post('/chat/completions', chat.payload),
+                                        estimated_tokens=chat.prompt_tokens, priority=priority)
+                finished[priority].append(time.perf_counter())
+
+            chats = [Chat(config=config) for _ in range(SESSIONS)]
+            start = time.perf_counter()
+            await asyncio.gather(*(call(chat, Priority.BACKGROUND) for chat in chats),
+                                 *(call(chat, Priority.INTERACTIVE) for chat in chats))
+            elapsed = time.perf_counter() - start
+    upstream = server.hits['chat']
+    print(f'{2 * SESSIONS} calls succeeded with {scheduler.retries} retries, {upstream} upstream requests '
+          f'({server.hits.get("error_429", 0)} x 429, {server.hits.get("error_503", 0)} x 503) in {elapsed:.2f} s')
+    print(f'request rate {upstream / elapsed * 60:.0f}/min for a budget of {RPM}/min')
+    print(f'mean finish: interactive {sum(finished[Priority.INTERACTIVE]) / SESSIONS - start:.2f} s, '
+          f'background {sum(finished[Priority.BACKGROUND]) / SESSIONS - start:.2f} s')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Prompt size and build time of the retrieval memory at a 10k-message history.
+
+The chat history is filled with 10k messages about a handful of topics, and a few more turns are then
+played. The retrieval memory sends the pinned messages, the last turns and the top-k similar past
+messages; it is compared with sending the whole history. A tiny randomly-initialized BERT encoder is
+built in a temporary directory, so the benchmark runs offline on the CPU.
+
+Run from the repository root: python -m benchmarks.bench_retrieval_memory
+"""
+import os
+import random
+import tempfile
+import time
+
+import torch
+from transformers import BertConfig, BertModel, BertTokenizerFast
+
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from infrastructure.chat_bot.retrieval_memory_impl import RetrievalMemory, SentenceEmbedder
+
+HISTORY_MESSAGES = 10_000
+TURNS = 20
+TOPICS = {
+    'credito': 'cuanto credito infonavit me dan para una casa con mi salario',
+    'zona': 'que zona de Merida tiene mejor plusvalia para un departamento',
+    'terreno': 'que papeles necesito para comprar un terreno ejidal en Yucatan',
+    'renta': 'cuanto puedo cobrar de renta por un local comercial en el centro',
+    'inegi': 'que dice el INEGI sobre la vivienda deshabitada en Jalisco',
+}
+
+
+def build_tiny_encoder(path: str) -> None:
+    words = sorted({word for text in TOPICS.values() for word in text.lower().split()} | {'respuesta', 'sobre'})
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', *words]
+    with open(os.path.join(path, 'vocab.txt'), 'w') as file:
+        file.write('\n'.join(vocab))
+    BertTokenizerFast(os.path.join(path, 'vocab.txt'), do_lower_case=True, model_max_length=128).save_pretrained(path)
+    torch.manual_seed(0)
+    BertModel(BertConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=2,
+                         intermediate_size=128)).save_pretrained(path)
+
+
+def history(size: int) -> list[Message]:
+    rng = random.Random(0)
+    messages = []
+    for _ in range(size // 2):
+        topic, question = rng.choice(list(TOPICS.items()))
+        messages.append(Message.from_user(question))
+        messages.append(Message.from_assistant(f'respuesta sobre {topic}: ' + ' '.join(rng.choices(
+            question.split(), k=40))))
+    return messages
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as model_dir:
+        build_tiny_encoder(model_dir)
+        config = APIConfiguration(MEMORY_EMBEDDING_MODEL=model_dir)
+        embedder = SentenceEmbedder(config)
+        past = history(HISTORY_MESSAGES)
+        prompts = [question for _, question in sorted(TOPICS.items())] * (TURNS // len(TOPICS))
+
+        full = Chat(config=config, _context_window=10 ** 9)
+        full._history_chat.extend(past)
+        print(f'whole history: {full.prompt_tokens:>9} prompt tokens')
+
+        chat = Chat(config=config, memory=RetrievalMemory(embedder), _context_window=10 ** 9)
+        chat._history_chat.extend(past)
+        chat.memory.add_many(past)
+        start = time.perf_counter()
+        chat.memory.search(0, k=0, end=0)
+        print(f'index build: {time.perf_counter() - start:.2f} s for {HISTORY_MESSAGES} messages')
+
+        prompt_tokens, build_seconds = [], []
+        for prompt in prompts:
+            start = time.perf_counter()
+            chat.add(Message.from_user(prompt))
+            payload = chat.payload
+            build_seconds.append(time.perf_counter() - start)
+            prompt_tokens.append(chat.prompt_tokens)
+            chat.add(Message.from_assistant(f'respuesta sobre {prompt}'))
+        print(f'retrieval:     {sum(prompt_tokens) // len(prompt_tokens):>9} prompt tokens on average, '
+              f'{len(payload["messages"])} messages in the last prompt, '
+              f'{sum(build_seconds) / len(build_seconds) * 1000:.1f} ms per prompt build (append + embed + search)')
+
+
+if __name__ == '__main__':
+    main()
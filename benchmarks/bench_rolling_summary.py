@@ -0,0 +1,47 @@
+"""Prompt tokens per summarization on synthetic 500-turn conversations.
+
+The rolling summary sends the previous summary plus the messages added since the last summarization,
+so its prompt stays flat; the full-history corpus it replaces is reported next to it.
+
+Run from the repository root: python -m benchmarks.bench_rolling_summary
+"""
+import time
+
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from domain.chat_bot.token_counter import TokenCounter
+
+TURNS = 500
+SUMMARY = 'Resumen: el usuario busca una casa de tres recamaras en Zapopan con presupuesto medio. ' * 4
+
+
+def fake_completion(**kwargs) -> dict:
+    return {'id': 'cmpl-bench', 'object': 'text_completion', 'created': 0, 'model': kwargs['model'],
+            'usage': {}, 'choices': [{'index': 0, 'text': SUMMARY}]}
+
+
+def main() -> None:
+    counter = TokenCounter()
+    chat = Chat(config=APIConfiguration())
+    rolling_tokens: list[int] = []
+    full_tokens: list[int] = []
+    elapsed = 0.0
+    for turn in range(TURNS):
+        chat.add(Message.from_user(f'Turno {turn}: busco departamentos cerca del centro con estacionamiento.'))
+        chat.add(Message.from_assistant(f'Turno {turn}: claro, en la zona hay opciones entre 2 y 3 millones.'))
+        chat.used_tokens = chat.prompt_tokens
+        if chat.used_tokens < chat._max_tokens:
+            continue
+        rolling_tokens.append(counter.count(chat.build_resume_prompt(len(chat.history))))
+        full_tokens.append(counter.count(' '.join(msg.content for msg in chat.history)))
+        start = time.perf_counter()
+        chat.update_resume_chat(call_back=fake_completion)
+        elapsed += time.perf_counter() - start
+    print(f'{len(rolling_tokens)} summarizations over {TURNS} turns, {elapsed * 1000:.1f} ms building prompts')
+    for i in sorted({0, len(rolling_tokens) // 2, len(rolling_tokens) - 1}):
+        print(f'summary {i:>3}: rolling {rolling_tokens[i]:>6} prompt tokens, full history {full_tokens[i]:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""API calls and tokens saved by MessageRouter on a mixed stream of user messages.
+
+A third of the prompts are FAQ paraphrases answered from the local index, a third are small talk the
+classifier labels "otro" (sent to the cheap model with a short context) and the rest take the full route.
+The same prompts are replayed without a router to compare the upstream calls.
+
+Run from the repository root: python -m benchmarks.bench_routing
+"""
+import asyncio
+import time
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from domain.message_classifier.i_message_classifier_facade import IMessageClassifierFacade
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+from infrastructure.chat_bot.message_router_impl import FaqAnswerIndex, MessageRouter
+
+FAQ = [
+    {'question': '¿Cual es el horario de atencion?', 'answer': 'Atendemos de lunes a viernes de 9 a 18 h.'},
+    {'question': '¿Cuanto cuesta la suscripcion mensual?', 'answer': 'La suscripcion cuesta 199 MXN al mes.'},
+    {'question': '¿Como cancelo mi cuenta?', 'answer': 'Puedes cancelarla desde Configuracion > Cuenta.'},
+]
+PROMPTS = [
+    'cual es el horario de atencion',
+    'hola, ¿como estas?',
+    '¿Que zonas de Merida recomiendas para invertir en una casa?',
+    '¿Cuanto cuesta la suscripcion mensual?',
+    'jaja gracias',
+    '¿Que documentos necesito para comprar un terreno ejidal?',
+] * 5
+
+
+class KeywordClassifier(IMessageClassifierFacade):
+
+    def initialize(self, config: APIConfiguration) -> None:
+        pass
+
+    def predict(self, msg: Message) -> dict:
+        small_talk = any(word in msg.content.lower() for word in ('hola', 'gracias', 'jaja'))
+        labels = ['otro', 'informacion', 'servicio'] if small_talk else ['informacion', 'servicio', 'otro']
+        return {'sequence': msg.content, 'labels': labels, 'scores': [0.9, 0.05, 0.05]}
+
+    def predict_many(self, msgs: list[Message]) -> list[dict]:
+        return [self.predict(msg) for msg in msgs]
+
+
+async def run(engine: AsyncChatEngine, chat: Chat) -> float:
+    start = time.perf_counter()
+    for prompt in PROMPTS:
+        await engine.run_turn(chat, prompt)
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    async with StubServer(latency=0.02) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, ROUTE_LOW_VALUE_LABELS='otro')
+        async with AsyncChatEngine(config) as engine:
+            elapsed = await run(engine, Chat(config=config, _max_tokens=10 ** 6))
+            print(f'no router: {server.hits["chat"]} API calls in {elapsed:.2f} s')
+
+            router = MessageRouter(config)
+            router.faq_index = FaqAnswerIndex.from_faq(FAQ)
+            hits = server.hits['chat']
+            chat = Chat(config=config, classifier=KeywordClassifier(), router=router, _max_tokens=10 ** 6)
+            elapsed = await run(engine, chat)
+            print(f'router:    {server.hits["chat"] - hits} API calls in {elapsed:.2f} s')
+            print(router.report())
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""Write throughput and resume latency of the session logs for 100k sessions.
+
+100k short sessions (two turns each) and 100 long ones (2000 messages, with a summary covering all but
+the latest messages) are written through SessionLog, as Chat.add does. Resuming rehydrates only the
+current context and the summary; the older messages are read lazily through the mmap'd index. The long
+sessions are then compacted into snapshots and resumed again.
+
+Run from the repository root: python -m benchmarks.bench_session_store
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from infrastructure.session.session_store_impl import SessionStore
+
+SHORT_SESSIONS = 100_000
+LONG_SESSIONS = 100
+LONG_MESSAGES = 2_000
+
+
+def state(messages: int, context_start: int, used_tokens: int) -> dict:
+    return {'used_tokens': used_tokens, 'summary': 'El usuario busca casa en Merida con credito Infonavit.'
+            if context_start else None, 'summarized_index': context_start, 'resume_index': context_start,
+            'context_start': context_start, 'recalled': []}
+
+
+def write_session(store: SessionStore, session_id: str, messages: int, rng: random.Random) -> int:
+    log = store.open(session_id)
+    records = 0
+    for turn in range(messages // 2):
+        log.append_message(Message.from_user(f'¿Cuanto cuesta una casa de {rng.randint(60, 300)} m2 en Merida?'))
+        log.append_message(Message.from_assistant('Depende de la zona; en el norte ronda los 3 millones. ' * 3))
+        context_start = max(0, 2 * turn - 6) if messages > 100 else 0
+        log.save_state(state(2 * turn + 2, context_start, 300 + turn))
+        records += 3
+    return records
+
+
+def resume(config: APIConfiguration, store: SessionStore, session_ids: list[str]) -> list[float]:
+    latencies = []
+    for session_id in session_ids:
+        start = time.perf_counter()
+        chat = Chat.from_session(config, store.open(session_id))
+        chat.payload_bytes_for()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    print(f'{name}: p50 {statistics.median(latencies) * 1000:.2f} ms, '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms')
+
+
+def main() -> None:
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        config = APIConfiguration(SESSION_DIR=directory)
+        store = SessionStore(config)
+        short_ids = [f'{i:08x}' for i in range(SHORT_SESSIONS)]
+        long_ids = [f'long{i:04d}' for i in range(LONG_SESSIONS)]
+        start = time.perf_counter()
+        records = sum(write_session(store, session_id, 4, rng) for session_id in short_ids)
+        records += sum(write_session(store, session_id, LONG_MESSAGES, rng) for session_id in long_ids)
+        store.flush()
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+        print(f'write: {records} records in {elapsed:.1f} s, {records / elapsed:,.0f} records/s, '
+              f'{size / 2 ** 20:.0f} MB, {store.fsyncs} fsyncs')
+
+        report(f'resume {1000} short sessions', resume(config, store, rng.sample(short_ids, 1000)))
+        report(f'resume {LONG_SESSIONS} long sessions', resume(config, store, long_ids))
+        chat = Chat.from_session(config, store.open(long_ids[0]))
+        start = time.perf_counter()
+        oldest = chat.history[0]
+        print(f'  {chat.history}, oldest message read lazily in {(time.perf_counter() - start) * 1e6:.0f} us: '
+              f'{oldest.content[:30]!r}')
+
+        start = time.perf_counter()
+        for session_id in long_ids:
+            store.compact(session_id)
+        print(f'compact {LONG_SESSIONS} long sessions: {time.perf_counter() - start:.2f} s')
+        report(f'resume {LONG_SESSIONS} compacted sessions', resume(config, store, long_ids))
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Upstream hits of identical requests sent at the same moment, in thread and asyncio modes.
+
+The stand-in server answers after a latency, so the requests overlap and the coalescing layer of
+ResponseCache lets one upstream call serve all of them.
+
+Run from the repository root: python -m benchmarks.bench_single_flight
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from infrastructure.cache.response_cache_impl import ResponseCache
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+from infrastructure.completion.completion_facade_impl import CompletionFacadeImpl
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+
+CALLERS = 200
+SESSIONS = 1000
+
+
+async def bench_threads(server: StubServer, config: APIConfiguration) -> None:
+    facade = CompletionFacadeImpl(config, ResponseCache(config), RequestScheduler(config))
+    barrier = threading.Barrier(CALLERS)
+
+    def call(_) -> str:
+        barrier.wait()
+        # Opt out of caching, so only the coalescing of in-flight requests is measured
+        return facade.create(prompt='¿Cual es el precio promedio del m2 en CDMX?', cache=False).message
+
+    def run_callers() -> list[str]:
+        with ThreadPoolExecutor(max_workers=CALLERS) as threads:
+            return list(threads.map(call, range(CALLERS)))
+
+    # The callers block, so they run off the event loop that serves the stand-in server
+    answers = await asyncio.to_thread(run_callers)
+    print(f'threads: {CALLERS} callers, {len(set(answers))} distinct answer(s), '
+          f'{server.hits.get("completion", 0)} upstream hit(s), {facade.cache.stats["coalesced"]} coalesced')
+
+
+async def bench_asyncio(server: StubServer, config: APIConfiguration) -> None:
+    cache = ResponseCache(config)
+    chats = [Chat(config=config) for _ in range(SESSIONS)]
+    async with AsyncChatEngine(config, cache) as engine:
+        await asyncio.gather(*(engine.run_turn(chat, 'Promociones de la campaña de marzo', cache=False)
+                               for chat in chats))
+    print(f'asyncio: {SESSIONS} sessions, {server.hits.get("chat", 0)} upstream hit(s), '
+          f'{cache.stats["coalesced"]} coalesced')
+
+
+async def main() -> None:
+    async with StubServer(latency=0.2) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, MODEL='text-davinci-003',
+                                  TEMPERATURE='0.7')
+        await bench_threads(server, config)
+        await bench_asyncio(server, config)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""Import time and memory of every entry point, each started in a fresh interpreter.
+
+Every entry point is run three times with `python -X importtime`; the fastest run is reported, with the
+packages that took the longest to import, the peak RSS and the heavy modules that were loaded. With `--check`, the
+script exits with status 1 when an entry point misses its target, so it can gate a CI job.
+
+Run from the repository root: python -m benchmarks.bench_startup [--check]
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS: dict[str, str] = {
+    'chat': 'import main; main.injector.get(main.ChatBotFacade)',
+    'img': 'import main; main.injector.get(main.DalleImgFacadeImpl)',
+    'compact sessions': 'import infrastructure.session.session_store_impl',
+    'bulk classifier': 'import infrastructure.message_classifier.bulk_classifier',
+}
+# The import time (ms) and peak RSS (MB) every entry point must stay under
+TARGETS: dict[str, tuple[float, float]] = {
+    'chat': (1000, 150),
+    'img': (1000, 150),
+    'compact sessions': (300, 80),
+    'bulk classifier': (1000, 150),
+}
+HEAVY_MODULES: tuple[str, ...] = ('torch', 'transformers', 'optimum', 'onnxruntime')
+REPORT = ("import resource, sys; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "
+          f"*[name for name in {HEAVY_MODULES!r} if name in sys.modules])")
+RUNS = 3
+PROJECT_PACKAGES: tuple[str, ...] = ('main', 'injectable', 'config', 'domain', 'infrastructure', 'benchmarks')
+
+
+def run(code: str) -> tuple[float, float, float, list[tuple[int, str]], list[str]]:
+    """Get the wall time, import time and peak RSS of an entry point, its slowest packages and heavy modules."""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'{code}; {REPORT}'],
+                             capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    total, packages = 0, {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # The top level imports add up to the import time; the nested ones are attributed to their package
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+        package = name.strip().split('.')[0]
+        if package not in PROJECT_PACKAGES:
+            packages[package] = max(packages.get(package, 0), int(cumulative))
+    rss, *heavy = process.stdout.split()
+    slowest = sorted(((us, package) for package, us in packages.items()), reverse=True)
+    return wall, total / 1000, int(rss) / 1024, slowest, heavy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--check', action='store_true', help='exit with status 1 when a target is missed')
+    args = parser.parse_args()
+    missed = []
+    for name, code in ENTRY_POINTS.items():
+        wall, import_ms, rss, slowest, heavy = min((run(code) for _ in range(RUNS)), key=lambda result: result[1])
+        max_ms, max_rss = TARGETS[name]
+        ok = import_ms <= max_ms and rss <= max_rss
+        if not ok:
+            missed.append(name)
+        print(f'{name:<16}: imports {import_ms:>6.0f} ms (target {max_ms:g}), RSS {rss:>5.0f} MB '
+              f'(target {max_rss:g}), wall {wall * 1000:>5.0f} ms {"ok" if ok else "MISSED"}')
+        print(f'  slowest packages: {", ".join(f"{package} {us / 1000:.0f} ms" for us, package in slowest[:4])}')
+        print(f'  heavy modules loaded: {", ".join(heavy) or "none"}')
+    if args.check and missed:
+        sys.exit(f'Startup targets missed: {", ".join(missed)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Overhead of the instrumentation, per span and per turn, and a sample of what it exports.
+
+The cost of an instrumented stage is measured alone, disabled (NullTelemetry, whose spans are a shared
+no-op), enabled and enabled with a JSONL trace. Then
+100 sessions of 5 turns run against the stand-in server with AsyncChatEngine, and 100 turns with the
+sync Chat from a worker thread, without telemetry and with it.
+
+Run from the repository root: python -m benchmarks.bench_telemetry
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from domain.telemetry.i_telemetry import ITelemetry
+from domain.telemetry.null_telemetry import NULL_TELEMETRY
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+from infrastructure.telemetry.telemetry_impl import Telemetry
+
+SPANS = 200_000
+SESSIONS = 100
+TURNS_PER_SESSION = 5
+SYNC_TURNS = 100
+
+
+def span_cost(telemetry: ITelemetry) -> float:
+    start = time.perf_counter()
+    for _ in range(SPANS):
+        with telemetry.span('stage'):
+            pass
+    return (time.perf_counter() - start) / SPANS * 1e9
+
+
+def sync_turns(config: APIConfiguration, telemetry: ITelemetry) -> None:
+    chat = Chat(config=config, telemetry=telemetry)
+
+    for turn in range(SYNC_TURNS):
+        with telemetry.span('turn', stream=False):
+            chat.add(Message.from_user(f'Pregunta {turn} sobre casas en Monterrey'))
+            chat.add(chat.process_message_response())
+
+
+async def run_session(engine: AsyncChatEngine, chat: Chat) -> None:
+    for turn in range(TURNS_PER_SESSION):
+        await engine.run_turn(chat, f'Pregunta {turn} sobre casas en Guadalajara')
+
+
+async def bench_turns(config: APIConfiguration, telemetry: ITelemetry) -> tuple[float, float]:
+    chats = [Chat(config=config, telemetry=telemetry) for _ in range(SESSIONS)]
+    async with AsyncChatEngine(config) as engine:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_session(engine, chat) for chat in chats))
+        async_rate = SESSIONS * TURNS_PER_SESSION / (time.perf_counter() - start)
+    start = time.perf_counter()
+    await asyncio.to_thread(sync_turns, config, telemetry)
+    return async_rate, SYNC_TURNS / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        trace_path = os.path.join(directory, 'trace.jsonl')
+        traced = Telemetry(APIConfiguration(TELEMETRY_TRACE_PATH=os.path.join(directory, 'spans.jsonl')))
+        print(f'stage cost: disabled {span_cost(NULL_TELEMETRY):.0f} ns, '
+              f'enabled {span_cost(Telemetry(APIConfiguration())):.0f} ns, traced {span_cost(traced):.0f} ns')
+
+        async with StubServer() as server:
+            config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base)
+            telemetry = Telemetry(APIConfiguration(TELEMETRY_TRACE_PATH=trace_path))
+            for name, instrumentation in (('disabled', NULL_TELEMETRY), ('enabled', telemetry)):
+                async_rate, sync_rate = await bench_turns(config, instrumentation)
+                print(f'telemetry {name:<8}: async {async_rate:>7.1f} turns/s, sync {sync_rate:>6.1f} turns/s')
+        telemetry.flush()
+        with open(trace_path, 'rb') as file:
+            print(f'{sum(1 for _ in file)} trace records')
+        for stage in ('turn', 'prompt_build', 'serialize', 'upstream'):
+            histogram = telemetry.histogram('span_seconds', span=stage)
+            print(f'  {stage:<12} {histogram.count:>5} spans, mean {histogram.sum / histogram.count * 1000:.3f} ms')
+        print('\n'.join(line for line in telemetry.prometheus_text().splitlines()
+                        if line.startswith(('chatbot_tokens', 'chatbot_cost', 'chatbot_span_seconds_count'))))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
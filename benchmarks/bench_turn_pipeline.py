@@ -0,0 +1,68 @@
+"""Turn latency of the concurrent per-turn pipeline of AsyncChatEngine against running its stages in sequence.
+
+Each stage is made to take about 200 ms: the chat completion (stand-in server latency), the message
+classification (a classifier that blocks like a CPU forward pass) and the summary (the chat is kept at its
+hard token limit, so the summary completion is awaited every turn).
+
+Run from the repository root: python -m benchmarks.bench_turn_pipeline
+"""
+import asyncio
+import time
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from domain.message_classifier.i_message_classifier_facade import IMessageClassifierFacade
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+
+STAGE_SECONDS = 0.2
+TURNS = 5
+
+
+class SlowClassifier(IMessageClassifierFacade):
+
+    def initialize(self, config: APIConfiguration) -> None:
+        pass
+
+    def predict(self, msg: Message) -> dict:
+        time.sleep(STAGE_SECONDS)
+        return {'sequence': msg.content, 'labels': ['informacion', 'servicio', 'otro'], 'scores': [0.8, 0.1, 0.1]}
+
+    def predict_many(self, msgs: list[Message]) -> list[dict]:
+        return [self.predict(msg) for msg in msgs]
+
+
+def new_chat(config: APIConfiguration) -> Chat:
+    chat = Chat(config=config, classifier=SlowClassifier(), _max_tokens=1)
+    chat.used_tokens = 1
+    return chat
+
+
+async def sequential_turn(engine: AsyncChatEngine, chat: Chat, prompt: str) -> None:
+    loop = asyncio.get_running_loop()
+    user_msg = Message.from_user(prompt)
+    chat.add(user_msg)
+    await loop.run_in_executor(engine._executor, chat.classify_message, user_msg)
+    chat.add(await engine.process_message_response(chat))
+    await loop.run_in_executor(engine._executor, engine._update_resume_chat, chat)
+
+
+async def main() -> None:
+    async with StubServer(latency=STAGE_SECONDS) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base)
+        async with AsyncChatEngine(config) as engine:
+            for name, run in (('sequential', lambda chat, prompt: sequential_turn(engine, chat, prompt)),
+                              ('concurrent', engine.run_turn)):
+                chat = new_chat(config)
+                start = time.perf_counter()
+                for turn in range(TURNS):
+                    await run(chat, f'Turno {turn}: ¿que zonas recomiendas en Merida?')
+                latency = (time.perf_counter() - start) / TURNS
+                classified = sum(msg.classification is not None for msg in chat.history if msg.role == 'user')
+                print(f'{name}: {latency * 1000:>6.0f} ms per turn, {classified}/{TURNS} user messages classified, '
+                      f'summary: {chat.summary is not None}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
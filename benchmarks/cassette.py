@@ -0,0 +1,70 @@
+import itertools
+import os
+from typing import Iterator
+
+from domain._json_serialize import dumps, loads
+from infrastructure.cache.response_cache_impl import request_key
+
+
+class Cassette:
+    """
+    The API interactions recorded by the stand-in server, one JSON object per line, to replay them later.
+
+    An interaction holds the path, the hash and streaming flag of the request, and the status, content
+    type, body and latency of the response. A replayed request gets the response recorded for the same
+    request; unless the cassette is strict, a request that was not recorded gets the responses recorded
+    on its path in turn, so a load test with new prompts still receives real bodies and latencies.
+
+    Attributes:
+    ----------
+    path : str
+        The JSONL file of the cassette.
+    strict : bool
+        Whether only the recorded requests are replayed.
+    interactions : list[dict]
+        The recorded interactions.
+    """
+
+    def __init__(self, path: str, *, strict: bool = False):
+        self.path: str = path
+        self.strict: bool = strict
+        self.interactions: list[dict] = []
+        self._by_key: dict[str, Iterator[dict]] = {}
+        self._by_path: dict[tuple[str, bool], Iterator[dict]] = {}
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                self.interactions = [loads(line) for line in file if line.strip()]
+        self._index()
+
+    def __len__(self) -> int:
+        return len(self.interactions)
+
+    def _index(self) -> None:
+        by_key, by_path = {}, {}
+        for interaction in self.interactions:
+            by_key.setdefault(interaction['key'], []).append(interaction)
+            by_path.setdefault((interaction['path'], interaction['stream']), []).append(interaction)
+        # Repeated requests cycle through their recorded responses
+        self._by_key = {key: itertools.cycle(group) for key, group in by_key.items()}
+        self._by_path = {key: itertools.cycle(group) for key, group in by_path.items()}
+
+    @staticmethod
+    def key(body: dict) -> str:
+        return request_key(body)
+
+    def record(self, path: str, body: dict, *, status: int, content_type: str, response: str,
+               latency: float) -> None:
+        """Add an interaction and append it to the cassette file."""
+        interaction = {'path': path, 'key': self.key(body), 'stream': bool(body.get('stream')), 'status': status,
+                       'content_type': content_type, 'body': response, 'latency': latency}
+        self.interactions.append(interaction)
+        with open(self.path, 'ab') as file:
+            file.write(dumps(interaction) + b'\n')
+        self._index()
+
+    def match(self, path: str, body: dict) -> dict | None:
+        """Get the recorded interaction replaying a request, or None if there is none."""
+        recorded = self._by_key.get(self.key(body))
+        if recorded is None and not self.strict:
+            recorded = self._by_path.get((path, bool(body.get('stream'))))
+        return None if recorded is None else next(recorded)
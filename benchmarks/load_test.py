@@ -0,0 +1,183 @@
+"""Load test of the chat, completion and image paths against the stand-in server.
+
+N simulated users chat through ChatBotFacade at the same time, each sending its prompts with a think
+time between turns, while completion and image requests run next to them. The stand-in server answers
+with a log-normal latency and injected 429s, or replays a cassette; with `--record`, it records a
+cassette from the real API first. The report gives the throughput, the latency percentiles of each path,
+the failed turns, the retries, and the tokens and cost counted by the telemetry.
+
+Run from the repository root:
+    python -m benchmarks.load_test --users 50 --turns 10 --latency 0.2 --error-rate 0.05
+    python -m benchmarks.load_test --cassette chat.jsonl --record https://api.openai.com/v1 --users 2 --turns 3
+    python -m benchmarks.load_test --cassette chat.jsonl --users 100
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from injector import Injector, provider, singleton
+
+from benchmarks.cassette import Cassette
+from benchmarks.stub_server import StubServer, lognormal_latency
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.telemetry.i_telemetry import ITelemetry
+from infrastructure.chat_bot.chat_bot_facade_impl import ChatBotFacade
+from infrastructure.completion.completion_facade_impl import CompletionFacadeImpl
+from infrastructure.dalle_img.img_pipeline_impl import ImgPipeline
+from infrastructure.scheduler.hedging import LatencyTracker
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+from injectable import AppModule
+
+TOPICS = ('casas en Merida', 'departamentos en Monterrey', 'terrenos en Queretaro', 'credito Infonavit',
+          'renta en Guadalajara', 'avaluos', 'escrituras', 'oficinas en CDMX')
+
+
+class LoadTestModule(AppModule):
+    """The application module, with the configuration of the load test."""
+
+    def __init__(self, **overrides: str):
+        self.overrides: dict[str, str] = overrides
+
+    @singleton
+    @provider
+    def provide_config(self) -> APIConfiguration:
+        return APIConfiguration(**self.overrides)
+
+
+class SimulatedUser:
+    """
+    The prompts of a simulated user, handed to the chat one at a time.
+
+    The chat asks for the next prompt as soon as a turn ends, so the time between two prompts, less the
+    think time, is the latency of the turn as the user sees it.
+    """
+
+    def __init__(self, user: int, turns: int, *, think_time: float, latencies: LatencyTracker):
+        rng = random.Random(user)
+        self.prompts: list[str] = [f'¿Que opciones hay de {rng.choice(TOPICS)} por {rng.randint(1, 9)} millones?'
+                                   for _ in range(turns)]
+        self.think_time: float = think_time
+        self.latencies: LatencyTracker = latencies
+        self._rng = rng
+        self._sent_at: float | None = None
+
+    def __iter__(self) -> 'SimulatedUser':
+        return self
+
+    def __next__(self) -> str:
+        if self._sent_at is not None:
+            self.latencies.record(time.perf_counter() - self._sent_at)
+        if not self.prompts:
+            raise StopIteration
+        if self.think_time:
+            time.sleep(self._rng.uniform(0, 2 * self.think_time))
+        self._sent_at = time.perf_counter()
+        return self.prompts.pop(0)
+
+
+def percentiles(latencies: LatencyTracker) -> str:
+    ms = {name: value * 1000 for name, value in latencies.percentiles().items() if value is not None}
+    return ', '.join(f'{name} {value:.0f} ms' for name, value in ms.items()) or 'no samples'
+
+
+def run_completions(injector: Injector, count: int, latencies: LatencyTracker, errors: list[Exception]) -> None:
+    facade = injector.get(CompletionFacadeImpl)
+    for n in range(count):
+        start = time.perf_counter()
+        try:
+            facade.create(prompt=f'Describe una casa de {n} recamaras en {TOPICS[n % len(TOPICS)]}')
+        except Exception as error:
+            errors.append(error)
+            continue
+        latencies.record(time.perf_counter() - start)
+
+
+def run_images(injector: Injector, count: int) -> float:
+    start = time.perf_counter()
+    injector.get(ImgPipeline).generate([f'Fachada de {TOPICS[n % len(TOPICS)]}, estilo {n}' for n in range(count)])
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Load test of the chat, completion and image paths.')
+    parser.add_argument('--users', type=int, default=50, help='simulated chat users')
+    parser.add_argument('--turns', type=int, default=10, help='turns per user')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean seconds between the turns of a user')
+    parser.add_argument('--stream', action='store_true', help='stream the chat answers')
+    parser.add_argument('--completions', type=int, default=0, help='completion requests sent next to the chats')
+    parser.add_argument('--images', type=int, default=0, help='image prompts generated next to the chats')
+    parser.add_argument('--latency', type=float, default=0.2, help='median seconds of the server latency')
+    parser.add_argument('--sigma', type=float, default=0.5, help='log-normal spread of the server latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=0.1, help='Retry-After of the injected 429s')
+    parser.add_argument('--cassette', help='JSONL cassette replayed, or recorded with --record')
+    parser.add_argument('--record', metavar='UPSTREAM', help='record the cassette from this API base url')
+    parser.add_argument('--rpm', type=int, default=1_000_000, help='requests per minute allowed by the scheduler')
+    parser.add_argument('--tpm', type=int, default=1_000_000_000, help='tokens per minute allowed by the scheduler')
+    args = parser.parse_args()
+    if args.record and not args.cassette:
+        parser.error('--record needs --cassette')
+    if args.record and not APIConfiguration().api_key:
+        parser.error('--record needs the OPEN_AI_TOKEN of the real API in .env')
+
+    cassette = Cassette(args.cassette) if args.cassette else None
+    server = StubServer(latency=lognormal_latency(args.latency, args.sigma), error_rate=args.error_rate,
+                        error_statuses=(429,), retry_after=args.retry_after, cassette=cassette,
+                        upstream=args.record, image_size=64 * 1024)
+    with server, tempfile.TemporaryDirectory() as img_dir:
+        # Recording sends the key of the environment to the real API; the stand-in accepts any key
+        api_key = APIConfiguration().api_key if args.record else 'stub'
+        injector = Injector(LoadTestModule(OPEN_AI_TOKEN=api_key, OPEN_AI_API_BASE=server.api_base,
+                                           MODEL='text-davinci-003', TEMPERATURE='0.7', TELEMETRY='true',
+                                           CLASSIFY_MESSAGES='false', IMG_DIR=img_dir,
+                                           RATE_LIMIT_RPM=str(args.rpm), RATE_LIMIT_TPM=str(args.tpm)))
+        turn_latencies = LatencyTracker(window=args.users * args.turns)
+        completion_latencies = LatencyTracker(window=max(1, args.completions))
+        completion_errors: list[Exception] = []
+        users = [SimulatedUser(user, args.turns, think_time=args.think_time, latencies=turn_latencies)
+                 for user in range(args.users)]
+        side_jobs = []
+        start = time.perf_counter()
+        if args.completions:
+            side_jobs.append(threading.Thread(target=run_completions, args=(injector, args.completions,
+                                                                            completion_latencies, completion_errors)))
+        image_seconds = []
+        if args.images:
+            side_jobs.append(threading.Thread(target=lambda: image_seconds.append(run_images(injector, args.images))))
+        for job in side_jobs:
+            job.start()
+        with ThreadPoolExecutor(max_workers=args.users) as executor:
+            chats: list[Chat] = list(executor.map(
+                lambda user: injector.get(ChatBotFacade).run(stream=args.stream, prompts=user), users))
+        chat_seconds = time.perf_counter() - start
+        for job in side_jobs:
+            job.join()
+
+    answered = sum(sum(1 for msg in chat.history if msg.role == 'assistant') for chat in chats)
+    sent = args.users * args.turns
+    print(f'chat: {args.users} users x {args.turns} turns in {chat_seconds:.1f} s, {sent / chat_seconds:.1f} turns/s, '
+          f'{sent - answered} failed')
+    print(f'  turn latency: {percentiles(turn_latencies)}')
+    if args.completions:
+        print(f'completions: {args.completions}, {len(completion_errors)} failed, '
+              f'latency {percentiles(completion_latencies)}')
+        if completion_errors:
+            print(f'  first error: {completion_errors[0]!r}')
+    if args.images:
+        print(f'images: {args.images} in {image_seconds[0]:.1f} s, {args.images / image_seconds[0]:.1f} images/s')
+    print(f'server: {dict(sorted(server.hits.items()))}, scheduler retries: {injector.get(RequestScheduler).retries}')
+    telemetry = injector.get(ITelemetry)
+    for labels, value in sorted(telemetry.series('tokens'), key=lambda item: sorted(item[0].items())):
+        print(f'  {labels["model"]} {labels["kind"]} tokens: {value:,.0f}')
+    cost = sum(value for _, value in telemetry.series('cost_usd'))
+    print(f'  cost at list prices: ${cost:.4f}')
+    if cassette is not None:
+        print(f'cassette: {len(cassette)} interactions in {cassette.path}')
+
+
+if __name__ == '__main__':
+    main()
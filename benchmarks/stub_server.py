@@ -0,0 +1,272 @@
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+from typing import Callable
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.cassette import Cassette
+
+ROUTES: dict[str, str] = {'/v1/chat/completions': 'chat', '/v1/completions': 'completion',
+                          '/v1/images/generations': 'image'}
+
+
+def lognormal_latency(median: float, sigma: float, *, seed: int = 0) -> Callable[[], float]:
+    """Sample latencies from a log-normal distribution, the long-tailed shape of API latencies."""
+    rng = random.Random(seed)
+    return lambda: median * rng.lognormvariate(0, sigma)
+
+
+def empirical_latency(samples: list[float], *, seed: int = 0) -> Callable[[], float]:
+    """Sample latencies from measured ones, such as the latencies of a cassette."""
+    rng = random.Random(seed)
+    return lambda: rng.choice(samples)
+
+
+class StubServer:
+    """
+    A local stand-in for the OpenAI HTTP API, used by the benchmarks.
+
+    It answers chat completion and completion requests with canned bodies in the shapes `Prediction` and
+    `CompletionResponse` parse, and image requests with fake images served by URL or as base64 JSON,
+    after an optional latency, and counts the hits, so the engines can be exercised without network
+    access or API costs.
+
+    With a cassette, the server replays the recorded responses instead, after their recorded latency
+    unless `replay_latency` is off. With an `upstream` API as well, it records: every request is sent to
+    the upstream API and its response is written to the cassette before it is relayed. Injected errors
+    apply in every mode. The server runs in the event loop of the caller with `async with`, or in a
+    background thread with `with`, for sync clients.
+
+    Attributes:
+    ----------
+    host : str
+        The interface the server listens on.
+    latency : float | Callable[[], float]
+        The seconds every request waits before it is answered, or a function sampling them.
+    error_rate : float
+        The fraction of requests answered with one of `error_statuses` instead.
+    error_statuses : tuple[int, ...]
+        The HTTP statuses of the injected errors, 429 and 503 by default.
+    retry_after : float | None
+        The Retry-After header sent with injected 429 responses, or None to omit it.
+    image_size : int
+        The number of bytes of the fake images.
+    cassette : Cassette | None
+        The recorded interactions replayed, or recorded with an `upstream`, or None.
+    upstream : str | None
+        The base url of the API the requests are recorded from, or None to replay.
+    replay_latency : bool
+        Whether replayed responses wait their recorded latency instead of `latency`.
+    hits : dict[str, int]
+        The number of requests served per route.
+    """
+
+    def __init__(self, *, host: str = '127.0.0.1', port: int = 0, latency: float | Callable[[], float] = 0.0, error_rate: float = 0.0,
+                 error_statuses: tuple[int, ...] = (429, 503), retry_after: float | None = None, image_size: int = 256 * 1024,
+                 cassette: Cassette | None = None, upstream: str | None = None, replay_latency: bool = True,
+                 seed: int = 0):
+        self.host: str = host
+        self.latency: float | Callable[[], float] = latency
+        self.error_rate: float = error_rate
+        self.error_statuses: tuple[int, ...] = error_statuses
+        self.retry_after: float | None = retry_after
+        self._random = random.Random(seed)
+        self._port: int = port
+        self.image_size: int = image_size
+        self._image: bytes = b'\x89PNG\r\n\x1a\n' + self._random.randbytes(max(0, image_size - 8))
+        self.cassette: Cassette | None = cassette
+        self.upstream: str | None = upstream
+        self.replay_latency: bool = replay_latency
+        self.hits: dict[str, int] = {}
+        self._runner: web.AppRunner | None = None
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.app = web.Application(middlewares=[self._cassette_middleware] if cassette is not None else [])
+        self.app.router.add_post('/v1/chat/completions', self._chat_completions)
+        self.app.router.add_post('/v1/completions', self._completions)
+        self.app.router.add_post('/v1/images/generations', self._images)
+        self.app.router.add_get('/files/{name}', self._image_file)
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    @property
+    def api_base(self) -> str:
+        """Get the base url to use as `OPEN_AI_API_BASE`."""
+        return f'http://{self.host}:{self.port}/v1'
+
+    def _count(self, route: str) -> None:
+        self.hits[route] = self.hits.get(route, 0) + 1
+
+    async def _wait(self) -> None:
+        await asyncio.sleep(self.latency() if callable(self.latency) else self.latency)
+
+    def _injected_error(self) -> web.Response | None:
+        if self._random.random() >= self.error_rate:
+            return None
+        status = self._random.choice(self.error_statuses)
+        self._count(f'error_{status}')
+        headers = {'Retry-After': str(self.retry_after)} if status == 429 and self.retry_after is not None else {}
+        return web.json_response({'error': {'message': 'Injected error', 'type': 'stub_error', 'param': None,
+                                            'code': None}}, status=status, headers=headers)
+
+    @web.middleware
+    async def _cassette_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        route = ROUTES.get(request.path)
+        if route is None:
+            return await handler(request)
+        body = await request.json()
+        if self.upstream is not None:
+            return await self._record(request, body)
+        interaction = self.cassette.match(request.path, body)
+        if interaction is None:
+            # Without a recording, the canned answers of the route are sent
+            return await handler(request)
+        self._count(route)
+        self._count('replayed')
+        if self.replay_latency:
+            await asyncio.sleep(interaction['latency'])
+        else:
+            await self._wait()
+        if (error := self._injected_error()) is not None:
+            return error
+        if not interaction['stream']:
+            return web.Response(text=interaction['body'], status=interaction['status'],
+                                content_type=interaction['content_type'])
+        response = web.StreamResponse(status=interaction['status'],
+                                      headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for event in interaction['body'].split('\n\n'):
+            if event:
+                await response.write(f'{event}\n\n'.encode())
+        await response.write_eof()
+        return response
+
+    async def _record(self, request: web.Request, body: dict) -> web.Response:
+        self._count(f'recorded_{ROUTES[request.path]}')
+        url = self.upstream.rstrip('/') + request.path.removeprefix('/v1')
+        headers = {'Authorization': request.headers.get('Authorization', '')}
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json=body, headers=headers) as upstream:
+                # A streamed answer is relayed whole once it is recorded
+                text = await upstream.text()
+                content_type = upstream.content_type
+                status = upstream.status
+        self.cassette.record(request.path, body, status=status, content_type=content_type, response=text,
+                             latency=time.perf_counter() - start)
+        return web.Response(text=text, status=status, content_type=content_type)
+
+    async def _chat_completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self._count('chat')
+        await self._wait()
+        if (error := self._injected_error()) is not None:
+            return error
+        content = 'Respuesta de prueba sobre bienes raices.'
+        if body.get('stream'):
+            return await self._stream(request, body['model'], content)
+        return web.json_response({
+            'id': f'chatcmpl-{self.hits["chat"]}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body['model'],
+            'usage': {'prompt_tokens': 10 * len(body['messages']), 'completion_tokens': 8,
+                      'total_tokens': 10 * len(body['messages']) + 8},
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+        })
+
+    async def _completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self._count('completion')
+        await self._wait()
+        if (error := self._injected_error()) is not None:
+            return error
+        prompts = body['prompt'] if isinstance(body['prompt'], list) else [body['prompt']]
+        return web.json_response({
+            'id': f'cmpl-{self.hits["completion"]}',
+            'object': 'text_completion',
+            'created': int(time.time()),
+            'model': body['model'],
+            'usage': {'prompt_tokens': 10 * len(prompts), 'completion_tokens': 5 * len(prompts),
+                      'total_tokens': 15 * len(prompts)},
+            'choices': [{'index': index, 'finish_reason': 'stop', 'logprobs': None,
+                         'text': f' Respuesta a: {prompt[:40]}'} for index, prompt in enumerate(prompts)],
+        })
+
+    async def _images(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self._count('image')
+        await self._wait()
+        if (error := self._injected_error()) is not None:
+            return error
+        if body.get('response_format') == 'b64_json':
+            encoded = base64.b64encode(self._image).decode()
+            data = [{'b64_json': encoded} for _ in range(body.get('n', 1))]
+        else:
+            data = [{'url': f'http://{self.host}:{self.port}/files/{self.hits["image"]}-{index}.png'}
+                    for index in range(body.get('n', 1))]
+        return web.json_response({'created': int(time.time()), 'data': data})
+
+    async def _image_file(self, request: web.Request) -> web.Response:
+        self._count('image_file')
+        return web.Response(body=self._image, content_type='image/png')
+
+    async def _stream(self, request: web.Request, model: str, content: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for token in content.split(' '):
+            chunk = {'id': f'chatcmpl-{self.hits["chat"]}', 'object': 'chat.completion.chunk',
+                     'created': int(time.time()), 'model': model,
+                     'choices': [{'index': 0, 'finish_reason': None, 'delta': {'content': token + ' '}}]}
+            await response.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+        await response.write(b'data: [DONE]\n\n')
+        await response.write_eof()
+        return response
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self._port)
+        await site.start()
+        self._port = self._runner.addresses[0][1]
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def __enter__(self) -> 'StubServer':
+        started = threading.Event()
+
+        def serve() -> None:
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.close())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name='stub-server', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    async def __aenter__(self) -> 'StubServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
@@ -3,8 +3,8 @@ from dotenv import dotenv_values
 
 class APIConfiguration:
 
-    def __init__(self):
-        self._env: dict[str, str | None] = dotenv_values(".env")
+    def __init__(self, **overrides: str):
+        self._env: dict[str, str | None] = {**dotenv_values(".env"), **overrides}
 
     @property
     def api_key(self) -> str:
@@ -21,3 +21,202 @@ class APIConfiguration:
     @property
     def hugging_face_token(self) -> str:
         return self._env.get('HUGGING_FACE_TOKEN')
+
+    @property
+    def api_base(self) -> str:
+        return self._env.get('OPEN_AI_API_BASE') or 'https://api.openai.com/v1'
+
+    @property
+    def api_max_connections(self) -> int:
+        return int(self._env.get('MAX_CONNECTIONS') or 100)
+
+    @property
+    def api_context_window(self) -> int:
+        return int(self._env.get('CONTEXT_WINDOW') or 4096)
+
+    @property
+    def classifier_max_batch_size(self) -> int:
+        return int(self._env.get('CLASSIFIER_MAX_BATCH_SIZE') or 16)
+
+    @property
+    def classifier_max_wait(self) -> float:
+        return float(self._env.get('CLASSIFIER_MAX_WAIT') or 0.01)
+
+    @property
+    def classifier_model(self) -> str:
+        return self._env.get('CLASSIFIER_MODEL') or 'Recognai/bert-base-spanish-wwm-cased-xnli'
+
+    @property
+    def classifier_backend(self) -> str:
+        return self._env.get('CLASSIFIER_BACKEND') or 'pytorch'
+
+    @property
+    def classifier_onnx_dir(self) -> str | None:
+        return self._env.get('CLASSIFIER_ONNX_DIR')
+
+    @property
+    def classify_messages(self) -> bool:
+        return (self._env.get('CLASSIFY_MESSAGES') or 'true').lower() in ('1', 'true', 'yes')
+
+    @property
+    def cache_ttl(self) -> float:
+        return float(self._env.get('CACHE_TTL') or 3600)
+
+    @property
+    def cache_max_entries(self) -> int:
+        return int(self._env.get('CACHE_MAX_ENTRIES') or 1024)
+
+    @property
+    def cache_max_bytes(self) -> int:
+        return int(self._env.get('CACHE_MAX_BYTES') or 64 * 2 ** 20)
+
+    @property
+    def cache_path(self) -> str | None:
+        return self._env.get('CACHE_PATH')
+
+    @property
+    def completion_batch_prompts(self) -> int:
+        return int(self._env.get('COMPLETION_BATCH_PROMPTS') or 20)
+
+    @property
+    def completion_batch_tokens(self) -> int:
+        return int(self._env.get('COMPLETION_BATCH_TOKENS') or 20000)
+
+    @property
+    def rate_limit_rpm(self) -> int:
+        return int(self._env.get('RATE_LIMIT_RPM') or 3500)
+
+    @property
+    def rate_limit_tpm(self) -> int:
+        return int(self._env.get('RATE_LIMIT_TPM') or 90000)
+
+    @property
+    def max_retries(self) -> int:
+        return int(self._env.get('MAX_RETRIES') or 5)
+
+    @property
+    def retry_base_delay(self) -> float:
+        return float(self._env.get('RETRY_BASE_DELAY') or 0.5)
+
+    @property
+    def retry_max_delay(self) -> float:
+        return float(self._env.get('RETRY_MAX_DELAY') or 30)
+
+    @property
+    def request_deadline(self) -> float:
+        return float(self._env.get('REQUEST_DEADLINE') or 60)
+
+    @property
+    def hedge_requests(self) -> bool:
+        return (self._env.get('HEDGE_REQUESTS') or 'false').lower() in ('1', 'true', 'yes')
+
+    @property
+    def hedge_delay(self) -> float | None:
+        delay = self._env.get('HEDGE_DELAY')
+        return float(delay) if delay else None
+
+    @property
+    def hedge_budget(self) -> float:
+        return float(self._env.get('HEDGE_BUDGET') or 0.1)
+
+    @property
+    def route_faq_index(self) -> str | None:
+        return self._env.get('ROUTE_FAQ_INDEX')
+
+    @property
+    def route_faq_threshold(self) -> float:
+        return float(self._env.get('ROUTE_FAQ_THRESHOLD') or 0.85)
+
+    @property
+    def route_low_value_labels(self) -> list[str]:
+        labels = self._env.get('ROUTE_LOW_VALUE_LABELS')
+        return labels.split(',') if labels else []
+
+    @property
+    def route_low_value_threshold(self) -> float:
+        return float(self._env.get('ROUTE_LOW_VALUE_THRESHOLD') or 0.6)
+
+    @property
+    def route_cheap_model(self) -> str:
+        return self._env.get('ROUTE_CHEAP_MODEL') or 'gpt-3.5-turbo'
+
+    @property
+    def route_cheap_max_tokens(self) -> int:
+        return int(self._env.get('ROUTE_CHEAP_MAX_TOKENS') or 150)
+
+    @property
+    def route_cheap_context_messages(self) -> int:
+        return int(self._env.get('ROUTE_CHEAP_CONTEXT_MESSAGES') or 4)
+
+    @property
+    def route_messages(self) -> bool:
+        return bool(self.route_faq_index or self.route_low_value_labels)
+
+    @property
+    def memory_mode(self) -> str:
+        return self._env.get('MEMORY_MODE') or 'summary'
+
+    @property
+    def memory_embedding_model(self) -> str:
+        return self._env.get('MEMORY_EMBEDDING_MODEL') or 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+    @property
+    def memory_embedding_batch_size(self) -> int:
+        return int(self._env.get('MEMORY_EMBEDDING_BATCH_SIZE') or 64)
+
+    @property
+    def memory_recent_turns(self) -> int:
+        return int(self._env.get('MEMORY_RECENT_TURNS') or 3)
+
+    @property
+    def memory_top_k(self) -> int:
+        return int(self._env.get('MEMORY_TOP_K') or 4)
+
+    @property
+    def session_dir(self) -> str | None:
+        return self._env.get('SESSION_DIR')
+
+    @property
+    def session_fsync_interval(self) -> float:
+        return float(self._env.get('SESSION_FSYNC_INTERVAL') or 0.05)
+
+    @property
+    def session_max_open(self) -> int:
+        return int(self._env.get('SESSION_MAX_OPEN') or 256)
+
+    @property
+    def img_dir(self) -> str:
+        return self._env.get('IMG_DIR') or 'images'
+
+    @property
+    def img_max_workers(self) -> int:
+        return int(self._env.get('IMG_MAX_WORKERS') or 8)
+
+    @property
+    def img_chunk_size(self) -> int:
+        return int(self._env.get('IMG_CHUNK_SIZE') or 64 * 1024)
+
+    @property
+    def img_response_format(self) -> str:
+        return self._env.get('IMG_RESPONSE_FORMAT') or 'url'
+
+    @property
+    def prewarm(self) -> bool:
+        return (self._env.get('PREWARM') or 'false').lower() in ('1', 'true', 'yes')
+
+    @property
+    def telemetry(self) -> bool:
+        return (self._env.get('TELEMETRY') or 'false').lower() in ('1', 'true', 'yes')
+
+    @property
+    def telemetry_trace_path(self) -> str | None:
+        return self._env.get('TELEMETRY_TRACE_PATH')
+
+    @property
+    def telemetry_prometheus_path(self) -> str | None:
+        return self._env.get('TELEMETRY_PROMETHEUS_PATH')
+
+    @property
+    def telemetry_prometheus_port(self) -> int | None:
+        port = self._env.get('TELEMETRY_PROMETHEUS_PORT')
+        return int(port) if port else None
@@ -1,17 +1,52 @@
+import dataclasses
+import functools
+import json as _json
 from abc import ABC
 
+try:
+    import orjson
+except ImportError:  # The standard library is used when orjson is not installed
+    orjson = None
+
+
+def loads(data: bytes | str) -> any:
+    """Parse JSON with orjson when it is installed, or with the standard library."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return _json.loads(data)
+
+
+def dumps(value: any) -> bytes:
+    """Serialize a value to compact UTF-8 JSON with orjson when it is installed, or with the standard library."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+@functools.cache
+def _init_fields(cls) -> frozenset[str] | None:
+    """The names of the init fields of a dataclass, or None for other classes."""
+    if not dataclasses.is_dataclass(cls):
+        return None
+    return frozenset(field.name for field in dataclasses.fields(cls) if field.init)
+
 
 class JsonSerialize(ABC):
     """
     This class provides methods to serialize objects to and from JSON format.
 
+    Dataclass subclasses ignore the keys of the JSON they do not know, so new fields of the API do not
+    break decoding.
+
     Attributes:
         None
 
     Methods:
         from_json(cls, json: dict) -> Any: Creates a new instance of the child class from a JSON response returned by the OpenAI API.
+        from_json_bytes(cls, data: bytes | str) -> Any: Creates a new instance of the child class from a raw JSON response.
         to_json(self) -> dict: Serializes an instance of the class to a dictionary in JSON format.
     """
+    __slots__ = ()
 
     @classmethod
     def from_json(cls, json: dict) -> any:
@@ -24,9 +59,25 @@ class JsonSerialize(ABC):
         Returns:
             Any: A new instance of the child class.
         """
+        fields = _init_fields(cls)
+        if fields is not None and not json.keys() <= fields:
+            json = {key: value for key, value in json.items() if key in fields}
         instance = cls(**json)
         return instance
 
+    @classmethod
+    def from_json_bytes(cls, data: bytes | str) -> any:
+        """
+        Creates a new instance of the child class from a raw JSON response, parsed with the fastest backend.
+
+        Args:
+            data (bytes | str): A raw JSON response returned by the OpenAI API.
+
+        Returns:
+            Any: A new instance of the child class.
+        """
+        return cls.from_json(loads(data))
+
     def to_json(self) -> dict:
         """
         Serializes an instance of the class to a dictionary in JSON format.
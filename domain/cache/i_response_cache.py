@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+
+class IResponseCache(ABC):
+
+    @abstractmethod
+    def get(self, request: dict | bytes):
+        NotImplementedError()
+
+    @abstractmethod
+    def set(self, request: dict | bytes, response: dict):
+        NotImplementedError()
+
+    @abstractmethod
+    def get_or_create(self, request: dict | bytes, create: Callable[[], dict], *, cache: bool | None = None):
+        NotImplementedError()
+
+    @abstractmethod
+    async def aget_or_create(self, request: dict | bytes, create: Callable[[], Awaitable[dict]], *,
+                             cache: bool | None = None):
+        NotImplementedError()
@@ -1,15 +1,65 @@
+import functools
+import json
+import logging
 import os
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, Future
 from dataclasses import dataclass, field
-from typing import Callable
+from typing import Callable, Iterator
 
 import openai
 
 from config import APIConfiguration
 from domain._json_serialize import JsonSerialize
+from domain.cache.i_response_cache import IResponseCache
 from domain.chat_bot.message import Message
+from domain.chat_bot.i_message_memory import IMessageMemory
+from domain.chat_bot.i_message_router import IMessageRouter
+from domain.chat_bot.message_store import MessageStore
 from domain.chat_bot.prediction import Prediction
+from domain.chat_bot.raw_http import post_json, post_json_stream
+from domain.chat_bot.route import Route
+from domain.chat_bot.streamed_turn import StreamedTurn
+from domain.chat_bot.token_counter import TokenCounter
 from domain.completion.completion_response import CompletionResponse
-from infrastructure.message_classifier.message_classifier_facade_impl import MessageClassifierFacadeImpl
+from domain.message_classifier.i_message_classifier_facade import IMessageClassifierFacade
+from domain.scheduler.i_hedger import IHedger
+from domain.scheduler.i_request_scheduler import IRequestScheduler
+from domain.scheduler.priority import Priority
+from domain.session.i_session_log import ISessionLog
+from domain.telemetry.i_telemetry import ITelemetry
+from domain.telemetry.null_telemetry import NULL_TELEMETRY
+
+_logger = logging.getLogger(__name__)
+
+STARTING_MSG = [
+    {"role": "system", "content": "Pretend you are a expert on Real estates in Mexico, marketing and sales. Be "
+                                  "an expert in the INEGI Mexico Data, also"
+                                  "Playfully and formal and allways answer in spanish:"},
+    {"role": "assistant", "content": "OK"},
+]
+# Shared by every chat, so the starting messages are serialized and counted once per process
+_STARTING_MESSAGES: tuple[Message, ...] = tuple(Message.from_json(msg) for msg in STARTING_MSG)
+
+
+@functools.cache
+def _body_prefix(model: str) -> bytes:
+    return b'{"model":' + json.dumps(model).encode() + b',"messages":['
+
+
+def _join_body(model: str, fragments: list, route: Route | None, stream: bool) -> bytes:
+    body = [_body_prefix(model)]
+    for fragment in fragments:
+        body += (fragment, b',')
+    body[-1] = b']'
+    if route is not None and route.max_tokens is not None:
+        body.append(b',"max_tokens":%d' % route.max_tokens)
+    if stream:
+        body.append(b',"stream":true')
+    body.append(b'}')
+    return b''.join(body)
 
 
 @dataclass
@@ -19,10 +69,30 @@ class Chat(JsonSerialize):
 
     Attributes:
     ----------
-    _current_chat : list[Message] | None
-        A list of Message objects representing the conversation, or None if the chat has not started.
-    _history_chat : list[Message]
-        A list of Message objects representing the entire conversation history.
+    classifier : IMessageClassifierFacade | None
+        The shared message classifier, or None if messages are not classified.
+    cache : IResponseCache | None
+        The shared cache of API responses, which also coalesces identical requests in flight, or None.
+    scheduler : IRequestScheduler | None
+        The shared scheduler keeping the calls within the rate limits, or None to call the API directly.
+    hedger : IHedger | None
+        The shared hedger of slow chat completion calls, or None if they are not hedged.
+    router : IMessageRouter | None
+        The shared router choosing the model, context and canned answers per message, or None.
+    memory : IMessageMemory | None
+        The semantic memory of the chat history, which replaces the rolling summary, or None.
+    session : ISessionLog | None
+        The append-only log persisting the messages and the state of the chat, or None.
+    telemetry : ITelemetry
+        The instrumentation timing the stages of the turns and counting the tokens, disabled by default.
+    _pinned_chat : list[Message]
+        The leading messages of the current chat, which are never trimmed: the starting messages and the summary.
+    _recalled : list[int]
+        The history indexes of the past messages recalled by the memory into the current chat.
+    _context_start : int
+        The history index where the latest messages of the current chat start.
+    _history_chat : MessageStore
+        The compact store of the entire conversation history.
     _model : str
         The AI model used for the conversation, default is "gpt-3.5-turbo".
     _prefix : str
@@ -33,29 +103,145 @@ class Chat(JsonSerialize):
         The number of tokens used in the chat, default is 0.
     _max_tokens : int
         The maximum number of tokens allowed in the chat, default is 400.
+    _context_window : int | None
+        The maximum number of prompt tokens sent per request, by default `APIConfiguration.api_context_window`.
+    _reply_tokens : int
+        The tokens of the context window kept free for the assistant reply, default is 512.
+    _token_counter : TokenCounter
+        The offline token counter of the chat model.
+    _summary : str | None
+        The rolling summary of the history, or None if the chat was never summarized.
+    _summarized_index : int
+        The index of the first history message not yet folded into the summary.
+    _resume_index : int
+        The history index covered by the summary requested last.
+    _resume_high_water : float
+        The fraction of `_max_tokens` at which a background summary is started, default is 0.8.
+    _keep_last_messages : int
+        The number of latest history messages kept next to the summary, default is 2.
+    _pending_resume : Future | None
+        The background summary in flight, or None if there is none.
+    _turn_stats : list[dict]
+        The latency and usage figures of every streamed turn.
+    _recent_turns : int | None
+        With a memory, the number of latest turns always sent, by default `APIConfiguration.memory_recent_turns`.
+    _retrieved_messages : int | None
+        With a memory, the number of similar past messages sent, by default `APIConfiguration.memory_top_k`.
+    _saved_state : dict | None
+        The state of the chat last written to its session log.
     """
 
     config: APIConfiguration
     verbose: bool = field(kw_only=True, default=False)
-    _current_chat: list[Message] | None = field(init=False)
-    _history_chat: list[Message] | None = field(init=False, default_factory=list)
+    classifier: IMessageClassifierFacade | None = field(kw_only=True, default=None, repr=False)
+    cache: IResponseCache | None = field(kw_only=True, default=None, repr=False)
+    scheduler: IRequestScheduler | None = field(kw_only=True, default=None, repr=False)
+    hedger: IHedger | None = field(kw_only=True, default=None, repr=False)
+    router: IMessageRouter | None = field(kw_only=True, default=None, repr=False)
+    memory: IMessageMemory | None = field(kw_only=True, default=None, repr=False)
+    session: ISessionLog | None = field(kw_only=True, default=None, repr=False)
+    telemetry: ITelemetry = field(kw_only=True, default=NULL_TELEMETRY, repr=False)
+    _pinned_chat: list[Message] = field(init=False)
+    _recalled: list[int] = field(init=False, default_factory=list)
+    _context_start: int = field(init=False, default=0)
+    _history_chat: MessageStore = field(init=False, default_factory=MessageStore)
     _model: str = field(default="gpt-3.5-turbo")
     _prefix: str = field(default=">:")
     _is_finished: bool = False
     _used_tokens: int = 0
     _max_tokens: int = 1000
+    _context_window: int | None = None
+    _reply_tokens: int = 512
+    _token_counter: TokenCounter = field(init=False, repr=False)
+    _summary: str | None = field(init=False, default=None)
+    _summarized_index: int = field(init=False, default=0)
+    _resume_index: int = field(init=False, default=0)
+    _resume_high_water: float = 0.8
+    _keep_last_messages: int = 2
+    _pending_resume: Future | None = field(init=False, default=None, repr=False)
+    _undo: tuple[int, int, list[int]] | None = field(init=False, default=None, repr=False)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock, repr=False)
+    _turn_stats: list[dict] = field(init=False, default_factory=list)
+    _recent_turns: int | None = None
+    _retrieved_messages: int | None = None
+    _saved_state: dict | None = field(init=False, default=None, repr=False)
 
     def __post_init__(self):
         """Initialize the starting messages in the chat."""
+        if self._context_window is None:
+            self._context_window = self.config.api_context_window
+        if self._recent_turns is None:
+            self._recent_turns = self.config.memory_recent_turns
+        if self._retrieved_messages is None:
+            self._retrieved_messages = self.config.memory_top_k
+        self._token_counter = TokenCounter(self._model)
         self._init_current_chat()
 
+    @classmethod
+    def from_session(cls, config: APIConfiguration, session: ISessionLog, **kwargs) -> 'Chat':
+        """Resume a chat from its session log.
+
+        Only the current context and the summary are rehydrated right away; the older messages of the
+        history are read from the log when they are accessed. A chat with a memory indexes its whole
+        history again.
+
+        Parameters:
+        ----------
+        config : APIConfiguration
+            The API configuration object.
+        session : ISessionLog
+            The log of the session, which keeps recording the resumed chat.
+        **kwargs
+            The other fields of the chat.
+
+        Returns:
+        -------
+        Chat
+            The resumed chat.
+        """
+        chat = cls(config, session=session, **kwargs)
+        state, messages = session.load()
+        if state is None:
+            chat._history_chat = MessageStore(messages)
+        else:
+            start = min(state['context_start'], len(messages))
+            chat._history_chat = MessageStore(messages[start:], backing=messages, base=start)
+            chat._used_tokens = state['used_tokens']
+            chat._summary = state['summary']
+            chat._summarized_index = state['summarized_index']
+            chat._resume_index = state['resume_index']
+            chat._context_start = start
+            chat._recalled = state['recalled']
+            if chat._summary is not None:
+                chat._pinned_chat.append(Message.from_assistant(chat._summary))
+            chat._saved_state = state
+        if chat.memory is not None:
+            chat.memory.add_many(list(chat._history_chat))
+        return chat
+
+    @property
+    def session_state(self) -> dict:
+        """Get the state of the chat persisted in its session log next to the messages."""
+        return {'used_tokens': self._used_tokens, 'summary': self._summary,
+                'summarized_index': self._summarized_index, 'resume_index': self._resume_index,
+                'context_start': self._context_start, 'recalled': list(self._recalled)}
+
+    def _save_session_state(self) -> None:
+        """Log the state of the chat if it changed since it was logged last."""
+        if self.session is None:
+            return
+        state = self.session_state
+        if state != self._saved_state:
+            self.session.save_state(state)
+            self._saved_state = state
+
     @property
     def model(self) -> str:
         """Get the AI model used in the chat."""
         return self._model
 
     @property
-    def history(self) -> list[Message]:
+    def history(self) -> MessageStore:
         return self._history_chat
 
     @property
@@ -87,49 +273,350 @@ class Chat(JsonSerialize):
         """
         if value < 0:
             raise ValueError("Used tokens must be a non-negative integer.")
-        self._used_tokens += value
+        self._used_tokens = value
+
+    @property
+    def turn_stats(self) -> list[dict]:
+        """Get the time-to-first-token, inter-token latency and usage of every streamed turn."""
+        return self._turn_stats
+
+    @property
+    def summary(self) -> str | None:
+        """Get the rolling summary of the history."""
+        return self._summary
 
     @property
     def is_finished(self) -> bool:
         """Get the chat's finished status."""
         return self._is_finished
 
+    def finish(self) -> None:
+        """End the chat, so the conversation loop stops before the next prompt."""
+        self._is_finished = True
+
+    def _context_indexes(self) -> list[int]:
+        """Get the history indexes of the current chat after its pinned messages."""
+        return self._recalled + list(range(self._context_start, len(self._history_chat)))
+
+    @property
+    def current_chat(self) -> list[Message]:
+        """Get the messages sent to the API: the pinned messages, then a view of the history."""
+        return self._pinned_chat + [self._history_chat[index] for index in self._context_indexes()]
+
     @property
     def messages(self) -> list[dict[str, str]]:
         """Get the chat messages as a list of JSON-formatted dictionaries."""
 
-        return [msg.to_json() for msg in self._current_chat]
+        return ([msg.to_json() for msg in self._pinned_chat]
+                + [self._history_chat.to_json(index) for index in self._context_indexes()])
+
+    @property
+    def reply_tokens(self) -> int:
+        """Get the tokens of the context window kept free for the assistant reply."""
+        return self._reply_tokens
+
+    @property
+    def prompt_tokens(self) -> int:
+        """Get the prompt tokens of the current chat, counted offline."""
+        return (self._token_counter.count_messages(self._pinned_chat)
+                + sum(self._history_chat.count_tokens(index, self._token_counter)
+                      for index in self._context_indexes()))
+
+    @property
+    def payload(self) -> dict[str, any]:
+        """Get the request body sent to the chat completion endpoint."""
+        return {'model': self.model, 'messages': self.messages}
+
+    def _routed_messages(self, route: Route) -> list[Message]:
+        if route.context_messages is None:
+            return self.current_chat
+        indexes = self._context_indexes()[-route.context_messages:] if route.context_messages else []
+        return self._pinned_chat + [self._history_chat[index] for index in indexes]
+
+    def _context_bounds(self, limit: int | None = None) -> tuple[int, int, list[int]]:
+        """Get the history range of the latest messages of the current chat and the indexes of its recalled
+        messages, the latest `limit` messages at most."""
+        start, end, recalled = self._context_start, len(self._history_chat), self._recalled
+        if limit is not None:
+            start = max(start, end - limit)
+            remaining = limit - (end - start)
+            recalled = recalled[len(recalled) - remaining:] if remaining > 0 else []
+        return start, end, recalled
+
+    def payload_bytes_for(self, route: Route | None = None, *, stream: bool = False) -> bytes:
+        """Get the UTF-8 JSON request body of a route, spliced from the cached JSON of its messages.
+
+        No message is serialized again: the pinned messages cache their JSON and the history keeps it, and
+        the latest messages are joined straight from the buffer of the history. The body is still copied
+        once, so the cost of a turn grows with the size of the context, which `CONTEXT_WINDOW` bounds,
+        not with the length of the whole history.
+
+        Parameters:
+        ----------
+        route : Route | None, optional
+            The route of the last user message, by default the full route.
+        stream : bool, optional
+            Ask for the answer as a stream, by default False.
+
+        Returns:
+        -------
+        bytes
+            The request body sent to the chat completion endpoint.
+        """
+        model = self.model if route is None or route.model is None else route.model
+        limit = None if route is None else route.context_messages
+        with self.telemetry.span('prompt_build'), self._lock:
+            start, end, recalled = self._context_bounds(limit)
+            fragments = [msg.to_json_bytes() for msg in self._pinned_chat]
+            fragments += (self._history_chat.json_bytes(index) for index in recalled)
+            # The view of the history buffer is only held while the body is joined under the lock
+            with self._history_chat.json_view(start, end) as latest, self.telemetry.span('serialize'):
+                return _join_body(model, fragments + latest, route, stream)
+
+    def estimated_tokens_for(self, route: Route | None) -> int:
+        """Estimate the prompt plus answer tokens of the request of a route."""
+        if route is None:
+            return self.prompt_tokens + self._reply_tokens
+        return (self._token_counter.count_messages(self._routed_messages(route))
+                + (route.max_tokens or self._reply_tokens))
+
+    def route_last_message(self) -> Route | None:
+        """Route the last user message, classifying it if the router needs it.
+
+        The calls and tokens saved compared with the full route are recorded in the router.
+
+        Returns:
+        -------
+        Route | None
+            The route of the message, or None if the chat has no router.
+        """
+        if self.router is None or not self._history_chat:
+            return None
+        classify = self.classify_message if self.classifier is not None and self.router.needs_classification \
+            else None
+        with self.telemetry.span('route'):
+            route = self.router.route(self.last_message, classify=classify)
+        full_tokens = self.estimated_tokens_for(None)
+        if route.is_canned:
+            self.router.record(route, calls_saved=1, tokens_saved=full_tokens)
+        else:
+            self.router.record(route, calls_saved=0,
+                               tokens_saved=max(0, full_tokens - self.estimated_tokens_for(route)))
+        return route
+
+    @staticmethod
+    def _starting_messages() -> list[Message]:
+        """Get the starting messages in the chat as Message objects."""
+        return list(_STARTING_MESSAGES)
 
     def _init_current_chat(self) -> None:
         """Initialize the starting messages in the chat as Message objects."""
-        STARTING_MSG = [
-            {"role": "system", "content": "Pretend you are a expert on Real estates in Mexico, marketing and sales. Be "
-                                          "an expert in the INEGI Mexico Data, also"
-                                          "Playfully and formal and allways answer in spanish:"},
-            {"role": "assistant", "content": "OK"},
-        ]
-        self._current_chat = [Message.from_json(json) for json in STARTING_MSG]
+        self._pinned_chat = self._starting_messages()
+
+    def _fit_context(self) -> None:
+        """Drop the oldest unpinned messages until the prompt and the reply fit in the context window.
+
+        The recalled messages are dropped first, then the latest messages are narrowed from their start.
+        The newest message is always kept, so the prompt of the user is never lost.
+        """
+        budget = self._context_window - self._reply_tokens
+        excess = self.prompt_tokens - budget
+        if excess <= 0:
+            return
+        dropped = 0
+        while excess > 0 and self._recalled:
+            excess -= self._history_chat.count_tokens(self._recalled.pop(0), self._token_counter)
+            dropped += 1
+        while excess > 0 and self._context_start < len(self._history_chat) - 1:
+            excess -= self._history_chat.count_tokens(self._context_start, self._token_counter)
+            self._context_start += 1
+            dropped += 1
+        if self.verbose:
+            print(f'CONTEXT TRIMMED: {dropped} MESSAGES DROPPED')
 
     def _get_message_classification(self, message: Message):
-        msg_classifier = MessageClassifierFacadeImpl()
-        msg_classifier.initialize(self.config)
-        return msg_classifier.predict(message)
+        if self.classifier is None:
+            raise ValueError("The chat has no message classifier.")
+        return self.classifier.predict(message)
+
+    def _classify_last_message(self, executor: Executor | None) -> None:
+        if executor is not None and self.classifier is not None and self._history_chat \
+                and self.last_message.classification is None:
+            # The classification is timed within the turn that submitted it
+            future = executor.submit(contextvars.copy_context().run, self.classify_message, self.last_message)
+            future.add_done_callback(self._classification_done)
+
+    def _classification_done(self, future: Future) -> None:
+        if not future.cancelled() and (error := future.exception()) is not None:
+            self.classification_failed(error)
+
+    def classification_failed(self, error: BaseException) -> None:
+        """Report a background classification that failed; the message is left unclassified.
 
-    def _chat_completion_create(self) -> Prediction:
+        Parameters:
+        ----------
+        error : BaseException
+            The error raised by the classifier.
+        """
+        _logger.warning('Classification of the last message failed: %r', error, exc_info=error)
+        self.telemetry.count('classification_failures')
+
+    def classify_message(self, message: Message) -> dict:
+        """Classify a message and attach the classification to it.
+
+        Parameters:
+        ----------
+        message : Message
+            The message to classify.
+
+        Returns:
+        -------
+        dict
+            The zero-shot classification of the message.
+        """
+        with self.telemetry.span('classify'):
+            message.classification = self._get_message_classification(message)
+        # The classification lands on a worker thread while the turn may be adding to the history
+        with self._lock:
+            self._history_chat.update(message)
+        return message.classification
+
+    def _schedule(self, call: Callable[[], dict], *, estimated_tokens: int,
+                  priority: Priority = Priority.INTERACTIVE) -> dict:
+        """Run an API call through the scheduler of the chat, or directly if it has none."""
+        if self.scheduler is None:
+            return call()
+        return self.scheduler.submit(call, estimated_tokens=estimated_tokens, priority=priority)
+
+    def _chat_completion_create(self, *, cache: bool | None = None, route: Route | None = None) -> Prediction:
         openai.api_key = self.config.api_key
-        prediction_response = openai.ChatCompletion.create(
-            model=self.model,
-            messages=self.messages
-        )
+        openai.api_base = self.config.api_base
+        body = self.payload_bytes_for(route)
+        estimated_tokens = self.estimated_tokens_for(route)
+
+        def call() -> dict:
+            return post_json(f'{self.config.api_base}/chat/completions', body, api_key=self.config.api_key,
+                             timeout=self.config.request_deadline)
+
+        def create() -> dict:
+            return self._schedule(call if self.hedger is None else lambda: self.hedger.call_sync(call),
+                                  estimated_tokens=estimated_tokens)
+
+        with self.telemetry.span('upstream'):
+            prediction_response = create() if self.cache is None else \
+                self.cache.get_or_create(body, create, cache=cache)
         return Prediction.from_json(prediction_response)
 
-    def process_message_response(self) -> Message:
-        # TODO DO IT SOMETHING WITH THE MESSAGE -> message
-        # TODO DO IT SOMETHING WITH THE MESSAGE -> _get_message_classification
-        prediction = self._chat_completion_create()
-        self.update_used_tokens(prediction.total_tokens)
+    def process_prediction(self, prediction: Prediction, *, route: Route | None = None) -> Message:
+        """Account the tokens of a prediction and convert it to an assistant message.
+
+        Parameters:
+        ----------
+        prediction : Prediction
+            The prediction returned by the chat completion endpoint.
+        route : Route | None, optional
+            The route the request took, by default the full route.
+
+        Returns:
+        -------
+        Message
+            The assistant message contained in the prediction.
+        """
+        self.telemetry.record_usage(prediction.model, prediction.usage)
+        if route is not None and route.context_messages is not None:
+            # A short context does not tell the size of the current chat, count it locally instead
+            self.update_used_tokens(self.prompt_tokens + prediction.usage.get('completion_tokens', 0))
+        else:
+            self.update_used_tokens(prediction.total_tokens)
         return Message.from_assistant(prediction.message)
 
+    def process_streamed_turn(self, turn: StreamedTurn) -> None:
+        """Account the tokens and record the latency figures of a consumed streamed turn.
+
+        Parameters:
+        ----------
+        turn : StreamedTurn
+            The streamed turn whose deltas have all been received.
+        """
+        self.update_used_tokens(turn.total_tokens)
+        self._turn_stats.append(turn.stats)
+        self.telemetry.record_usage(self.model, turn.usage)
+        if turn.time_to_first_token is not None:
+            self.telemetry.observe('time_to_first_token_seconds', turn.time_to_first_token, model=self.model)
+
+    def stream_message_response(self, *, executor: Executor | None = None) -> StreamedTurn:
+        """Request the next assistant message as a stream of deltas.
+
+        The last user message is routed first, as in `process_message_response`: a canned answer is
+        streamed as a single delta without any API call, and other routes choose the request sent.
+
+        Parameters:
+        ----------
+        executor : Executor | None, optional
+            The executor classifying the last user message while the answer streams, by default None.
+
+        Returns:
+        -------
+        StreamedTurn
+            An iterable of content deltas; its message is available once it is consumed.
+        """
+        started_at = time.perf_counter()
+        route = self.route_last_message()
+        if route is not None and route.is_canned:
+            return StreamedTurn([StreamedTurn.chunk(route.answer)], started_at=started_at)
+        self._classify_last_message(executor)
+        body = self.payload_bytes_for(route, stream=True)
+
+        def call() -> Iterator[dict]:
+            return post_json_stream(f'{self.config.api_base}/chat/completions', body, api_key=self.config.api_key,
+                                    timeout=self.config.request_deadline)
+
+        # Only the opening of the response is scheduled and hedged, the deltas are read by the caller
+        chunks = self._schedule(call if self.hedger is None else lambda: self.hedger.call_sync(call),
+                                estimated_tokens=self.estimated_tokens_for(route))
+        return StreamedTurn(chunks, prompt_tokens=self.prompt_tokens, started_at=started_at,
+                            on_finish=self.process_streamed_turn)
+
+    def process_message_response(self, *, cache: bool | None = None, executor: Executor | None = None) -> Message:
+        """Request the next assistant message of the chat.
+
+        With a router, the last user message is routed first: a canned answer is returned without any
+        API call, and other routes choose the model, context and `max_tokens` of the request. Only a
+        router with low-value labels classifies the message before the request. Otherwise, given an
+        executor and a classifier, the last user message is classified on the executor while the
+        completion is requested, and the classification is attached when it arrives.
+
+        Parameters:
+        ----------
+        cache : bool | None, optional
+            Whether the response may be cached; by default only when the temperature is 0.
+        executor : Executor | None, optional
+            The executor classifying the user message, by default None.
+
+        Returns:
+        -------
+        Message
+            The assistant message of the prediction.
+        """
+        route = self.route_last_message()
+        if route is not None and route.is_canned:
+            return Message.from_assistant(route.answer)
+        self._classify_last_message(executor)
+        prediction = self._chat_completion_create(cache=cache, route=route)
+        return self.process_prediction(prediction, route=route)
+
+    @property
+    def pending_resume(self) -> Future | None:
+        """Get the background summary in flight, or None if there is none."""
+        return self._pending_resume
+
+    @property
+    def needs_resume(self) -> bool:
+        """Get whether a background summary is in flight or due to start."""
+        if self.memory is not None:
+            return False
+        return self._pending_resume is not None or self.used_tokens >= self._max_tokens * self._resume_high_water
+
     def update_used_tokens(self, current_used_tokens: int) -> None:
         """Update the number of used tokens in the chat.
 
@@ -148,68 +635,192 @@ class Chat(JsonSerialize):
         None
         """
         self.used_tokens = current_used_tokens
+        with self._lock:
+            self._save_session_state()
 
     def prompt_user(self) -> str:
         """Prompt the user for input and return the entered text."""
         return input(self._prefix)
 
+    def build_resume_prompt(self, end: int) -> str:
+        """Build the prompt that folds the history messages up to `end` into the rolling summary.
+
+        Only the messages added since the last summarization are sent, next to the previous summary,
+        so the prompt size does not grow with the length of the conversation.
+
+        Parameters:
+        ----------
+        end : int
+            The history index (exclusive) of the last message to summarize.
+
+        Returns:
+        -------
+        str
+            The prompt for the completion endpoint.
+        """
+        parts = [f'Genera un Resumen de los puntos mas importantes de {round(self._max_tokens / 3)} tokens del '
+                 f'chat entre el usuario y el asistente']
+        if self._summary:
+            parts.append(f'partiendo del resumen anterior: {self._summary} y agregando los mensajes nuevos:')
+        parts.extend(msg.content for msg in self._history_chat[self._summarized_index:end])
+        return ' '.join(parts)
+
+    def _request_resume(self, call_back: Callable, prompt: str, temperature: float) -> CompletionResponse:
+        # Summaries give way to the interactive turns of every chat
+        with self.telemetry.span('summarize'):
+            response = self._schedule(lambda: call_back(model="text-davinci-003",
+                                                        prompt=prompt,
+                                                        temperature=temperature,
+                                                        max_tokens=self._max_tokens),
+                                      estimated_tokens=self._token_counter.count(prompt) + self._max_tokens,
+                                      priority=Priority.BACKGROUND)
+        completion = CompletionResponse.from_json(response)
+        self.telemetry.record_usage(completion.model, completion.usage)
+        return completion
+
     def resume_current_chat(self, *, call_back: Callable, temperature: float) -> CompletionResponse:
-        corpus: str = f'Genera un Resumen de los puntos mas importantes de {round(self._max_tokens / 3)} tokens del ' \
-                      f'chat entre el usuario y el asistente '
-        if self.used_tokens >= self._max_tokens:
-            for msg in self.history:
-                corpus += msg.content + ' '
-            # Resumes corpus
-            response = call_back(model="text-davinci-003",
-                                 prompt=corpus,
-                                 temperature=temperature,
-                                 max_tokens=self._max_tokens)
-
-            return CompletionResponse.from_json(response)
-
-    def add_resume_to_chat(self, completion: CompletionResponse) -> None:
-        # Convert Completion to Msg
         if self.used_tokens >= self._max_tokens:
-            assistant_msg = Message.from_assistant(completion.message)
-            # Reset the Current Chat
-            self._init_current_chat()
-            # Select the last two conversations
-            last_two_msg = self._history_chat[2:]
-            # Add the resume to the Reset current Chat
-            self._current_chat.append(assistant_msg)
-            # Add the Last two chats.
-            self._current_chat.extend(last_two_msg)
-            if self.verbose:
-                print(f'TOKENS AREA ABOVE THE MAX LIMIT: {self.used_tokens}')
-                print(self._current_chat)
+            self._resume_index = len(self._history_chat)
+            # Resumes only the messages added since the last summary
+            return self._request_resume(call_back, self.build_resume_prompt(self._resume_index), temperature)
+
+    def add_resume_to_chat(self, completion: CompletionResponse | None) -> None:
+        """Swap the current chat for the starting messages, the summary and the latest messages.
 
-    def update_resume_chat(self, *, call_back: Callable, temperature: float = .2) -> None:
+        The new current chat is built aside and assigned in one step, so a summary computed in the
+        background replaces the context atomically.
+
+        Parameters:
+        ----------
+        completion : CompletionResponse | None
+            The summary completion, or None if the chat was not summarized.
+        """
+        if completion is None:
+            return
+        with self._lock:
+            self._summary = completion.message.strip()
+            self._summarized_index = self._resume_index
+            # Keep the messages the summary does not cover, and at least the last conversations
+            start = max(0, min(self._summarized_index, len(self._history_chat) - self._keep_last_messages))
+            self._pinned_chat = self._starting_messages() + [Message.from_assistant(self._summary)]
+            self._recalled = []
+            self._context_start = start
+            self._fit_context()
+            self._save_session_state()
+        if self.verbose:
+            print(f'TOKENS AREA ABOVE THE MAX LIMIT: {self.used_tokens}')
+            print(self.current_chat)
+
+    def update_resume_chat(self, *, call_back: Callable, temperature: float = .2,
+                           executor: Executor | None = None) -> None:
         """Update the chat with a summary of the most important points of the conversation.
 
+        Without an executor the summary is requested and applied right away once `_max_tokens` is
+        reached. With an executor it is requested in the background as soon as the used tokens pass the
+        high-water mark, and swapped in on a later call once it is ready; the call only waits for it
+        when the hard limit `_max_tokens` is reached.
+
         Parameters:
         ----------
         call_back : Callable
             The callback function to resume the chat.
         temperature : float, optional
             The temperature to use in the completion, by default 0.2.
+        executor : Executor | None, optional
+            The executor running the summary in the background, by default None.
 
         Returns:
         -------
         None
         """
-        completion = self.resume_current_chat(call_back=call_back, temperature=temperature)
+        if self.memory is not None:
+            # The memory recalls the past messages instead of summarizing them
+            return
+        if executor is None:
+            completion = self.resume_current_chat(call_back=call_back, temperature=temperature)
+            self.add_resume_to_chat(completion)
+            return
+        if self._pending_resume is None and self.used_tokens >= self._max_tokens * self._resume_high_water:
+            self._resume_index = len(self._history_chat)
+            prompt = self.build_resume_prompt(self._resume_index)
+            self._pending_resume = executor.submit(contextvars.copy_context().run, self._request_resume, call_back,
+                                                   prompt, temperature)
+        self._apply_pending_resume(wait=self.used_tokens >= self._max_tokens)
+
+    def _apply_pending_resume(self, *, wait: bool = False) -> None:
+        """Swap in the background summary if it is ready, or wait for it when `wait` is set."""
+        with self._lock:
+            pending = self._pending_resume
+            if pending is None or not (wait or pending.done()):
+                return
+            self._pending_resume = None
+        try:
+            completion = pending.result()
+        except Exception as error:
+            # A failed summary is requested again on the next turn instead of ending the chat
+            if self.verbose:
+                print(f'RESUME FAILED: {error}')
+            return
         self.add_resume_to_chat(completion)
 
+    def _recall_context(self) -> None:
+        """Point the current chat at the latest turns and the past messages most similar to the last message."""
+        query = len(self._history_chat) - 1
+        self._context_start = max(0, query - 2 * self._recent_turns)
+        self._recalled = self.memory.search(query, k=self._retrieved_messages, end=self._context_start)
+
     def add(self, msg: Message) -> None:
         """ Add a message to the current chat and history chat.
 
+        A background summary that is ready is swapped in first. The current chat is a view of the history,
+        so the message joins it without being copied. With a memory, the message is indexed, and a user
+        message points the current chat at the latest turns and the past messages most similar to it. The
+        current chat is trimmed right away if it no longer fits in the context window, so a request built
+        from it is never over the limit. With a session, the message and the new state are logged.
+
         Parameters:
         ----------
         msg : Message
             The message object to be added to the chat.
         """
-        self._current_chat.append(msg)
-        self._history_chat.append(msg)
+        self._apply_pending_resume()
+        with self._lock:
+            self._undo = len(self._history_chat), self._context_start, list(self._recalled)
+            self._history_chat.append(msg)
+            if self.memory is not None:
+                self.memory.add(msg)
+                if msg.role == 'user':
+                    self._recall_context()
+            self._fit_context()
+            if self.session is not None:
+                self.session.append_message(msg)
+                self._save_session_state()
+
+    def discard(self, msg: Message) -> None:
+        """ Undo the last `add`, of a message whose turn failed, so it is not sent again with the next one.
+
+        Parameters:
+        ----------
+        msg : Message
+            The message added last.
+
+        Raises:
+        ------
+        ValueError
+            If the message is not the last one added.
+        """
+        with self._lock:
+            if self._undo is None or len(self._history_chat) != self._undo[0] + 1 \
+                    or self._history_chat[-1] is not msg:
+                raise ValueError('Only the message added last can be discarded.')
+            length, self._context_start, self._recalled = self._undo
+            self._undo = None
+            self._history_chat.truncate(length)
+            if self.memory is not None:
+                self.memory.truncate(length)
+            if self.session is not None:
+                self.session.discard_messages(1)
+                self._save_session_state()
 
     def show(self) -> None:
         """ Display the chat messages, excluding the first two system messages. """
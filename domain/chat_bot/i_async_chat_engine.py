@@ -0,0 +1,10 @@
+from abc import ABC, abstractmethod
+
+from domain.chat_bot.chat import Chat
+
+
+class IAsyncChatEngine(ABC):
+
+    @abstractmethod
+    async def process_message_response(self, chat: Chat, *, stream: bool = False):
+        NotImplementedError()
@@ -0,0 +1,18 @@
+from abc import ABC, abstractmethod
+
+from domain.chat_bot.message import Message
+
+
+class IMessageMemory(ABC):
+
+    @abstractmethod
+    def add(self, msg: Message):
+        NotImplementedError()
+
+    @abstractmethod
+    def truncate(self, size: int):
+        NotImplementedError()
+
+    @abstractmethod
+    def search(self, query: int, *, k: int, end: int):
+        NotImplementedError()
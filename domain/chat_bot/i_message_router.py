@@ -0,0 +1,20 @@
+from abc import ABC, abstractmethod
+from typing import Callable
+
+from domain.chat_bot.message import Message
+
+
+class IMessageRouter(ABC):
+
+    @property
+    @abstractmethod
+    def needs_classification(self) -> bool:
+        NotImplementedError()
+
+    @abstractmethod
+    def route(self, msg: Message, *, classify: Callable[[Message], dict] | None = None):
+        NotImplementedError()
+
+    @abstractmethod
+    def record(self, route, *, calls_saved: int, tokens_saved: int):
+        NotImplementedError()
@@ -1,22 +1,37 @@
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 
-from domain._json_serialize import JsonSerialize
+from domain._json_serialize import JsonSerialize, dumps
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Message(JsonSerialize):
     """
     A class representing a Message object in a Chat conversation.
 
+    Messages are slotted and their roles interned, so the many messages of long chats stay small.
+
     Attributes:
     ----------
     role : str
         The role of the message sender, either "user" or "assistant".
     content : str
         The content of the message.
+    tokens : int | None
+        The cached number of prompt tokens of the message, or None if it was not counted yet.
+    classification : dict | None
+        The zero-shot classification of the message, or None until it arrives.
+    json_bytes : bytes | None
+        The cached UTF-8 JSON of the message, or None if it was not serialized yet.
     """
     role: str
     content: str
+    tokens: int | None = field(default=None, init=False, repr=False, compare=False)
+    classification: dict | None = field(default=None, init=False, repr=False, compare=False)
+    json_bytes: bytes | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.role = sys.intern(self.role)
 
     @classmethod
     def from_user(cls, prompt: str):
@@ -50,6 +65,16 @@ class Message(JsonSerialize):
         """
         return cls('assistant', prompt)
 
+    def to_json(self) -> dict:
+        """ Serialize the message to the format expected by the chat completion endpoint."""
+        return {'role': self.role, 'content': self.content}
+
+    def to_json_bytes(self) -> bytes:
+        """ Serialize the message to UTF-8 JSON once, caching the result on the message."""
+        if self.json_bytes is None:
+            self.json_bytes = dumps(self.to_json())
+        return self.json_bytes
+
     def show(self) -> None:
         """ Display the message in the format "Role: Content" followed by a separator line."""
         print(f'{self.role.title()}: {self.content}')
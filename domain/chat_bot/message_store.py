@@ -0,0 +1,198 @@
+import weakref
+from array import array
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Sequence, overload
+
+from domain._json_serialize import loads
+from domain.chat_bot.message import Message
+from domain.chat_bot.token_counter import TokenCounter
+
+
+class MessageStore(Sequence[Message]):
+    """
+    A compact, append-only store of the messages of a chat history.
+
+    The messages are kept serialized, as the UTF-8 JSON sent to the chat completion endpoint followed by
+    a comma, in one contiguous buffer with an array of offsets, so the JSON of a run of messages is one
+    slice of the buffer. The roles are kept as one byte codes and the token counts in an integer array;
+    only the classifications, which few messages have, are kept in a dictionary. A `Message` is built on
+    access and shared while it is alive, so a classification attached to it later can be written back
+    with `update`.
+
+    A store rehydrated from a session keeps only its latest messages in the buffer: the first `base`
+    messages are read from the `backing` sequence when they are accessed.
+
+    Attributes:
+    ----------
+    ROLES : tuple[str, ...]
+        The roles of the messages, indexed by their code.
+    """
+
+    ROLES: tuple[str, ...] = ('system', 'user', 'assistant')
+    _ROLE_CODES: dict[str, int] = {role: code for code, role in enumerate(ROLES)}
+    # The length of '{"role":"<role>","content":' in front of the JSON string of the content
+    _CONTENT_STARTS: tuple[int, ...] = tuple(len(f'{{"role":"{role}","content":') for role in ROLES)
+    _UNCOUNTED: int = -1
+
+    def __init__(self, messages: Iterable[Message] = (), *, backing: Sequence[Message] = (), base: int = 0):
+        self._backing: Sequence[Message] = backing
+        self._base: int = base
+        self._backed_tokens: dict[int, int] = {}
+        self._roles = array('B')
+        self._offsets = array('Q', [0])
+        self._json = bytearray()
+        self._tokens = array('i')
+        self._classifications: dict[int, dict] = {}
+        self._live: weakref.WeakValueDictionary[int, Message] = weakref.WeakValueDictionary()
+        self.extend(messages)
+
+    def __len__(self) -> int:
+        return self._base + len(self._roles)
+
+    @overload
+    def __getitem__(self, index: int) -> Message: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Message]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = self._position(index)
+        msg = self._live.get(index)
+        if msg is None:
+            if index < self._base:
+                msg = self._backing[index]
+            else:
+                local = index - self._base
+                msg = Message(self.ROLES[self._roles[local]], self.content(index))
+                if self._tokens[local] != self._UNCOUNTED:
+                    msg.tokens = self._tokens[local]
+                msg.classification = self._classifications.get(index)
+            self._live[index] = msg
+        return msg
+
+    def __iter__(self) -> Iterator[Message]:
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self) -> str:
+        return f'MessageStore({len(self)} messages, {self._base} backed, {len(self._json)} JSON bytes)'
+
+    @property
+    def base(self) -> int:
+        """Get the number of leading messages read from the backing sequence."""
+        return self._base
+
+    def _position(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('message index out of range')
+        return index
+
+    def append(self, msg: Message) -> int:
+        """Append a message and return its index."""
+        index = len(self)
+        try:
+            role = self._ROLE_CODES[msg.role]
+        except KeyError:
+            raise ValueError(f'Unsupported message role {msg.role!r}, expected one of {self.ROLES}.') from None
+        self._roles.append(role)
+        self._json += msg.to_json_bytes()
+        self._json += b','
+        self._offsets.append(len(self._json))
+        self._tokens.append(self._UNCOUNTED if msg.tokens is None else msg.tokens)
+        if msg.classification is not None:
+            self._classifications[index] = msg.classification
+        self._live[index] = msg
+        return index
+
+    def extend(self, messages: Iterable[Message]) -> None:
+        for msg in messages:
+            self.append(msg)
+
+    def truncate(self, length: int) -> None:
+        """Drop the messages from index `length` on; only the messages in the buffer can be dropped."""
+        if length < self._base:
+            raise ValueError(f'Cannot drop the first {self._base} messages, which are backed.')
+        local = length - self._base
+        del self._roles[local:]
+        del self._offsets[local + 1:]
+        del self._json[self._offsets[-1]:]
+        del self._tokens[local:]
+        for index in [index for index in self._classifications if index >= length]:
+            del self._classifications[index]
+        for index in [index for index in self._live.keys() if index >= length]:
+            self._live.pop(index, None)
+
+    def update(self, msg: Message) -> None:
+        """Write the token count and classification of a message back to the store, if it is stored."""
+        for index, live in self._live.items():
+            if live is msg:
+                if index < self._base:
+                    return
+                if msg.tokens is not None:
+                    self._tokens[index - self._base] = msg.tokens
+                if msg.classification is not None:
+                    self._classifications[index] = msg.classification
+                return
+
+    def role(self, index: int) -> str:
+        index = self._position(index)
+        if index < self._base:
+            return self[index].role
+        return self.ROLES[self._roles[index - self._base]]
+
+    def content(self, index: int) -> str:
+        index = self._position(index)
+        if index < self._base:
+            return self[index].content
+        local = index - self._base
+        start = self._offsets[local] + self._CONTENT_STARTS[self._roles[local]]
+        # The content string ends before the closing brace and the comma
+        return loads(self._json[start:self._offsets[local + 1] - 2])
+
+    def to_json(self, index: int) -> dict:
+        """Serialize a message to the format expected by the chat completion endpoint, without building it."""
+        return {'role': self.role(index), 'content': self.content(index)}
+
+    def json_bytes(self, index: int) -> bytes:
+        """Get the UTF-8 JSON of a message."""
+        index = self._position(index)
+        if index < self._base:
+            return self[index].to_json_bytes()
+        local = index - self._base
+        return bytes(self._json[self._offsets[local]:self._offsets[local + 1] - 1])
+
+    @contextmanager
+    def json_view(self, start: int, end: int) -> Iterator[list[bytes | memoryview]]:
+        """View the UTF-8 JSON of the messages from `start` to `end` (exclusive) as fragments to join with
+        commas, without copying it.
+
+        The messages in the buffer are one fragment, a view of the buffer released when the context exits;
+        the store must not be appended to before. Backed messages are one fragment each.
+        """
+        fragments: list[bytes | memoryview] = [self.json_bytes(index) for index in range(start, min(end, self._base))]
+        local_start = max(start, self._base)
+        if local_start >= end:
+            yield fragments
+            return
+        with memoryview(self._json) as view, \
+                view[self._offsets[local_start - self._base]:self._offsets[end - self._base] - 1] as latest:
+            fragments.append(latest)
+            try:
+                yield fragments
+            finally:
+                fragments.clear()
+
+    def count_tokens(self, index: int, counter: TokenCounter) -> int:
+        """Count the prompt tokens of a message, caching the result in the store."""
+        index = self._position(index)
+        if index < self._base:
+            if index not in self._backed_tokens:
+                self._backed_tokens[index] = counter.count_message(self[index])
+            return self._backed_tokens[index]
+        local = index - self._base
+        if self._tokens[local] == self._UNCOUNTED:
+            self._tokens[local] = counter.count_message(self[index])
+        return self._tokens[local]
@@ -0,0 +1,128 @@
+import threading
+from typing import Iterator
+
+import openai
+import requests
+
+from domain._json_serialize import loads
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    # One keep-alive session per thread, as the SDK does
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def api_error(response: requests.Response) -> openai.error.OpenAIError:
+    """Convert an error response of the API to the SDK error the rest of the app handles."""
+    try:
+        json_body = response.json()
+        message = json_body['error']['message']
+    except (ValueError, KeyError, TypeError):
+        json_body, message = None, response.text
+    details = dict(http_body=response.text, http_status=response.status_code, json_body=json_body,
+                   headers=response.headers)
+    if response.status_code == 429:
+        return openai.error.RateLimitError(message, **details)
+    if response.status_code == 401:
+        return openai.error.AuthenticationError(message, **details)
+    if response.status_code == 403:
+        return openai.error.PermissionError(message, **details)
+    if response.status_code == 503:
+        return openai.error.ServiceUnavailableError(message, **details)
+    if response.status_code >= 500:
+        return openai.error.APIError(message, **details)
+    return openai.error.InvalidRequestError(message, None, **details)
+
+
+def post_json(url: str, body: bytes, *, api_key: str, timeout: float) -> dict:
+    """
+    POST an already serialized JSON body to the API, skipping the re-encoding of the SDK.
+
+    Parameters:
+    ----------
+    url : str
+        The URL of the endpoint.
+    body : bytes
+        The UTF-8 JSON request body.
+    api_key : str
+        The OpenAI API key.
+    timeout : float
+        The timeout of the request in seconds.
+
+    Returns:
+    -------
+    dict
+        The JSON response.
+
+    Raises:
+    ------
+    openai.error.OpenAIError
+        The SDK error matching the failure, so retries and error handling work as with the SDK.
+    """
+    headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
+    try:
+        response = _session().post(url, data=body, headers=headers, timeout=timeout)
+    except requests.Timeout as error:
+        raise openai.error.Timeout(str(error)) from error
+    except requests.RequestException as error:
+        raise openai.error.APIConnectionError(str(error)) from error
+    if response.status_code >= 400:
+        raise api_error(response)
+    return loads(response.content)
+
+
+def _events(response: requests.Response) -> Iterator[dict]:
+    with response:
+        for line in response.iter_lines():
+            if not line.startswith(b'data:'):
+                continue
+            data = line[5:].strip()
+            if data == b'[DONE]':
+                break
+            yield loads(data)
+
+
+def post_json_stream(url: str, body: bytes, *, api_key: str, timeout: float) -> Iterator[dict]:
+    """
+    POST an already serialized JSON body asking for a stream, and iterate the chunks of the answer.
+
+    The response is opened before returning, so an error status is raised by this call, where it can be
+    retried, and not by the first step of the iteration.
+
+    Parameters:
+    ----------
+    url : str
+        The URL of the endpoint.
+    body : bytes
+        The UTF-8 JSON request body, with `"stream":true`.
+    api_key : str
+        The OpenAI API key.
+    timeout : float
+        The timeout of the connection and of every read in seconds.
+
+    Returns:
+    -------
+    Iterator[dict]
+        The chunks of the answer, parsed from the server-sent events.
+
+    Raises:
+    ------
+    openai.error.OpenAIError
+        The SDK error matching the failure, so retries and error handling work as with the SDK.
+    """
+    headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
+    try:
+        response = _session().post(url, data=body, headers=headers, timeout=timeout, stream=True)
+    except requests.Timeout as error:
+        raise openai.error.Timeout(str(error)) from error
+    except requests.RequestException as error:
+        raise openai.error.APIConnectionError(str(error)) from error
+    if response.status_code >= 400:
+        with response:
+            raise api_error(response)
+    return _events(response)
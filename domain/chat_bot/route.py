@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    A class representing how a user message is answered.
+
+    Attributes:
+    ----------
+    name : str
+        The name of the route, used in the routing report.
+    model : str | None
+        The model of the chat completion, or None to keep the model of the chat.
+    max_tokens : int | None
+        The maximum tokens of the answer, or None for no limit.
+    context_messages : int | None
+        The number of latest messages sent next to the pinned ones, or None for the whole current chat.
+    answer : str | None
+        A precomputed answer given without any API call, or None to call the API.
+    """
+    name: str
+    model: str | None = None
+    max_tokens: int | None = None
+    context_messages: int | None = None
+    answer: str | None = None
+
+    @property
+    def is_canned(self) -> bool:
+        return self.answer is not None
@@ -0,0 +1,121 @@
+import time
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
+from domain.chat_bot.message import Message
+
+
+class StreamedTurn:
+    """
+    A class representing a chat turn whose completion is delivered as a stream of deltas.
+
+    Iterating the turn (with `for` or `async for`) yields the content deltas as they arrive. The deltas
+    are kept in a list and joined once at the end, so the final Message is assembled without
+    re-concatenating strings. OpenAI sends one token per chunk, which gives the completion token count.
+
+    Attributes:
+    ----------
+    prompt_tokens : int
+        The number of tokens of the prompt sent for this turn.
+    completion_tokens : int
+        The number of tokens received so far.
+    started_at : float | None
+        The `time.perf_counter` value when the request was sent.
+    first_token_at : float | None
+        The `time.perf_counter` value when the first delta arrived.
+    """
+
+    def __init__(self, chunks: Iterable[dict] | AsyncIterable[dict], *, prompt_tokens: int = 0,
+                 started_at: float | None = None, on_finish: Callable[['StreamedTurn'], None] | None = None):
+        self._chunks: Iterable[dict] | AsyncIterable[dict] = chunks
+        self._on_finish: Callable[['StreamedTurn'], None] | None = on_finish
+        self._parts: list[str] = []
+        self._token_times: list[float] = []
+        self._message: Message | None = None
+        self.prompt_tokens: int = prompt_tokens
+        self.completion_tokens: int = 0
+        self.started_at: float | None = started_at
+        self.first_token_at: float | None = None
+
+    def __iter__(self) -> Iterator[str]:
+        self._start()
+        for chunk in self._chunks:
+            delta = self._add_chunk(chunk)
+            if delta:
+                yield delta
+        self._finish()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        self._start()
+        async for chunk in self._chunks:
+            delta = self._add_chunk(chunk)
+            if delta:
+                yield delta
+        self._finish()
+
+    @staticmethod
+    def chunk(content: str) -> dict:
+        """Build a chunk carrying a single content delta, in the shape the API streams them."""
+        return {'choices': [{'index': 0, 'finish_reason': None, 'delta': {'content': content}}]}
+
+    @property
+    def is_finished(self) -> bool:
+        return self._message is not None
+
+    @property
+    def message(self) -> Message:
+        """Get the assembled assistant message once the stream is exhausted."""
+        if self._message is None:
+            raise RuntimeError("The streamed turn must be consumed before reading its message.")
+        return self._message
+
+    @property
+    def usage(self) -> dict[str, int]:
+        """Get the token usage in the same shape as `Prediction.usage`."""
+        return {'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'total_tokens': self.total_tokens}
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def time_to_first_token(self) -> float | None:
+        """Get the seconds between sending the request and receiving the first delta."""
+        if self.first_token_at is None or self.started_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def inter_token_latencies(self) -> list[float]:
+        """Get the seconds elapsed between each pair of consecutive deltas."""
+        return [b - a for a, b in zip(self._token_times, self._token_times[1:])]
+
+    @property
+    def stats(self) -> dict[str, float | int | None]:
+        """Get the latency and usage figures of the turn."""
+        latencies = self.inter_token_latencies
+        return {'time_to_first_token': self.time_to_first_token,
+                'mean_inter_token_latency': sum(latencies) / len(latencies) if latencies else None,
+                'max_inter_token_latency': max(latencies, default=None),
+                **self.usage}
+
+    def _start(self) -> None:
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+
+    def _add_chunk(self, chunk: dict) -> str | None:
+        delta = chunk['choices'][0].get('delta', {}).get('content')
+        if delta:
+            now = time.perf_counter()
+            if self.first_token_at is None:
+                self.first_token_at = now
+            self._token_times.append(now)
+            self._parts.append(delta)
+            self.completion_tokens += 1
+        return delta
+
+    def _finish(self) -> None:
+        self._message = Message.from_assistant(''.join(self._parts))
+        if self._on_finish is not None:
+            self._on_finish(self)
@@ -0,0 +1,65 @@
+from typing import Iterable
+
+from domain.chat_bot.message import Message
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+class TokenCounter:
+    """
+    A class counting tokens offline, the way the chat completion endpoint bills them.
+
+    It uses the `tiktoken` encoding of the model when the package is installed, and falls back to the
+    four-characters-per-token rule of thumb otherwise. `tiktoken` downloads its encoding over the
+    network the first time it is used, and caches it on disk; when the download fails the counter falls
+    back to the rule of thumb too. Without the encoding, counts are only estimates, so the context
+    window budget is enforced approximately and a request may still exceed it. The count of every
+    Message is cached on the message itself, so each message is tokenized once for the whole life of
+    the chat.
+
+    Attributes:
+    ----------
+    TOKENS_PER_MESSAGE : int
+        The tokens added by the chat format around every message.
+    TOKENS_PER_REPLY : int
+        The tokens that prime the assistant reply.
+    """
+    TOKENS_PER_MESSAGE: int = 4
+    TOKENS_PER_REPLY: int = 3
+
+    def __init__(self, model: str = 'gpt-3.5-turbo'):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = self._load_encoding('cl100k_base')
+            except Exception:
+                # The encoding could not be downloaded, so the counts fall back to chars/4
+                self._encoding = None
+
+    @staticmethod
+    def _load_encoding(name: str):
+        try:
+            return tiktoken.get_encoding(name)
+        except Exception:
+            return None
+
+    def count(self, text: str) -> int:
+        """Count the tokens of a text."""
+        if self._encoding is None:
+            return (len(text) + 3) // 4
+        return len(self._encoding.encode(text))
+
+    def count_message(self, msg: Message) -> int:
+        """Count the tokens of a message, caching the result on the message."""
+        if msg.tokens is None:
+            msg.tokens = self.TOKENS_PER_MESSAGE + self.count(msg.role) + self.count(msg.content)
+        return msg.tokens
+
+    def count_messages(self, messages: Iterable[Message]) -> int:
+        """Count the prompt tokens of a list of messages, including the reply priming."""
+        return sum(self.count_message(msg) for msg in messages) + self.TOKENS_PER_REPLY
@@ -4,5 +4,10 @@ from abc import ABC, abstractmethod
 class ICompletionFacade(ABC):
 
     @abstractmethod
-    def create(self, *, prompt: str):
+    def create(self, *, prompt: str, max_tokens: int = 50, cache: bool | None = None):
+        NotImplementedError()
+
+    @abstractmethod
+    def create_many(self, prompts: list[str], *, max_tokens: int = 50, temperature: float | None = None,
+                    cache: bool | None = None):
         NotImplementedError()
@@ -0,0 +1,13 @@
+from abc import ABC, abstractmethod
+from typing import Iterable
+
+
+class IImgPipeline(ABC):
+
+    @abstractmethod
+    async def agenerate(self, prompts: Iterable[str], *, size: str = '512x512', n: int = 1):
+        NotImplementedError()
+
+    @abstractmethod
+    def generate(self, prompts: Iterable[str], *, size: str = '512x512', n: int = 1):
+        NotImplementedError()
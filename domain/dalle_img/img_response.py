@@ -1,19 +1,16 @@
-class ImgResponse:
+from dataclasses import dataclass
 
-    def __init__(self, *, created: int, data: list[dict]):
-        self.created: int = created
-        self.data: list[dict] = data
+from domain._json_serialize import JsonSerialize
+
+
+@dataclass(kw_only=True, repr=False)
+class ImgResponse(JsonSerialize):
+    created: int
+    data: list[dict]
 
     @property
     def url(self) -> str | None:
         return self.data[0].get('url')
 
-    @classmethod
-    def from_json(cls, json: dict[str]):
-        return cls(**json)
-
-    def to_json(self) -> dict:
-        return vars(self)
-
     def __repr__(self) -> str:
         return f'ImgResponse(data={self.data}, create={self.created})'
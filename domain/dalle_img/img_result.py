@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ImgResult:
+    """
+    The images generated for one prompt, as files on disk.
+
+    Attributes:
+    ----------
+    prompt : str
+        The prompt of the images.
+    size : str
+        The size of the images, as '<width>x<height>'.
+    paths : tuple[str, ...]
+        The paths of the image files, one per generated image.
+    cached : bool
+        Whether the images were read from the disk cache instead of generated.
+    error : str | None
+        The error that failed the prompt, in which case there are no paths, or None if it succeeded.
+    """
+    prompt: str
+    size: str
+    paths: tuple[str, ...]
+    cached: bool = False
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
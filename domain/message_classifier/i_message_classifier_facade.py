@@ -10,6 +10,10 @@ class IMessageClassifierFacade(ABC):
     def predict(self, msg: Message):
         NotImplementedError()
 
+    @abstractmethod
+    def predict_many(self, msgs: list[Message]):
+        NotImplementedError()
+
     @abstractmethod
     def initialize(self, config: APIConfiguration):
         NotImplementedError()
@@ -0,0 +1,14 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+
+class IHedger(ABC):
+    deadline: float
+
+    @abstractmethod
+    async def call(self, fn: Callable[[], Awaitable]):
+        NotImplementedError()
+
+    @abstractmethod
+    def call_sync(self, fn: Callable):
+        NotImplementedError()
@@ -0,0 +1,16 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+from domain.scheduler.priority import Priority
+
+
+class IRequestScheduler(ABC):
+
+    @abstractmethod
+    def submit(self, fn: Callable[[], dict], *, estimated_tokens: int, priority: Priority = Priority.INTERACTIVE):
+        NotImplementedError()
+
+    @abstractmethod
+    async def asubmit(self, fn: Callable[[], Awaitable[dict]], *, estimated_tokens: int,
+                      priority: Priority = Priority.INTERACTIVE):
+        NotImplementedError()
@@ -0,0 +1,7 @@
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """The priority of an API request; lower values are scheduled first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+
+from domain.chat_bot.message import Message
+
+
+class ISessionLog(ABC):
+
+    @abstractmethod
+    def append_message(self, msg: Message):
+        NotImplementedError()
+
+    @abstractmethod
+    def save_state(self, state: dict):
+        NotImplementedError()
+
+    @abstractmethod
+    def discard_messages(self, count: int):
+        NotImplementedError()
+
+    @abstractmethod
+    def load(self):
+        NotImplementedError()
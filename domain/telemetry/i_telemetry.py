@@ -0,0 +1,30 @@
+from abc import ABC, abstractmethod
+from typing import ContextManager
+
+
+class ITelemetry(ABC):
+
+    @property
+    @abstractmethod
+    def enabled(self) -> bool:
+        NotImplementedError()
+
+    @abstractmethod
+    def span(self, name: str, **attributes) -> ContextManager:
+        NotImplementedError()
+
+    @abstractmethod
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        NotImplementedError()
+
+    @abstractmethod
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        NotImplementedError()
+
+    @abstractmethod
+    def record_usage(self, model: str, usage: dict[str, int]) -> None:
+        NotImplementedError()
+
+    @abstractmethod
+    def flush(self) -> None:
+        NotImplementedError()
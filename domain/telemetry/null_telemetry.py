@@ -0,0 +1,44 @@
+from domain.telemetry.i_telemetry import ITelemetry
+
+
+class _NullSpan:
+    """A span that records nothing, shared by every call so a disabled span allocates nothing."""
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTelemetry(ITelemetry):
+    """
+    The telemetry of a disabled instrumentation: every call returns at once and records nothing.
+
+    Every span is the same shared no-op context manager, so the instrumented code enters its spans
+    unconditionally and a disabled span allocates nothing.
+    """
+
+    enabled: bool = False
+
+    def span(self, name: str, **attributes) -> _NullSpan:
+        return _NULL_SPAN
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        return None
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        return None
+
+    def record_usage(self, model: str, usage: dict[str, int]) -> None:
+        return None
+
+    def flush(self) -> None:
+        return None
+
+
+NULL_TELEMETRY = NullTelemetry()
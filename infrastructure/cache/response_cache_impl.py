@@ -0,0 +1,195 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from injector import inject
+
+from config import APIConfiguration
+from domain._json_serialize import loads
+from domain.cache.i_response_cache import IResponseCache
+from infrastructure.cache.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def request_key(request: dict | bytes) -> str:
+    """Hash the canonical JSON of a request, so equal requests share a key whatever their key order.
+
+    A request already serialized is hashed as is: its bytes are deterministic, so it is not encoded again.
+    """
+    if isinstance(request, bytes):
+        return hashlib.sha256(request).hexdigest()
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class LRUCache:
+    """An in-memory LRU cache of serialized responses, bounded by entries, bytes and time to live."""
+
+    def __init__(self, *, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries: int = max_entries
+        self.max_bytes: int = max_bytes
+        self.ttl: float = ttl
+        self.size: int = 0
+        self.evictions: int = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if key in self._entries:
+            self._pop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self.size += len(value)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _pop(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class SqliteCache:
+    """An on-disk cache of serialized responses that survives restarts."""
+
+    def __init__(self, path: str, *, ttl: float):
+        self.ttl: float = ttl
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS responses '
+                                 '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+
+    def get(self, key: str) -> str | None:
+        row = self._connection.execute('SELECT value FROM responses WHERE key = ? AND expires_at >= ?',
+                                       (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)',
+                                 (key, value, time.time() + self.ttl))
+
+    def purge(self) -> int:
+        """Delete the expired responses and return how many there were."""
+        return self._connection.execute('DELETE FROM responses WHERE expires_at < ?', (time.time(),)).rowcount
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class ResponseCache(IResponseCache):
+    """
+    A two-level cache of API responses keyed on a canonical hash of the request.
+
+    Lookups go to the in-memory LRU tier first, then to the optional sqlite tier configured by
+    `CACHE_PATH`; a disk hit is promoted to memory. Requests with a non-zero temperature are not
+    deterministic, so they are only cached when the caller opts in. Identical requests in flight at the
+    same time, cached or not, share one upstream call.
+
+    Attributes:
+    ----------
+    memory : LRUCache
+        The in-memory tier.
+    disk : SqliteCache | None
+        The on-disk tier, or None if it is disabled.
+    """
+
+    @inject
+    def __init__(self, config: APIConfiguration):
+        self.memory: LRUCache = LRUCache(max_entries=config.cache_max_entries, max_bytes=config.cache_max_bytes,
+                                         ttl=config.cache_ttl)
+        self.disk: SqliteCache | None = SqliteCache(config.cache_path, ttl=config.cache_ttl) \
+            if config.cache_path else None
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight()
+        self._async_single_flight = AsyncSingleFlight()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Get the hit, miss, eviction and coalescing counters and the size of the memory tier."""
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'evictions': self.memory.evictions,
+                'coalesced': self._single_flight.coalesced + self._async_single_flight.coalesced,
+                'memory_entries': len(self.memory),
+                'memory_bytes': self.memory.size}
+
+    def get(self, request: dict | bytes) -> dict | None:
+        key = request_key(request)
+        with self._lock:
+            value = self.memory.get(key)
+            if value is None and self.disk is not None:
+                value = self.disk.get(key)
+                if value is not None:
+                    self.disk_hits += 1
+                    self.memory.set(key, value)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return loads(value)
+
+    def set(self, request: dict | bytes, response: dict) -> None:
+        key = request_key(request)
+        value = json.dumps(response, separators=(',', ':'), ensure_ascii=False)
+        with self._lock:
+            self.memory.set(key, value)
+            if self.disk is not None:
+                self.disk.set(key, value)
+
+    def get_or_create(self, request: dict | bytes, create: Callable[[], dict], *, cache: bool | None = None) -> dict:
+        """Return the cached response of a request, or create and cache it.
+
+        Parameters:
+        request: The request body, or its serialized JSON, used as the cache key.
+        create: The function sending the request upstream.
+        cache: Whether the request may be cached; by default only request bodies with temperature 0 are.
+
+        Returns:
+            The response of the request.
+        """
+        if cache is None:
+            cache = isinstance(request, dict) and request.get('temperature', 1) == 0
+        if cache and (response := self.get(request)) is not None:
+            return response
+        response = self._single_flight.do(request_key(request), create)
+        if cache:
+            self.set(request, response)
+        return response
+
+    async def aget_or_create(self, request: dict | bytes, create: Callable[[], Awaitable[dict]], *,
+                             cache: bool | None = None) -> dict:
+        """Return the cached response of a request, or create and cache it, without blocking the event loop.
+
+        Parameters:
+        request: The request body, or its serialized JSON, used as the cache key.
+        create: The coroutine function sending the request upstream.
+        cache: Whether the request may be cached; by default only request bodies with temperature 0 are.
+
+        Returns:
+            The response of the request.
+        """
+        if cache is None:
+            cache = isinstance(request, dict) and request.get('temperature', 1) == 0
+        if cache and (response := self.get(request)) is not None:
+            return response
+        response = await self._async_single_flight.do(request_key(request), create)
+        if cache:
+            self.set(request, response)
+        return response
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key from threads into one call.
+
+    The first caller of a key runs the function; callers arriving while it is in flight wait for it
+    and receive the same result. When the call fails, the error is raised to its caller only: the
+    waiting callers make one new shared call, so a transient failure does not fail all of them.
+    """
+
+    def __init__(self):
+        self.coalesced: int = 0
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T], *, retry: bool = True) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            try:
+                return future.result()
+            except Exception:
+                if not retry:
+                    raise
+                return self.do(key, fn, retry=False)
+        try:
+            result = fn()
+        except BaseException as error:
+            # The call is removed before the waiters wake, so their new call does not find it
+            self._done(key)
+            future.set_exception(error)
+            raise
+        self._done(key)
+        future.set_result(result)
+        return result
+
+    def _done(self, key: str) -> None:
+        with self._lock:
+            del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent coroutines with the same key on an event loop into one call.
+
+    The shared call runs in its own task, so a waiter being cancelled does not cancel it for the others.
+    As with SingleFlight, a failed call is raised to its first caller only and the others make one new
+    shared call.
+    """
+
+    def __init__(self):
+        self.coalesced: int = 0
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]], *, retry: bool = True) -> T:
+        task = self._calls.get(key)
+        leader = task is None
+        if leader:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if leader or not retry:
+                raise
+            return await self.do(key, fn, retry=False)
@@ -0,0 +1,297 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable
+
+import aiohttp
+from injector import inject
+
+from config import APIConfiguration
+from domain._json_serialize import loads
+from domain.cache.i_response_cache import IResponseCache
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.i_async_chat_engine import IAsyncChatEngine
+from domain.chat_bot.message import Message
+from domain.chat_bot.prediction import Prediction
+from domain.chat_bot.route import Route
+from domain.chat_bot.streamed_turn import StreamedTurn
+from domain.chat_bot.token_counter import TokenCounter
+from domain.scheduler.i_hedger import IHedger
+from domain.scheduler.i_request_scheduler import IRequestScheduler
+from domain.scheduler.priority import Priority
+
+
+class AsyncChatEngine(IAsyncChatEngine):
+    """
+    A class representing an asyncio chat engine, which drives many Chat sessions concurrently.
+
+    Every session shares one aiohttp connection pool bounded by `APIConfiguration.api_max_connections`,
+    so thousands of chats can be awaited at the same time without opening a socket per chat. Within a
+    turn, the chat completion, the classification of the user message and the summary bookkeeping run
+    concurrently, the blocking ones on a worker pool, so a turn takes as long as its slowest stage.
+
+    Attributes:
+    ----------
+    config : APIConfiguration
+        The API configuration object containing the API key, base url and pool size.
+    cache : IResponseCache | None
+        The shared cache of API responses, which also coalesces identical requests in flight, or None.
+    scheduler : IRequestScheduler | None
+        The shared scheduler keeping the calls within the rate limits, or None to call the API directly.
+    hedger : IHedger | None
+        The shared hedger of slow calls, or None if calls are not hedged.
+    """
+
+    @inject
+    def __init__(self, config: APIConfiguration, cache: IResponseCache | None = None,
+                 scheduler: IRequestScheduler | None = None, hedger: IHedger | None = None):
+        """
+        Initialize the AsyncChatEngine with the provided API configuration.
+
+        Parameters:
+        ----------
+        config : APIConfiguration
+            The API configuration object containing the API key, base url and pool size.
+        cache : IResponseCache | None, optional
+            The shared cache of API responses, by default None.
+        scheduler : IRequestScheduler | None, optional
+            The shared scheduler keeping the calls within the rate limits, by default None.
+        hedger : IHedger | None, optional
+            The shared hedger of slow calls, by default None.
+        """
+        self.config: APIConfiguration = config
+        self.cache: IResponseCache | None = cache
+        self.scheduler: IRequestScheduler | None = scheduler
+        self.hedger: IHedger | None = hedger
+        self._token_counter: TokenCounter = TokenCounter()
+        self._session: aiohttp.ClientSession | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._resume_executor: ThreadPoolExecutor | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Get the shared client session, raising if the engine was not started."""
+        if self._session is None:
+            raise RuntimeError("AsyncChatEngine must be started before sending requests.")
+        return self._session
+
+    async def start(self) -> None:
+        """Open the shared, bounded connection pool."""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.config.api_max_connections)
+            headers = {'Authorization': f'Bearer {self.config.api_key}'}
+            timeout = aiohttp.ClientTimeout(total=self.config.request_deadline)
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers, timeout=timeout)
+            self._executor = ThreadPoolExecutor(thread_name_prefix='chat-engine')
+            # The summaries run on their own pool: a turn stage waiting for a summary on the first pool
+            # would otherwise deadlock once every worker waits for a summary with no worker left to run it
+            self._resume_executor = ThreadPoolExecutor(thread_name_prefix='chat-engine-resume')
+            self._loop = asyncio.get_running_loop()
+
+    async def close(self) -> None:
+        """Close the shared connection pool and worker pool."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._resume_executor.shutdown(wait=False, cancel_futures=True)
+            self._resume_executor = None
+
+    async def __aenter__(self) -> 'AsyncChatEngine':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _open(self, path: str, payload: dict | bytes) -> aiohttp.ClientResponse:
+        # A serialized body is sent as is, without encoding it again
+        kwargs = {'data': payload, 'headers': {'Content-Type': 'application/json'}} if isinstance(payload, bytes) \
+            else {'json': payload}
+        response = await self.session.post(f'{self.config.api_base}{path}', **kwargs)
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError:
+            response.release()
+            raise
+        return response
+
+    async def _post(self, path: str, payload: dict | bytes) -> dict:
+        async with await self._open(path, payload) as response:
+            return await response.json(loads=loads)
+
+    async def _send(self, path: str, payload: dict | bytes, *, estimated_tokens: int,
+                    priority: Priority = Priority.INTERACTIVE) -> dict:
+        def post() -> Awaitable[dict]:
+            if self.hedger is None:
+                return self._post(path, payload)
+            return self.hedger.call(lambda: self._post(path, payload))
+
+        if self.scheduler is None:
+            return await post()
+        return await self.scheduler.asubmit(post, estimated_tokens=estimated_tokens, priority=priority)
+
+    async def _chat_completion_create(self, chat: Chat, *, cache: bool | None = None,
+                                      route: Route | None = None) -> Prediction:
+        payload = chat.payload_bytes_for(route)
+        estimated_tokens = chat.estimated_tokens_for(route)
+
+        def create() -> Awaitable[dict]:
+            return self._send('/chat/completions', payload, estimated_tokens=estimated_tokens)
+
+        with chat.telemetry.span('upstream'):
+            body = await (create() if self.cache is None else self.cache.aget_or_create(payload, create, cache=cache))
+        return Prediction.from_json(body)
+
+    async def _stream_chunks(self, chat: Chat, route: Route | None) -> AsyncIterator[dict]:
+        payload = chat.payload_bytes_for(route, stream=True)
+
+        def open_stream() -> Awaitable[aiohttp.ClientResponse]:
+            return self._open('/chat/completions', payload)
+
+        # Only the opening of the response is scheduled, so a 429 is retried before the first delta
+        opening = open_stream() if self.scheduler is None else \
+            self.scheduler.asubmit(open_stream, estimated_tokens=chat.estimated_tokens_for(route))
+        async with await opening as response:
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    break
+                yield loads(data)
+
+    def stream_message_response(self, chat: Chat) -> StreamedTurn:
+        """
+        Request the next assistant message of the chat as a stream of deltas.
+
+        The last user message is routed and the request is sent when the returned turn is iterated with
+        `async for`. A canned answer is streamed as a single delta without any API call.
+
+        Parameters:
+        ----------
+        chat : Chat
+            The chat whose current context is sent to the API.
+
+        Returns:
+        -------
+        StreamedTurn
+            An async iterable of content deltas; its message is available once it is consumed.
+        """
+        route: Route | None = None
+
+        async def chunks() -> AsyncIterator[dict]:
+            nonlocal route
+            if chat.router is not None:
+                route = await self._run_in_executor(chat.route_last_message)
+                if route.is_canned:
+                    yield StreamedTurn.chunk(route.answer)
+                    return
+            async for chunk in self._stream_chunks(chat, route):
+                yield chunk
+
+        def finish(turn: StreamedTurn) -> None:
+            # A canned answer used no tokens
+            if route is None or not route.is_canned:
+                chat.process_streamed_turn(turn)
+
+        return StreamedTurn(chunks(), prompt_tokens=chat.prompt_tokens, on_finish=finish)
+
+    def _run_in_executor(self, fn: Callable, *args) -> Awaitable:
+        # The worker runs in the context of the turn, so its spans are nested in the turn
+        return self._loop.run_in_executor(self._executor, contextvars.copy_context().run, fn, *args)
+
+    async def process_message_response(self, chat: Chat, *, stream: bool = False,
+                                       cache: bool | None = None) -> Message:
+        """
+        Request the next assistant message of the chat without blocking the event loop.
+
+        Parameters:
+        ----------
+        chat : Chat
+            The chat whose current context is sent to the API.
+        stream : bool, optional
+            Receive the answer as a stream, recording its time-to-first-token, by default False.
+        cache : bool | None, optional
+            Whether the response may be cached; by default only when the temperature is 0.
+
+        Returns:
+        -------
+        Message
+            The assistant message of the prediction.
+        """
+        if stream:
+            turn = self.stream_message_response(chat)
+            async for _ in turn:
+                pass
+            return turn.message
+        route = None
+        if chat.router is not None:
+            route = await self._run_in_executor(chat.route_last_message)
+            if route.is_canned:
+                return Message.from_assistant(route.answer)
+        prediction = await self._chat_completion_create(chat, cache=cache, route=route)
+        return chat.process_prediction(prediction, route=route)
+
+    def _summarize(self, *, scheduled: bool, **request) -> dict:
+        """Send a summary completion through the shared pool from a worker thread, behind the chat turns."""
+        if scheduled:
+            estimated_tokens = self._token_counter.count(request['prompt']) + request.get('max_tokens', 0)
+            summary = self._send('/completions', request, estimated_tokens=estimated_tokens,
+                                 priority=Priority.BACKGROUND)
+        else:
+            summary = self._post('/completions', request)
+        return asyncio.run_coroutine_threadsafe(summary, self._loop).result()
+
+    def _update_resume_chat(self, chat: Chat) -> None:
+        # A chat with its own scheduler already schedules its summaries, they are sent directly then
+        chat.update_resume_chat(call_back=functools.partial(self._summarize, scheduled=chat.scheduler is None),
+                                executor=self._resume_executor)
+
+    async def run_turn(self, chat: Chat, prompt: str, *, stream: bool = False,
+                       cache: bool | None = None) -> Message:
+        """
+        Add the user prompt to the chat, await the assistant answer and add it too.
+
+        The chat completion (routed first when the chat has a router), the classification of the user
+        message (when the chat has a classifier and no router waiting for it) and the summary of the chat
+        run at the same time. The summary only holds the turn back once the chat reaches its hard token limit.
+
+        Parameters:
+        ----------
+        chat : Chat
+            The chat that receives the turn.
+        prompt : str
+            The content of the user's message.
+        stream : bool, optional
+            Receive the answer as a stream, by default False.
+        cache : bool | None, optional
+            Whether the response may be cached; by default only when the temperature is 0.
+
+        Returns:
+        -------
+        Message
+            The assistant message added to the chat.
+        """
+        with chat.telemetry.span('turn', stream=stream):
+            user_msg = Message.from_user(prompt=prompt)
+            chat.add(user_msg)
+            stages = [self.process_message_response(chat, stream=stream, cache=cache)]
+            if chat.needs_resume:
+                stages.append(self._run_in_executor(self._update_resume_chat, chat))
+            classify = chat.classifier is not None and (chat.router is None or not chat.router.needs_classification)
+            if classify:
+                # A router with low-value labels classifies the message itself, before routing it
+                stages.append(self._run_in_executor(chat.classify_message, user_msg))
+            # A failed classification or summary must not cost the user the answer
+            assistant_msg, *results = await asyncio.gather(*stages, return_exceptions=True)
+            if isinstance(assistant_msg, BaseException):
+                raise assistant_msg
+            if classify and isinstance(results[-1], Exception):
+                chat.classification_failed(results[-1])
+            chat.add(assistant_msg)
+            return assistant_msg
@@ -1,3 +1,7 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
 import openai
 from injector import inject
 
@@ -6,7 +10,14 @@ from domain.chat_bot.chat import Chat
 from domain.chat_bot.prediction import Prediction
 from domain.chat_bot.i_chat_bot_facade import IChatBotFacade
 from domain.chat_bot.message import Message
-from infrastructure.message_classifier.message_classifier_facade_impl import MessageClassifierFacadeImpl
+from domain.telemetry.i_telemetry import ITelemetry
+from infrastructure.cache.response_cache_impl import ResponseCache
+from infrastructure.chat_bot.message_router_impl import MessageRouter
+from infrastructure.chat_bot.retrieval_memory_impl import RetrievalMemory, SentenceEmbedder
+from infrastructure.message_classifier.message_classifier_service_impl import MessageClassifierService
+from infrastructure.scheduler.hedging import Hedger
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+from infrastructure.session.session_store_impl import SessionStore
 
 
 class ChatBotFacade(IChatBotFacade):
@@ -17,10 +28,29 @@ class ChatBotFacade(IChatBotFacade):
     ----------
     config : APIConfiguration
         The API configuration object containing the necessary API key.
+    classifier : MessageClassifierService
+        The shared message classifier handed to every chat.
+    cache : ResponseCache
+        The shared cache of API responses handed to every chat.
+    scheduler : RequestScheduler
+        The shared scheduler keeping the calls of every chat within the rate limits.
+    hedger : Hedger
+        The shared hedger enforcing deadlines on the chat completion calls.
+    router : MessageRouter
+        The shared router sending cheap messages to a cheap model and answering FAQs locally, handed to
+        the chats only when an FAQ index or low-value labels are configured.
+    embedder : SentenceEmbedder
+        The shared sentence-embedding model of the chat memories, used when `MEMORY_MODE` is "retrieval".
+    sessions : SessionStore
+        The persistent logs of the chat sessions, used when `SESSION_DIR` is set.
+    telemetry : ITelemetry
+        The instrumentation of the turns, which records nothing unless `TELEMETRY` is set.
     """
 
     @inject
-    def __init__(self, config: APIConfiguration):
+    def __init__(self, config: APIConfiguration, classifier: MessageClassifierService, cache: ResponseCache,
+                 scheduler: RequestScheduler, hedger: Hedger, router: MessageRouter,
+                 embedder: SentenceEmbedder, sessions: SessionStore, telemetry: ITelemetry):
         """
         Initialize the ChatBotFacade with the provided API configuration.
 
@@ -28,21 +58,127 @@ class ChatBotFacade(IChatBotFacade):
         ----------
         config : APIConfiguration
             The API configuration object containing the necessary API key.
+        classifier : MessageClassifierService
+            The shared message classifier handed to every chat.
+        cache : ResponseCache
+            The shared cache of API responses handed to every chat.
+        scheduler : RequestScheduler
+            The shared scheduler keeping the calls of every chat within the rate limits.
+        hedger : Hedger
+            The shared hedger enforcing deadlines on the chat completion calls.
+        router : MessageRouter
+            The shared router sending cheap messages to a cheap model and answering FAQs locally.
+        embedder : SentenceEmbedder
+            The shared sentence-embedding model of the chat memories, used when `MEMORY_MODE` is "retrieval".
+        sessions : SessionStore
+            The persistent logs of the chat sessions, used when `SESSION_DIR` is set.
+        telemetry : ITelemetry
+            The instrumentation of the turns, which records nothing unless `TELEMETRY` is set.
         """
         self.config: APIConfiguration = config
+        self.classifier: MessageClassifierService = classifier
+        self.cache: ResponseCache = cache
+        self.scheduler: RequestScheduler = scheduler
+        self.hedger: Hedger = hedger
+        self.router: MessageRouter = router
+        self.embedder: SentenceEmbedder = embedder
+        self.sessions: SessionStore = sessions
+        self.telemetry: ITelemetry = telemetry
+
+    def prewarm(self) -> None:
+        """Load the models of the chat ahead of the first message: the classifier, and the embedder in the retrieval mode."""
+        if self.config.classify_messages:
+            self.classifier.initialize()
+        if self.config.memory_mode == 'retrieval':
+            self.embedder.load()
 
-    def run(self) -> None:
+    def run(self, *, stream: bool = False, session_id: str | None = None,
+            prompts: Iterable[str] | None = None) -> Chat:
         """
         Start and run the chatbot conversation until it is finished.
+
+        The prompts are read from the terminal unless `prompts` is given: the chat then sends them in turn,
+        without printing anything, and finishes after the last one, as a simulated user does in a load test.
+
+        Parameters:
+        ----------
+        stream : bool, optional
+            Print the assistant answer token by token as it arrives, by default False.
+        session_id : str | None, optional
+            The ID of the session to resume when sessions are persisted, by default a new session.
+        prompts : Iterable[str] | None, optional
+            The prompts of a non-interactive user, by default None to prompt the user in the terminal.
+
+        Returns:
+        -------
+        Chat
+            The finished chat.
         """
         openai.api_key = self.config.api_key
-        # Create New Chat
-        chat = Chat(config=self.config, verbose=False)
+        openai.api_base = self.config.api_base
+        if self.config.prewarm:
+            # The models load while the user types the first message, instead of on the first classification
+            threading.Thread(target=self.prewarm, name='prewarm', daemon=True).start()
+        # Create New Chat, recalling its past messages instead of summarizing them in the retrieval mode
+        memory = RetrievalMemory(self.embedder) if self.config.memory_mode == 'retrieval' else None
+        classifier = self.classifier if self.config.classify_messages else None
+        # Without routing rules, the classification runs next to the completion instead of before it
+        router = self.router if self.config.route_messages else None
+        dependencies = dict(verbose=False, classifier=classifier, cache=self.cache, scheduler=self.scheduler,
+                            hedger=self.hedger, router=router, memory=memory,
+                            telemetry=self.telemetry)
+        if self.sessions.enabled:
+            session_id = session_id or self.sessions.new_session_id()
+            if prompts is None:
+                print(f'Session: {session_id}')
+            chat = Chat.from_session(self.config, self.sessions.open(session_id), **dependencies)
+        else:
+            chat = Chat(config=self.config, **dependencies)
+        # Summaries and message classifications run in the background, next to the chat completions
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                self._run_chat(chat, stream=stream, executor=executor,
+                               prompts=None if prompts is None else iter(prompts))
+        finally:
+            self.sessions.flush()
+            self.telemetry.flush()
+        return chat
+
+    @classmethod
+    def _run_chat(cls, chat: Chat, *, stream: bool, executor: ThreadPoolExecutor,
+                  prompts: Iterator[str] | None) -> None:
+        interactive = prompts is None
         while not chat.is_finished:
-            user_msg = Message.from_user(prompt=chat.prompt_user())
-            chat.add(user_msg)
-            assistant_msg = chat.process_message_response()
-            chat.add(assistant_msg)
+            prompt = chat.prompt_user() if interactive else next(prompts, None)
+            if prompt is None:
+                chat.finish()
+                break
+            user_msg = Message.from_user(prompt=prompt)
+            # The turn is timed from the prompt the user sent, not while the user types it
+            with chat.telemetry.span('turn', stream=stream):
+                cls._run_turn(chat, user_msg, stream=stream, executor=executor, interactive=interactive)
+
+    @staticmethod
+    def _run_turn(chat: Chat, user_msg: Message, *, stream: bool, executor: ThreadPoolExecutor,
+                  interactive: bool) -> None:
+        chat.add(user_msg)
+        try:
+            if stream:
+                turn = chat.stream_message_response(executor=executor)
+                for delta in turn:
+                    if interactive:
+                        print(delta, end='', flush=True)
+                assistant_msg = turn.message
+            else:
+                assistant_msg = chat.process_message_response(executor=executor)
+        except openai.error.OpenAIError as error:
+            # The scheduler already retried it; the message is dropped so the user may send it again
+            chat.discard(user_msg)
+            if interactive:
+                print(f'The assistant is not available right now: {error}')
+            return
+        chat.add(assistant_msg)
+        if interactive:
             chat.show()
-            # If the Chat is above 1k tokens it will be resumed to maintain the conversation context
-            chat.update_resume_chat(call_back=openai.Completion.create)
+        # If the Chat is near 1k tokens it will be resumed to maintain the conversation context
+        chat.update_resume_chat(call_back=openai.Completion.create, executor=executor)
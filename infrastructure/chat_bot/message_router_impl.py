@@ -0,0 +1,162 @@
+"""Classification-driven routing of user messages.
+
+A saved FAQ index is built once from question/answer pairs:
+python -m infrastructure.chat_bot.message_router_impl faq.json faq_index.json
+"""
+import json
+import math
+import re
+import sys
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Callable
+
+from injector import inject
+
+from config import APIConfiguration
+from domain.chat_bot.i_message_router import IMessageRouter
+from domain.chat_bot.message import Message
+from domain.chat_bot.route import Route
+
+
+def _terms(text: str) -> list[str]:
+    text = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode()
+    return re.findall(r'\w+', text)
+
+
+class FaqAnswerIndex:
+    """
+    A local TF-IDF index of frequently asked questions and their precomputed answers.
+
+    The question vectors are normalized and kept in an inverted index, so matching a message only
+    touches the questions that share a term with it.
+    """
+
+    def __init__(self, *, idf: dict[str, float], vectors: list[dict[str, float]], answers: list[str]):
+        self.idf: dict[str, float] = idf
+        self.vectors: list[dict[str, float]] = vectors
+        self.answers: list[str] = answers
+        self._postings: dict[str, list[tuple[int, float]]] = defaultdict(list)
+        for index, vector in enumerate(vectors):
+            for term, weight in vector.items():
+                self._postings[term].append((index, weight))
+
+    @classmethod
+    def from_faq(cls, faq: list[dict[str, str]]) -> 'FaqAnswerIndex':
+        """Build the index from a list of {"question": ..., "answer": ...} pairs."""
+        documents = [Counter(_terms(pair['question'])) for pair in faq]
+        frequency = Counter(term for document in documents for term in document)
+        idf = {term: math.log((1 + len(documents)) / (1 + count)) + 1 for term, count in frequency.items()}
+        vectors = [cls._normalize({term: count * idf[term] for term, count in document.items()})
+                   for document in documents]
+        return cls(idf=idf, vectors=vectors, answers=[pair['answer'] for pair in faq])
+
+    @classmethod
+    def load(cls, path: str) -> 'FaqAnswerIndex':
+        with open(path) as file:
+            return cls(**json.load(file))
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as file:
+            json.dump({'idf': self.idf, 'vectors': self.vectors, 'answers': self.answers}, file, ensure_ascii=False)
+
+    @staticmethod
+    def _normalize(vector: dict[str, float]) -> dict[str, float]:
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def match(self, text: str) -> tuple[str | None, float]:
+        """Return the answer of the most similar question and its cosine similarity."""
+        counts = Counter(term for term in _terms(text) if term in self.idf)
+        query = self._normalize({term: count * self.idf[term] for term, count in counts.items()})
+        scores: dict[int, float] = defaultdict(float)
+        for term, weight in query.items():
+            for index, question_weight in self._postings[term]:
+                scores[index] += weight * question_weight
+        if not scores:
+            return None, 0.0
+        best = max(scores, key=scores.get)
+        return self.answers[best], scores[best]
+
+
+class MessageRouter(IMessageRouter):
+    """
+    A router choosing how every user message is answered, from the FAQ index and its classification.
+
+    High-confidence FAQ matches are answered from the index without any API call. Messages classified
+    with one of the `ROUTE_LOW_VALUE_LABELS` (none by default) are sent to the cheap model with a short
+    context and a reduced `max_tokens`. Every other message takes the full route of the chat. The calls
+    and tokens the routing saved are counted in `stats`.
+
+    Only low-value labels make routing wait for the classification of a message; with an FAQ index
+    alone, a message is routed on the classification already attached to it, if any.
+    """
+
+    FULL: Route = Route('full')
+
+    @inject
+    def __init__(self, config: APIConfiguration):
+        self.faq_index: FaqAnswerIndex | None = FaqAnswerIndex.load(config.route_faq_index) \
+            if config.route_faq_index else None
+        self.faq_threshold: float = config.route_faq_threshold
+        self.low_value_labels: list[str] = config.route_low_value_labels
+        self.low_value_threshold: float = config.route_low_value_threshold
+        self.cheap_route: Route = Route('cheap', model=config.route_cheap_model,
+                                        max_tokens=config.route_cheap_max_tokens,
+                                        context_messages=config.route_cheap_context_messages)
+        self.stats: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @property
+    def needs_classification(self) -> bool:
+        """Get whether routing a message needs its classification."""
+        return bool(self.low_value_labels)
+
+    def route(self, msg: Message, *, classify: Callable[[Message], dict] | None = None) -> Route:
+        """Choose the route of a user message.
+
+        Parameters:
+        msg: The user message.
+        classify: The function classifying the message, only called when no FAQ answer matches, the
+            message has no classification attached yet and low-value labels are configured.
+
+        Returns:
+            The route of the message.
+        """
+        if self.faq_index is not None:
+            answer, score = self.faq_index.match(msg.content)
+            if answer is not None and score >= self.faq_threshold:
+                return Route('faq', answer=answer)
+        if msg.classification is None and classify is not None and self.needs_classification:
+            classify(msg)
+        if msg.classification:
+            label, score = msg.classification['labels'][0], msg.classification['scores'][0]
+            if label in self.low_value_labels and score >= self.low_value_threshold:
+                return self.cheap_route
+        return self.FULL
+
+    def record(self, route: Route, *, calls_saved: int, tokens_saved: int) -> None:
+        with self._lock:
+            self.stats[f'routed_{route.name}'] += 1
+            self.stats['calls_saved'] += calls_saved
+            self.stats['tokens_saved'] += tokens_saved
+
+    def report(self) -> str:
+        """Summarize how many messages took each route and the calls and tokens saved."""
+        stats = dict(self.stats)
+        routed = ', '.join(f'{name[7:]}: {count}' for name, count in sorted(stats.items())
+                           if name.startswith('routed_'))
+        return (f'Routed messages ({routed or "none"}), {stats.get("calls_saved", 0)} API calls and '
+                f'{stats.get("tokens_saved", 0)} tokens saved')
+
+
+def main() -> None:
+    """Build the FAQ index: python -m infrastructure.chat_bot.message_router_impl faq.json faq_index.json"""
+    faq_path, index_path = sys.argv[1:3]
+    with open(faq_path) as file:
+        FaqAnswerIndex.from_faq(json.load(file)).save(index_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+from injector import inject
+
+from config import APIConfiguration
+from domain.chat_bot.i_message_memory import IMessageMemory
+from domain.chat_bot.message import Message
+
+
+class SentenceEmbedder:
+    """
+    A local CPU sentence-embedding model, shared by the retrieval memory of every chat.
+
+    PyTorch and transformers are imported and the model is loaded on the first call, or by `load`. Texts are embedded in batches, mean-pooled over their tokens
+    and normalized, so the dot product of two embeddings is their cosine similarity.
+    """
+
+    @inject
+    def __init__(self, config: APIConfiguration):
+        self.model_name: str = config.memory_embedding_model
+        self.batch_size: int = config.memory_embedding_batch_size
+        self._tokenizer = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Load the model, once for the life of the embedder."""
+        with self._lock:
+            if self._model is None:
+                from transformers import AutoModel, AutoTokenizer
+
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = AutoModel.from_pretrained(self.model_name).eval()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Embed the texts into a (len(texts), dim) float32 matrix of unit rows."""
+        import torch
+
+        if self._model is None:
+            self.load()
+        batches = []
+        with torch.inference_mode():
+            for start in range(0, len(texts), self.batch_size):
+                inputs = self._tokenizer(texts[start:start + self.batch_size], padding=True, truncation=True,
+                                         return_tensors='pt')
+                hidden = self._model(**inputs).last_hidden_state
+                mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                batches.append(((hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)).numpy())
+        vectors = np.concatenate(batches).astype(np.float32, copy=False)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+        return vectors
+
+
+class RetrievalMemory(IMessageMemory):
+    """
+    The semantic memory of one chat: the embedding of every message in a contiguous NumPy matrix.
+
+    Every message is embedded once. Added messages are queued and embedded together on the next search,
+    then copied into the matrix, whose capacity doubles when it is full. Row i of the matrix belongs to
+    the i-th message added, which is its index in the chat history.
+    """
+
+    def __init__(self, embedder: SentenceEmbedder, *, capacity: int = 256):
+        self.embedder: SentenceEmbedder = embedder
+        self._capacity: int = capacity
+        self._vectors: np.ndarray | None = None
+        self._size: int = 0
+        self._pending: list[Message] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size + len(self._pending)
+
+    def add(self, msg: Message) -> None:
+        """Queue a message for the index; it is embedded with the others on the next search."""
+        with self._lock:
+            self._pending.append(msg)
+
+    def add_many(self, msgs: list[Message]) -> None:
+        """Queue several messages for the index."""
+        with self._lock:
+            self._pending.extend(msgs)
+
+    def truncate(self, size: int) -> None:
+        """Forget the messages added from index `size` on."""
+        with self._lock:
+            if size >= self._size:
+                del self._pending[size - self._size:]
+            else:
+                self._size = size
+                self._pending.clear()
+
+    def _reserve(self, size: int, dim: int) -> None:
+        if self._vectors is None:
+            self._vectors = np.empty((max(self._capacity, size), dim), dtype=np.float32)
+        elif size > len(self._vectors):
+            vectors = np.empty((max(2 * len(self._vectors), size), dim), dtype=np.float32)
+            vectors[:self._size] = self._vectors[:self._size]
+            self._vectors = vectors
+
+    def _flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            vectors = self.embedder.encode([msg.content for msg in self._pending])
+            self._reserve(self._size + len(vectors), vectors.shape[1])
+            self._vectors[self._size:self._size + len(vectors)] = vectors
+            self._size += len(vectors)
+            self._pending.clear()
+
+    def search(self, query: int, *, k: int, end: int) -> list[int]:
+        """
+        Find the messages most similar to an indexed message.
+
+        Parameters:
+        ----------
+        query : int
+            The index of the message searched for.
+        k : int
+            The number of messages returned.
+        end : int
+            Only the messages indexed before `end` are searched.
+
+        Returns:
+        -------
+        list[int]
+            The indexes of the `k` most similar messages, in the order they were added.
+        """
+        self._flush()
+        end = min(end, self._size)
+        if k <= 0 or end <= 0:
+            return []
+        scores = self._vectors[:end] @ self._vectors[query]
+        if k >= end:
+            return list(range(end))
+        return sorted(np.argpartition(-scores, k - 1)[:k].tolist())
@@ -1,34 +1,140 @@
 import openai
 from config import APIConfiguration
+from domain.chat_bot.token_counter import TokenCounter
 from domain.completion.completion_response import CompletionResponse
 from domain.completion.i_completion_facade import ICompletionFacade
+from domain.telemetry.i_telemetry import ITelemetry
+from domain.telemetry.null_telemetry import NULL_TELEMETRY
+from infrastructure.cache.response_cache_impl import ResponseCache
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
 from injector import inject
 
 
 class CompletionFacadeImpl(ICompletionFacade):
     """Class representing a facade for creating completion requests."""
     @inject
-    def __init__(self, config: APIConfiguration):
+    def __init__(self, config: APIConfiguration, cache: ResponseCache, scheduler: RequestScheduler,
+                 telemetry: ITelemetry = NULL_TELEMETRY):
         """Initialize a new CompletionFacadeImpl object.
 
         Parameters:
         config: An APIConfiguration object containing the configuration for the OpenAI API.
+        cache: The shared cache of API responses, which also coalesces identical requests in flight.
+        scheduler: The shared scheduler keeping the calls within the rate limits.
+        telemetry: The instrumentation timing the requests and counting their tokens, disabled by default.
         """
         self.config: APIConfiguration = config
+        self.cache: ResponseCache = cache
+        self.scheduler: RequestScheduler = scheduler
+        self.telemetry: ITelemetry = telemetry
+        self._token_counter: TokenCounter = TokenCounter(config.api_model or 'text-davinci-003')
 
-    def create(self, *, prompt: str) -> CompletionResponse:
+    def create(self, *, prompt: str, max_tokens: int = 50, cache: bool | None = None) -> CompletionResponse:
         """Create a new completion request and return the response.
 
         Parameters:
         prompt: A string containing the prompt for the completion request.
+        max_tokens: The maximum number of tokens of the completion.
+        cache: Whether the response may be cached; by default only when the temperature is 0.
 
         Returns:
             A CompletionResponse object representing the response to the completion request.
         """
         openai.api_key = self.config.api_key
-        response = openai.Completion.create(model=self.config.api_model,
-                                            prompt=prompt,
-                                            temperature=self.config.api_temperature,
-                                            max_tokens=50)
+        openai.api_base = self.config.api_base
+        request = self._request(prompt, max_tokens=max_tokens, temperature=self.config.api_temperature)
+        estimated_tokens = self._token_counter.count(prompt) + max_tokens
 
+        with self.telemetry.span('completion'):
+            response = self.cache.get_or_create(request, lambda: self._submit(request, estimated_tokens), cache=cache)
         return CompletionResponse.from_json(response)
+
+    def _submit(self, request: dict, estimated_tokens: int) -> dict:
+        """Send a completion request through the scheduler, counting the tokens of the response."""
+        response = self.scheduler.submit(lambda: openai.Completion.create(**request), estimated_tokens=estimated_tokens)
+        # Only the requests sent upstream are counted, not the responses served from the cache
+        self.telemetry.record_usage(response['model'], response.get('usage') or {})
+        return response
+
+    def _pack(self, prompt_tokens: list[int], max_tokens: int) -> list[list[int]]:
+        """Group prompt indexes into as few requests as the prompt and token limits per request allow."""
+        batches: list[list[int]] = []
+        batch: list[int] = []
+        batch_tokens = 0
+        for index, tokens in enumerate(prompt_tokens):
+            tokens += max_tokens
+            if batch and (len(batch) == self.config.completion_batch_prompts
+                          or batch_tokens + tokens > self.config.completion_batch_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(index)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _request(self, prompt: str | list[str], *, max_tokens: int, temperature: float) -> dict:
+        return {'model': self.config.api_model,
+                'prompt': prompt,
+                'temperature': temperature,
+                'max_tokens': max_tokens}
+
+    def create_many(self, prompts: list[str], *, max_tokens: int = 50, temperature: float | None = None,
+                    cache: bool | None = None) -> list[CompletionResponse]:
+        """Create the completions of many prompts with as few requests as possible.
+
+        Every prompt is first looked up in the response cache under the request `create` would send for
+        it alone, so both methods share their cached completions. The other prompts are packed into
+        requests of at most `COMPLETION_BATCH_PROMPTS` prompts and `COMPLETION_BATCH_TOKENS` prompt plus
+        completion tokens, identical requests in flight are coalesced, and the choices of every request
+        are demultiplexed back to their prompt by `index`.
+
+        Parameters:
+        prompts: The prompts to complete.
+        max_tokens: The maximum number of tokens of every completion.
+        temperature: The temperature of the batch, by default the configured one.
+        cache: Whether the completions may be cached; by default only when the temperature is 0.
+
+        Returns:
+            One CompletionResponse per prompt, in the order of the prompts; its usage is counted locally.
+
+        Raises:
+            openai.error.APIError: If a response has no choice for some of its prompts.
+        """
+        openai.api_key = self.config.api_key
+        openai.api_base = self.config.api_base
+        temperature = self.config.api_temperature if temperature is None else temperature
+        cache = temperature == 0 if cache is None else cache
+        completions: dict[str, dict] = {}
+        if cache:
+            for prompt in dict.fromkeys(prompts):
+                response = self.cache.get(self._request(prompt, max_tokens=max_tokens, temperature=temperature))
+                if response is not None:
+                    completions[prompt] = response
+        # A prompt repeated in the list is completed once
+        missing = [prompt for prompt in dict.fromkeys(prompts) if prompt not in completions]
+        prompt_tokens = [self._token_counter.count(prompt) for prompt in missing]
+        for batch in self._pack(prompt_tokens, max_tokens):
+            request = self._request([missing[index] for index in batch], max_tokens=max_tokens,
+                                    temperature=temperature)
+            estimated_tokens = sum(prompt_tokens[index] for index in batch) + max_tokens * len(batch)
+            with self.telemetry.span('completion_batch', prompts=len(batch)):
+                response = self.cache.get_or_create(request, lambda: self._submit(request, estimated_tokens),
+                                                    cache=False)
+            choices = {choice['index']: choice for choice in response['choices']}
+            if absent := {missing[index] for position, index in enumerate(batch) if position not in choices}:
+                indices = [index for index, prompt in enumerate(prompts) if prompt in absent]
+                raise openai.error.APIError(f'The completion response {response["id"]} has no choice for the '
+                                            f'prompts at indices {indices}.')
+            for position, index in enumerate(batch):
+                choice = choices[position]
+                completion_tokens = self._token_counter.count(choice['text'])
+                completion = {'choices': [{**choice, 'index': 0}], 'created': response['created'],
+                              'id': response['id'], 'model': response['model'], 'object': response['object'],
+                              'usage': {'prompt_tokens': prompt_tokens[index], 'completion_tokens': completion_tokens,
+                                        'total_tokens': prompt_tokens[index] + completion_tokens}}
+                completions[missing[index]] = completion
+                if cache:
+                    self.cache.set(self._request(missing[index], max_tokens=max_tokens, temperature=temperature),
+                                   completion)
+        return [CompletionResponse.from_json(completions[prompt]) for prompt in prompts]
@@ -1,38 +1,38 @@
-import openai
 from injector import inject
 
 from config import APIConfiguration
 from domain.dalle_img.i_dalle_img_facade import IDalleImgFacade
-from domain.dalle_img.img_response import ImgResponse
+from domain.dalle_img.img_result import ImgResult
+from infrastructure.dalle_img.img_pipeline_impl import ImgPipeline
 
 
 class DalleImgFacadeImpl(IDalleImgFacade):
     """Class representing a facade for creating DALL-E image requests."""
 
     @inject
-    def __init__(self, config: APIConfiguration):
+    def __init__(self, config: APIConfiguration, pipeline: ImgPipeline):
         """Initialize a new DalleImgFacadeImpl object.
 
         Parameters:
         config: An APIConfiguration object containing the configuration for the OpenAI API.
+        pipeline: The image pipeline generating, downloading and caching the images.
         """
         self.config: APIConfiguration = config
+        self.pipeline: ImgPipeline = pipeline
 
-    def run(self, *, size: str = '512x512') -> ImgResponse:
-        """Create a new DALL-E image request and return the response.
+    def run(self, *, size: str = '512x512') -> ImgResult:
+        """Create a new DALL-E image request and save the image to disk.
 
         Parameters:
-        prompt: A string containing the prompt for the DALL-E image request.
         size: An optional string containing the size of the output image. Defaults to '512x512'.
 
         Returns:
-            An ImgResponse object representing the response to the DALL-E image request.
+            An ImgResult object with the path of the saved image, or the error of the request if it failed.
         """
-        openai.api_key = self.config.api_key
         print('Dalle Image Creator:')
         print('-' * 100)
         user_input = input('>:')
         print('wait response...')
-        response = openai.Image.create(prompt=user_input, n=1, size=size)
-        print(response)
-        return ImgResponse.from_json(response)
+        result = self.pipeline.generate([user_input], size=size)[0]
+        print(result)
+        return result
@@ -0,0 +1,197 @@
+import asyncio
+import base64
+import hashlib
+import os
+from typing import Iterable
+
+import aiohttp
+from injector import inject
+
+from config import APIConfiguration
+from domain._json_serialize import dumps, loads
+from domain.dalle_img.i_img_pipeline import IImgPipeline
+from domain.dalle_img.img_response import ImgResponse
+from domain.dalle_img.img_result import ImgResult
+from domain.scheduler.i_request_scheduler import IRequestScheduler
+from domain.scheduler.priority import Priority
+from domain.telemetry.i_telemetry import ITelemetry
+from domain.telemetry.null_telemetry import NULL_TELEMETRY
+
+
+def image_key(prompt: str, size: str, n: int) -> str:
+    """Hash the parameters of an image request, which address its images in the disk cache."""
+    return hashlib.sha256(dumps([prompt, size, n])).hexdigest()
+
+
+class ImgPipeline(IImgPipeline):
+    """
+    A class representing a batch pipeline of DALL-E images, from prompts to image files.
+
+    The prompts are generated concurrently by at most `IMG_MAX_WORKERS` workers sharing one aiohttp
+    connection pool, and a prompt that fails gets a failed result without stopping the others. With the
+    default `IMG_RESPONSE_FORMAT` of 'url', the images are streamed to disk in chunks of `IMG_CHUNK_SIZE`
+    bytes and never held whole in memory. A 'b64_json' response is not streamed: its whole body is parsed
+    before the image is decoded to disk, so it is held in memory about twice.
+
+    The files are cached under `IMG_DIR`, addressed by the hash of the prompt, size and number of images.
+    Every file is written to a temporary path and renamed, and the manifest of a request is written last,
+    so an interrupted batch never leaves a partial entry in the cache.
+
+    Attributes:
+    ----------
+    config : APIConfiguration
+        The API configuration object containing the API key, base url and image settings.
+    scheduler : IRequestScheduler | None
+        The shared scheduler keeping the calls within the rate limits, or None to call the API directly.
+    telemetry : ITelemetry
+        The instrumentation timing the image requests and counting the images and the failed prompts.
+    generated : int
+        The number of requests sent to the API.
+    cache_hits : int
+        The number of prompts answered from the disk cache.
+    """
+
+    @inject
+    def __init__(self, config: APIConfiguration, scheduler: IRequestScheduler | None = None,
+                 telemetry: ITelemetry = NULL_TELEMETRY):
+        """
+        Initialize the ImgPipeline with the provided API configuration.
+
+        Parameters:
+        ----------
+        config : APIConfiguration
+            The API configuration object containing the API key, base url and image settings.
+        scheduler : IRequestScheduler | None, optional
+            The shared scheduler keeping the calls within the rate limits, by default None.
+        telemetry : ITelemetry, optional
+            The instrumentation of the pipeline, by default disabled.
+        """
+        self.config: APIConfiguration = config
+        self.scheduler: IRequestScheduler | None = scheduler
+        self.telemetry: ITelemetry = telemetry
+        self.directory: str = config.img_dir
+        self.max_workers: int = config.img_max_workers
+        self.chunk_size: int = config.img_chunk_size
+        self.response_format: str = config.img_response_format
+        self.generated: int = 0
+        self.cache_hits: int = 0
+
+    def _path(self, key: str, name: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}{name}')
+
+    def cached(self, prompt: str, *, size: str = '512x512', n: int = 1) -> ImgResult | None:
+        """Get the cached images of a request, or None if they were not generated yet."""
+        key = image_key(prompt, size, n)
+        try:
+            with open(self._path(key, '.json'), 'rb') as file:
+                manifest = loads(file.read())
+        except FileNotFoundError:
+            return None
+        return ImgResult(prompt, size, tuple(self._path(key, name) for name in manifest['files']), cached=True)
+
+    async def agenerate(self, prompts: Iterable[str], *, size: str = '512x512', n: int = 1) -> list[ImgResult]:
+        """
+        Generate the images of many prompts concurrently and save them to disk.
+
+        Parameters:
+        ----------
+        prompts : Iterable[str]
+            The prompts of the images; repeated prompts are generated once.
+        size : str, optional
+            The size of the images, by default '512x512'.
+        n : int, optional
+            The number of images per prompt, by default 1.
+
+        Returns:
+        -------
+        list[ImgResult]
+            The images of every prompt, in the order of the prompts. A prompt that failed has no images
+            and the error of its request.
+        """
+        prompts = list(prompts)
+        results: dict[str, ImgResult] = {}
+        for prompt in dict.fromkeys(prompts):
+            if (result := self.cached(prompt, size=size, n=n)) is not None:
+                results[prompt] = result
+                self.cache_hits += 1
+        pending = iter([prompt for prompt in dict.fromkeys(prompts) if prompt not in results])
+        connector = aiohttp.TCPConnector(limit=self.max_workers)
+        timeout = aiohttp.ClientTimeout(total=self.config.request_deadline)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+
+            async def worker() -> None:
+                # The workers share the iterator, so each prompt is taken by exactly one of them
+                for prompt in pending:
+                    try:
+                        results[prompt] = await self._generate(session, prompt, size, n)
+                    except Exception as error:
+                        results[prompt] = ImgResult(prompt, size, (), error=repr(error))
+                        self.telemetry.count('image_failures', size=size)
+
+            async with asyncio.TaskGroup() as group:
+                for _ in range(self.max_workers):
+                    group.create_task(worker())
+        return [results[prompt] for prompt in prompts]
+
+    def generate(self, prompts: Iterable[str], *, size: str = '512x512', n: int = 1) -> list[ImgResult]:
+        """Generate the images of many prompts and save them to disk, blocking until they are all saved."""
+        return asyncio.run(self.agenerate(prompts, size=size, n=n))
+
+    async def _post(self, session: aiohttp.ClientSession, body: dict) -> dict:
+        # The key is only sent to the API: the image URLs are presigned and reject other credentials
+        headers = {'Authorization': f'Bearer {self.config.api_key}'}
+        async with session.post(f'{self.config.api_base}/images/generations', json=body, headers=headers) as response:
+            response.raise_for_status()
+            return await response.json(loads=loads)
+
+    async def _request(self, session: aiohttp.ClientSession, body: dict) -> dict:
+        if self.scheduler is None:
+            return await self._post(session, body)
+        # Image requests count against the requests per minute only
+        return await self.scheduler.asubmit(lambda: self._post(session, body), estimated_tokens=0,
+                                            priority=Priority.BACKGROUND)
+
+    async def _generate(self, session: aiohttp.ClientSession, prompt: str, size: str, n: int) -> ImgResult:
+        body = {'prompt': prompt, 'n': n, 'size': size, 'response_format': self.response_format}
+        self.generated += 1
+        with self.telemetry.span('image', size=size, n=n):
+            response = await self._request(session, body)
+        self.telemetry.count('images', n, size=size)
+        key = image_key(prompt, size, n)
+        os.makedirs(os.path.dirname(self._path(key, '')), exist_ok=True)
+        files = []
+        for index, image in enumerate(ImgResponse.from_json(response).data):
+            name = f'-{index}.png'
+            temporary = self._path(key, f'{name}.{os.getpid()}.tmp')
+            try:
+                if image.get('b64_json') is not None:
+                    self._write_b64(temporary, image['b64_json'])
+                else:
+                    await self._download(session, image['url'], temporary)
+            except BaseException:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                raise
+            os.replace(temporary, self._path(key, name))
+            files.append(name)
+        manifest = self._path(key, '.json')
+        with open(f'{manifest}.{os.getpid()}.tmp', 'wb') as file:
+            file.write(dumps({'prompt': prompt, 'size': size, 'n': n, 'created': response.get('created'),
+                              'files': files}))
+        # The manifest makes the entry visible in the cache, once its images are complete
+        os.replace(f'{manifest}.{os.getpid()}.tmp', manifest)
+        return ImgResult(prompt, size, tuple(self._path(key, name) for name in files))
+
+    async def _download(self, session: aiohttp.ClientSession, url: str, path: str) -> None:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            with open(path, 'wb') as file:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    file.write(chunk)
+
+    def _write_b64(self, path: str, data: str) -> None:
+        # Decode whole 4 character groups at a time, so the decoded image is not held in memory as well
+        step = max(4, self.chunk_size // 3 * 4)
+        with open(path, 'wb') as file:
+            for start in range(0, len(data), step):
+                file.write(base64.b64decode(data[start:start + step]))
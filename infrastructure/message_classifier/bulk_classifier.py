@@ -0,0 +1,135 @@
+"""Offline bulk classification of stored messages.
+
+Reads messages lazily from a JSONL file in the `Message.to_json` shape, classifies them in length-sorted
+batches across a process pool and appends one JSON line per message to the output. A checkpoint next to
+the output records how far the input was processed and how long the output was then, so an interrupted
+run resumes where it stopped. Lines written after the last checkpoint are truncated on resume and
+classified again, so every message is in the output exactly once.
+
+Usage: python -m infrastructure.message_classifier.bulk_classifier messages.jsonl labels.jsonl
+"""
+import argparse
+import json
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator
+
+from config import APIConfiguration
+from domain.chat_bot.message import Message
+from infrastructure.message_classifier.message_classifier_facade_impl import MessageClassifierFacadeImpl
+
+_worker_facade: MessageClassifierFacadeImpl | None = None
+
+
+def _init_worker(config: APIConfiguration) -> None:
+    global _worker_facade
+    try:
+        import torch
+        # Every worker is one process, more threads per worker only oversubscribe the CPU
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    _worker_facade = MessageClassifierFacadeImpl()
+    _worker_facade.initialize(config)
+
+
+def _classify_batch(batch: list[tuple[int, Message]]) -> list[dict]:
+    predictions = _worker_facade.predict_many([msg for _, msg in batch])
+    return [{'line': line, 'label': prediction['labels'][0],
+             'scores': dict(zip(prediction['labels'], prediction['scores']))}
+            for (line, _), prediction in zip(batch, predictions)]
+
+
+def read_checkpoint(path: str) -> tuple[int, int, int | None]:
+    """Return the (line, byte) offset of the input processed so far and the byte size of the output then,
+    (0, 0, 0) if nothing was. The output size is None for checkpoints written before it was recorded."""
+    if not os.path.exists(path):
+        return 0, 0, 0
+    with open(path) as file:
+        checkpoint = json.load(file)
+    return checkpoint['line'], checkpoint['byte'], checkpoint.get('output')
+
+
+def write_checkpoint(path: str, line: int, byte: int, output: int) -> None:
+    """Record the processed offsets atomically, so a crash never leaves a torn checkpoint."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump({'line': line, 'byte': byte, 'output': output}, file)
+    os.replace(tmp_path, path)
+
+
+def read_windows(path: str, *, line: int, byte: int,
+                 window_size: int) -> Iterator[tuple[list[tuple[int, Message]], int, int]]:
+    """Lazily yield windows of (line, Message) starting at a checkpoint, with the offset after each window."""
+    window: list[tuple[int, Message]] = []
+    with open(path, 'rb') as file:
+        file.seek(byte)
+        for raw in file:
+            byte += len(raw)
+            if raw.strip():
+                window.append((line, Message.from_json(json.loads(raw))))
+            line += 1
+            if len(window) == window_size:
+                yield window, line, byte
+                window = []
+    if window:
+        yield window, line, byte
+
+
+def length_sorted_batches(window: list[tuple[int, Message]], batch_size: int) -> list[list[tuple[int, Message]]]:
+    """Split a window into batches of messages of similar length, so little padding is tokenized."""
+    window = sorted(window, key=lambda item: len(item[1].content))
+    return [window[i:i + batch_size] for i in range(0, len(window), batch_size)]
+
+
+def classify_jsonl(input_path: str, output_path: str, *, config: APIConfiguration, batch_size: int = 64,
+                   window_size: int = 4096, workers: int | None = None) -> int:
+    """Classify every message of a JSONL file, resuming from the checkpoint of a previous run.
+
+    Parameters:
+    input_path: The JSONL file of messages in the `Message.to_json` shape.
+    output_path: The JSONL file the labels are appended to.
+    config: The configuration of the classifier backend and model.
+    batch_size: The number of messages per forward pass.
+    window_size: The number of messages read, sorted and written at a time; it bounds the memory used.
+    workers: The number of worker processes, by default the number of CPUs.
+
+    Returns:
+        The number of messages classified by this run.
+    """
+    checkpoint_path = f'{output_path}.checkpoint'
+    line, byte, output_size = read_checkpoint(checkpoint_path)
+    if output_size is not None and os.path.exists(output_path) and os.path.getsize(output_path) > output_size:
+        # The run stopped after writing labels but before checkpointing them; they are classified again
+        os.truncate(output_path, output_size)
+    classified = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool, \
+            open(output_path, 'ab') as output:
+        for window, line, byte in read_windows(input_path, line=line, byte=byte, window_size=window_size):
+            futures: list[Future] = [pool.submit(_classify_batch, batch)
+                                     for batch in length_sorted_batches(window, batch_size)]
+            results = sorted((result for future in futures for result in future.result()),
+                             key=lambda result: result['line'])
+            output.writelines((json.dumps(result, ensure_ascii=False) + '\n').encode() for result in results)
+            output.flush()
+            os.fsync(output.fileno())
+            write_checkpoint(checkpoint_path, line, byte, output.tell())
+            classified += len(results)
+    return classified
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Classify stored chat messages in bulk.')
+    parser.add_argument('input', help='JSONL file of messages in the Message.to_json shape')
+    parser.add_argument('output', help='JSONL file the labels are appended to')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--window-size', type=int, default=4096)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    classified = classify_jsonl(args.input, args.output, config=APIConfiguration(), batch_size=args.batch_size,
+                                window_size=args.window_size, workers=args.workers)
+    print(f'{classified} messages classified')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+from typing import TYPE_CHECKING, Callable
+
+from config import APIConfiguration
+
+# transformers takes seconds to import, so it is only imported when a pipeline is built
+if TYPE_CHECKING:
+    from transformers import Pipeline
+
+TASK: str = "zero-shot-classification"
+
+
+def pytorch_pipeline(config: APIConfiguration) -> 'Pipeline':
+    """Build the zero-shot pipeline on the fp32 PyTorch model."""
+    from transformers import pipeline
+
+    return pipeline(TASK, model=config.classifier_model)
+
+
+def quantized_pipeline(config: APIConfiguration) -> 'Pipeline':
+    """Build the zero-shot pipeline on the PyTorch model with its Linear layers quantized to int8."""
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+    model = AutoModelForSequenceClassification.from_pretrained(config.classifier_model)
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    tokenizer = AutoTokenizer.from_pretrained(config.classifier_model)
+    return pipeline(TASK, model=model, tokenizer=tokenizer)
+
+
+def export_onnx(model_name: str, path: str) -> None:
+    """Export a sequence classification model and its tokenizer to `path`, as one `model.onnx` file.
+
+    The legacy TorchScript exporter is used: the exporter optimum drives on recent torch releases writes
+    the weights to a separate `model.onnx.data` file, which optimum then fails to load.
+    """
+    import inspect
+
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    # The graph inputs are positional, in the order of the arguments of `forward`
+    names = [name for name in inspect.signature(model.forward).parameters if name in tokenizer.model_input_names]
+    sample = tokenizer(['hola', 'buenos dias'], padding=True, return_tensors='pt')
+    axes = {name: {0: 'batch_size', 1: 'sequence_length'} for name in names}
+    axes['logits'] = {0: 'batch_size'}
+    options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in names), os.path.join(path, 'model.onnx'),
+                          input_names=names, output_names=['logits'], dynamic_axes=axes,
+                          opset_version=14, **options)
+    model.config.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+
+
+def onnx_pipeline(config: APIConfiguration) -> 'Pipeline':
+    """Build the zero-shot pipeline on an ONNX Runtime export of the model.
+
+    Requires the optional `optimum[onnxruntime]` dependency, listed in requirements-onnx.txt. The export
+    is saved to `CLASSIFIER_ONNX_DIR` when it is set and loaded from there on the next start.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as error:
+        raise ImportError("The onnx classifier backend requires optimum[onnxruntime], "
+                          "install it with `pip install -r requirements-onnx.txt`.") from error
+    from transformers import AutoTokenizer, pipeline
+
+    onnx_dir = config.classifier_onnx_dir
+    if onnx_dir and os.path.isfile(os.path.join(onnx_dir, 'model.onnx')):
+        return pipeline(TASK, model=ORTModelForSequenceClassification.from_pretrained(onnx_dir),
+                        tokenizer=AutoTokenizer.from_pretrained(onnx_dir))
+    with tempfile.TemporaryDirectory() as directory:
+        path = onnx_dir or directory
+        os.makedirs(path, exist_ok=True)
+        try:
+            export_onnx(config.classifier_model, path)
+        except Exception as error:
+            raise RuntimeError(f"Could not export {config.classifier_model!r} to ONNX: {error}") from error
+        # The session is read into memory, so the temporary export can be removed once it is loaded
+        return pipeline(TASK, model=ORTModelForSequenceClassification.from_pretrained(path),
+                        tokenizer=AutoTokenizer.from_pretrained(path))
+
+
+BACKENDS: dict[str, Callable[[APIConfiguration], 'Pipeline']] = {
+    'pytorch': pytorch_pipeline,
+    'quantized': quantized_pipeline,
+    'onnx': onnx_pipeline,
+}
+
+
+def load_pipeline(config: APIConfiguration) -> 'Pipeline':
+    """Build the zero-shot pipeline of the backend selected by `APIConfiguration.classifier_backend`."""
+    try:
+        build = BACKENDS[config.classifier_backend]
+    except KeyError:
+        raise ValueError(f"Unknown classifier backend {config.classifier_backend!r}, "
+                         f"expected one of {sorted(BACKENDS)}.") from None
+    return build(config)
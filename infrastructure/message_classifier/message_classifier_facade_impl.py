@@ -1,22 +1,36 @@
-from transformers import Pipeline, pipeline
+from typing import TYPE_CHECKING
 
 from config import APIConfiguration
 from domain.chat_bot.message import Message
 from domain.message_classifier.i_message_classifier_facade import IMessageClassifierFacade
+from infrastructure.message_classifier.classifier_backends import load_pipeline
+
+if TYPE_CHECKING:
+    from transformers import Pipeline
 
 
 class MessageClassifierFacadeImpl(IMessageClassifierFacade):
+    CANDIDATE_LABELS: list[str] = ["servicio", "informacion", "otro"]
 
     def __init__(self):
-        self.classifier: Pipeline | None = None
+        self.classifier: 'Pipeline | None' = None
         self.config: APIConfiguration | None = None
 
+    @property
+    def is_initialized(self) -> bool:
+        return self.classifier is not None
+
     def initialize(self, config: APIConfiguration) -> None:
         self.config = config
-        task: str = "zero-shot-classification"
-        model: str = "Recognai/bert-base-spanish-wwm-cased-xnli"
-        self.classifier = pipeline(task, model=model)
+        # The inference backend (pytorch, quantized or onnx) is selected by the configuration
+        self.classifier = load_pipeline(config)
 
-    def predict(self, msg: Message) -> Pipeline:
+    def predict(self, msg: Message) -> dict:
         return self.classifier(msg.content,
-                               candidate_labels=["servicio", "informacion", "otro"], )
+                               candidate_labels=self.CANDIDATE_LABELS, )
+
+    def predict_many(self, msgs: list[Message]) -> list[dict]:
+        """Classify several messages with batched forward passes."""
+        return self.classifier([msg.content for msg in msgs],
+                               candidate_labels=self.CANDIDATE_LABELS,
+                               batch_size=len(msgs))
@@ -0,0 +1,109 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from injector import inject
+
+from config import APIConfiguration
+from domain.chat_bot.message import Message
+from domain.message_classifier.i_message_classifier_facade import IMessageClassifierFacade
+from infrastructure.message_classifier.message_classifier_facade_impl import MessageClassifierFacadeImpl
+
+
+class MessageClassifierService(IMessageClassifierFacade):
+    """
+    A long-lived message classifier that loads the model once and micro-batches concurrent calls.
+
+    Every `submit` puts the message on a queue and returns a Future. A single worker thread takes the
+    first waiting message, collects more for at most `max_wait` seconds or until `max_batch_size`
+    messages are queued, and classifies them with one batched call of the facade.
+
+    Attributes:
+    ----------
+    max_batch_size : int
+        The maximum number of messages classified together.
+    max_wait : float
+        The maximum seconds the first message of a batch waits for others.
+    """
+
+    @inject
+    def __init__(self, config: APIConfiguration, facade: MessageClassifierFacadeImpl):
+        self.config: APIConfiguration = config
+        self.max_batch_size: int = config.classifier_max_batch_size
+        self.max_wait: float = config.classifier_max_wait
+        self._facade: MessageClassifierFacadeImpl = facade
+        self._queue: queue.Queue[tuple[Message, Future] | None] = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def initialize(self, config: APIConfiguration | None = None) -> None:
+        """Load the model and start the batching worker, once for the life of the service."""
+        with self._lock:
+            if not self._facade.is_initialized:
+                self._facade.initialize(config or self.config)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='message-classifier', daemon=True)
+                self._worker.start()
+
+    def close(self) -> None:
+        """Stop the batching worker once the queued messages are classified."""
+        with self._lock:
+            if self._worker is not None:
+                self._queue.put(None)
+                self._worker.join()
+                self._worker = None
+
+    def submit(self, msg: Message) -> Future:
+        """Queue a message for classification and return the Future of its prediction."""
+        if self._worker is None:
+            self.initialize()
+        future: Future = Future()
+        self._queue.put((msg, future))
+        return future
+
+    def predict(self, msg: Message) -> dict:
+        return self.submit(msg).result()
+
+    def predict_many(self, msgs: list[Message]) -> list[dict]:
+        futures = [self.submit(msg) for msg in msgs]
+        return [future.result() for future in futures]
+
+    async def apredict(self, msg: Message) -> dict:
+        """Classify a message without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(msg))
+
+    def _next_batch(self) -> list[tuple[Message, Future]] | None:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while (batch := self._next_batch()) is not None:
+            batch = [(msg, future) for msg, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                predictions = self._facade.predict_many([msg for msg, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
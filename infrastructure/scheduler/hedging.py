@@ -0,0 +1,165 @@
+import asyncio
+import bisect
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, TypeVar
+
+import openai
+from injector import inject
+
+from config import APIConfiguration
+from domain.scheduler.i_hedger import IHedger
+
+T = TypeVar('T')
+
+
+class LatencyTracker:
+    """A sliding window of call latencies with percentile queries."""
+
+    def __init__(self, *, window: int = 1000):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """Get the `q` percentile (0-100) of the window, or None if it is empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def percentiles(self) -> dict[str, float | None]:
+        return {f'p{q}': self.percentile(q) for q in (50, 95, 99)}
+
+    def histogram(self, bounds: list[float]) -> list[int]:
+        """Count the samples of the window falling under each bound, plus one bucket above the last."""
+        counts = [0] * (len(bounds) + 1)
+        with self._lock:
+            for sample in self._samples:
+                counts[bisect.bisect_left(bounds, sample)] += 1
+        return counts
+
+
+class Hedger(IHedger):
+    """
+    Per-call deadlines and hedged requests, to cut the tail latency of upstream calls.
+
+    When hedging is enabled and a call has not finished after the hedge delay (the observed p95 unless
+    `HEDGE_DELAY` is set), a duplicate is sent and the first one to finish wins; the other is cancelled.
+    Hedges are capped at `HEDGE_BUDGET` extra calls per call. Every call is abandoned with an
+    `openai.error.Timeout` once `REQUEST_DEADLINE` seconds have passed, so callers handle it as any
+    other API error.
+
+    Attributes:
+    ----------
+    deadline : float
+        The seconds after which a call is abandoned.
+    latencies : LatencyTracker
+        The latencies of the calls that finished.
+    calls : int
+        The number of calls made.
+    hedges : int
+        The number of duplicate calls sent.
+    """
+
+    MIN_SAMPLES: int = 20
+
+    @inject
+    def __init__(self, config: APIConfiguration):
+        self.enabled: bool = config.hedge_requests
+        self.deadline: float = config.request_deadline
+        self.delay: float | None = config.hedge_delay
+        self.budget: float = config.hedge_budget
+        self.latencies: LatencyTracker = LatencyTracker()
+        self.calls: int = 0
+        self.hedges: int = 0
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float | None:
+        """Get the seconds to wait before hedging a call, or None if it must not be hedged."""
+        if not self.enabled or self.hedges >= self.budget * self.calls:
+            return None
+        if self.delay is not None:
+            return self.delay
+        return self.latencies.percentile(95) if len(self.latencies) >= self.MIN_SAMPLES else None
+
+    def _start(self) -> tuple[float, float | None]:
+        with self._lock:
+            self.calls += 1
+            return time.monotonic(), self.hedge_delay()
+
+    def _hedged(self) -> None:
+        with self._lock:
+            self.hedges += 1
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await a call within the deadline, hedging it if it is slow."""
+        started_at, delay = self._start()
+        tasks = {asyncio.ensure_future(fn())}
+        try:
+            async with asyncio.timeout(self.deadline) as timeout:
+                if delay is not None:
+                    done, _ = await asyncio.wait(tasks, timeout=delay)
+                    if not done:
+                        self._hedged()
+                        tasks.add(asyncio.ensure_future(fn()))
+                while True:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    winner = next(iter(done))
+                    if winner.exception() is None or not tasks:
+                        result = winner.result()
+                        break
+        except TimeoutError as error:
+            if not timeout.expired():
+                raise
+            raise self._timeout() from error
+        finally:
+            for task in tasks:
+                task.cancel()
+        self.latencies.record(time.monotonic() - started_at)
+        return result
+
+    def call_sync(self, fn: Callable[[], T]) -> T:
+        """Run a blocking call within the deadline, hedging it on a worker thread if it is slow.
+
+        Threads cannot be interrupted, so the losing or abandoned call is left to finish in the background.
+        """
+        started_at, delay = self._start()
+        if delay is None:
+            result = fn()
+            self.latencies.record(time.monotonic() - started_at)
+            return result
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(thread_name_prefix='hedger')
+        futures: set[Future] = {self._executor.submit(fn)}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            self._hedged()
+            futures.add(self._executor.submit(fn))
+        deadline = started_at + self.deadline
+        while futures:
+            done, futures = wait(futures, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            winner = next(iter(done))
+            if winner.exception() is None or not futures:
+                for future in futures:
+                    future.cancel()
+                result = winner.result()
+                self.latencies.record(time.monotonic() - started_at)
+                return result
+        raise self._timeout()
+
+    def _timeout(self) -> openai.error.Timeout:
+        return openai.error.Timeout(f'The call did not finish within its {self.deadline} s deadline.')
@@ -0,0 +1,239 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Awaitable, Callable
+
+import aiohttp
+import openai
+from injector import inject
+
+from config import APIConfiguration
+from domain.scheduler.i_request_scheduler import IRequestScheduler
+from domain.scheduler.priority import Priority
+
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    aiohttp.ClientConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+class TokenBucket:
+    """A token bucket refilled continuously up to its capacity."""
+
+    def __init__(self, *, capacity: float, refill_per_second: float):
+        self.capacity: float = capacity
+        self.refill_per_second: float = refill_per_second
+        self._tokens: float = capacity
+        self._updated_at: float = time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+        return self._tokens
+
+    def wait_time(self, amount: float) -> float:
+        """Get the seconds until `amount` tokens are available, 0 if they already are."""
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.refill_per_second)
+
+    def take(self, amount: float) -> None:
+        """Take tokens out of the bucket; a negative amount gives them back."""
+        self._tokens = min(self.capacity, self.tokens - amount)
+
+
+class RequestScheduler(IRequestScheduler):
+    """
+    A scheduler shared by every facade, which keeps API calls within the requests and tokens per minute.
+
+    A call first waits for one request of the RPM bucket and its estimated tokens of the TPM bucket;
+    calls waiting together are served by priority, so interactive chat turns go ahead of background
+    summaries. Once the response arrives its `usage` replaces the estimate. Rate limit, server and
+    connection errors are retried after the Retry-After header or a jittered exponential backoff.
+
+    Attributes:
+    ----------
+    requests : TokenBucket
+        The requests per minute budget.
+    tokens : TokenBucket
+        The tokens per minute budget.
+    retries : int
+        The number of calls retried so far.
+    """
+
+    MAX_WAIT: float = 1.0
+
+    @inject
+    def __init__(self, config: APIConfiguration):
+        self.requests: TokenBucket = TokenBucket(capacity=config.rate_limit_rpm,
+                                                 refill_per_second=config.rate_limit_rpm / 60)
+        self.tokens: TokenBucket = TokenBucket(capacity=config.rate_limit_tpm,
+                                               refill_per_second=config.rate_limit_tpm / 60)
+        self.max_retries: int = config.max_retries
+        self.retry_base_delay: float = config.retry_base_delay
+        self.retry_max_delay: float = config.retry_max_delay
+        self.retries: int = 0
+        self._waiting: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # Threads wait on the condition for their turn; coroutines are woken through their loop
+        self._turn = threading.Condition(self._lock)
+        self._async_wakers: dict[tuple[int, int], Callable[[], None]] = {}
+
+    def _wake_head(self) -> None:
+        """Wake the calls waiting for their turn after the queue or the budget changed; the lock is held."""
+        self._turn.notify_all()
+        if self._waiting and (wake := self._async_wakers.get(self._waiting[0])) is not None:
+            wake()
+
+    def _try_acquire(self, ticket: tuple[int, int], estimated_tokens: int) -> float | None:
+        """Take the budget of a queued call if it is its turn; else return the seconds to wait for the
+        budget, or None if it is not its turn. The lock is held."""
+        if self._waiting[0] != ticket:
+            return None
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+        if wait > 0:
+            return min(wait, self.MAX_WAIT)
+        self.requests.take(1)
+        self.tokens.take(estimated_tokens)
+        heapq.heappop(self._waiting)
+        self._wake_head()
+        return 0.0
+
+    def _enqueue(self, priority: Priority) -> tuple[int, int]:
+        ticket = (int(priority), next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket: tuple[int, int]) -> None:
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._wake_head()
+
+    def _acquire(self, estimated_tokens: int, priority: Priority) -> None:
+        ticket = self._enqueue(priority)
+        try:
+            with self._turn:
+                while (wait := self._try_acquire(ticket, estimated_tokens)) != 0:
+                    if wait is None:
+                        self._turn.wait_for(lambda: self._waiting[0] == ticket)
+                    else:
+                        # The budget refills with time, or sooner when a response gives tokens back
+                        self._turn.wait(wait)
+        except BaseException:
+            self._dequeue(ticket)
+            raise
+
+    async def _aacquire(self, estimated_tokens: int, priority: Priority) -> None:
+        loop = asyncio.get_running_loop()
+        turn = asyncio.Event()
+        ticket = self._enqueue(priority)
+        with self._lock:
+            self._async_wakers[ticket] = lambda: loop.call_soon_threadsafe(turn.set)
+        try:
+            while True:
+                turn.clear()
+                with self._lock:
+                    wait = self._try_acquire(ticket, estimated_tokens)
+                if wait == 0:
+                    break
+                try:
+                    await asyncio.wait_for(turn.wait(), timeout=wait)
+                except TimeoutError:
+                    pass
+        except BaseException:
+            self._dequeue(ticket)
+            raise
+        finally:
+            with self._lock:
+                del self._async_wakers[ticket]
+
+    def _reconcile(self, estimated_tokens: int, response: dict) -> None:
+        usage = response.get('usage') if isinstance(response, dict) else None
+        if usage and 'total_tokens' in usage:
+            with self._lock:
+                self.tokens.take(usage['total_tokens'] - estimated_tokens)
+                self._wake_head()
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 429 or error.status >= 500
+        if isinstance(error, openai.error.InvalidRequestError):
+            return False
+        return isinstance(error, RETRYABLE_ERRORS)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        headers = getattr(error, 'headers', None) or {}
+        retry_after = headers.get('Retry-After') or headers.get('retry-after')
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        backoff = min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt)
+        return random.uniform(backoff / 2, backoff)
+
+    def submit(self, fn: Callable[[], dict], *, estimated_tokens: int,
+               priority: Priority = Priority.INTERACTIVE) -> dict:
+        """Run an API call within the rate limits, retrying it on transient errors.
+
+        Parameters:
+        fn: The function sending the request.
+        estimated_tokens: The prompt plus maximum completion tokens of the request.
+        priority: The priority of the call, interactive by default.
+
+        Returns:
+            The response of the call.
+        """
+        for attempt in itertools.count():
+            self._acquire(estimated_tokens, priority)
+            try:
+                response = fn()
+            except Exception as error:
+                if attempt >= self.max_retries or not self._is_retryable(error):
+                    raise
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self._retry_delay(error, attempt))
+                continue
+            self._reconcile(estimated_tokens, response)
+            return response
+
+    async def asubmit(self, fn: Callable[[], Awaitable[dict]], *, estimated_tokens: int,
+                      priority: Priority = Priority.INTERACTIVE) -> dict:
+        """Run an API coroutine within the rate limits, retrying it on transient errors.
+
+        Parameters:
+        fn: The coroutine function sending the request.
+        estimated_tokens: The prompt plus maximum completion tokens of the request.
+        priority: The priority of the call, interactive by default.
+
+        Returns:
+            The response of the call.
+        """
+        for attempt in itertools.count():
+            await self._aacquire(estimated_tokens, priority)
+            try:
+                response = await fn()
+            except Exception as error:
+                if attempt >= self.max_retries or not self._is_retryable(error):
+                    raise
+                with self._lock:
+                    self.retries += 1
+                await asyncio.sleep(self._retry_delay(error, attempt))
+                continue
+            self._reconcile(estimated_tokens, response)
+            return response
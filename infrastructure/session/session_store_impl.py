@@ -0,0 +1,338 @@
+import bisect
+import mmap
+import os
+import re
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Sequence
+
+from injector import inject
+
+from config import APIConfiguration
+from domain._json_serialize import dumps, loads
+from domain.chat_bot.message import Message
+from domain.session.i_session_log import ISessionLog
+
+_SESSION_ID = re.compile(r'[\w-]+')
+
+
+def _map(path: str) -> mmap.mmap | bytes:
+    """Map a file read-only, or return empty bytes if it is missing or empty."""
+    try:
+        with open(path, 'rb') as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return b''
+
+
+def _complete_size(data: mmap.mmap | bytes) -> int:
+    """Get the size of the complete records of the data; a crash mid-write can leave a torn last record."""
+    return data.rfind(b'\n') + 1
+
+
+def _valid_offsets(index: mmap.mmap | bytes, size: int) -> memoryview:
+    """Get the offsets of the index that point to complete records, the data having `size` bytes of them."""
+    offsets = memoryview(index)[:len(index) // 8 * 8].cast('Q')
+    return offsets[:bisect.bisect_left(offsets, size)]
+
+
+def _drop_torn_tail(paths: dict[str, str], snapshot_size: int) -> None:
+    """Truncate the log of a session after its last complete record, and its index after the entries of them."""
+    log = _map(paths['log'])
+    size = _complete_size(log)
+    torn = size < len(log)
+    if isinstance(log, mmap.mmap):
+        log.close()
+    if torn:
+        os.truncate(paths['log'], size)
+    index = _map(paths['index'])
+    with _valid_offsets(index, snapshot_size + size) as offsets:
+        count, torn = len(offsets), len(offsets) * 8 < len(index)
+    if isinstance(index, mmap.mmap):
+        index.close()
+    if torn:
+        os.truncate(paths['index'], count * 8)
+
+
+def _last_state(*datas: mmap.mmap | bytes) -> dict | None:
+    """Find the latest complete state record, searching the data from the newest to the oldest."""
+    for data in datas:
+        end = _complete_size(data)
+        start = data.rfind(b'\ns', 0, end) + 1
+        if start == 0 and (end == 0 or data[:1] != b's'):
+            continue
+        return loads(data[start + 1:data.find(b'\n', start)])
+    return None
+
+
+class PersistedMessages(Sequence[Message]):
+    """
+    The messages of a session read lazily from its files through an mmap'd index.
+
+    The index holds the offset of every message record in the data of the session: its snapshot
+    followed by its log. A message is only parsed when it is accessed. The entries pointing to a torn
+    last record, or past the end of the log, are ignored.
+    """
+
+    def __init__(self, index: mmap.mmap | bytes, snapshot: mmap.mmap | bytes, log: mmap.mmap | bytes):
+        self._offsets = _valid_offsets(index, len(snapshot) + _complete_size(log))
+        self._snapshot = snapshot
+        self._log = log
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        offset = self._offsets[index]
+        data = self._snapshot
+        if offset >= len(self._snapshot):
+            data, offset = self._log, offset - len(self._snapshot)
+        # Skip the record tag; the cached JSON of the message is the record itself
+        raw = bytes(data[offset + 1:data.find(b'\n', offset)])
+        msg = Message.from_json_bytes(raw)
+        msg.json_bytes = raw
+        return msg
+
+
+class _SessionFiles:
+    """The open log and index of a session, and the size of its data."""
+
+    def __init__(self, paths: dict[str, str]):
+        self.paths: dict[str, str] = paths
+        self.snapshot_size: int = os.path.getsize(paths['snapshot']) if os.path.exists(paths['snapshot']) else 0
+        _drop_torn_tail(paths, self.snapshot_size)
+        self.log = open(paths['log'], 'ab')
+        self.index = open(paths['index'], 'ab')
+        self.size: int = self.snapshot_size + self.log.tell()
+        self.dirty: bool = False
+
+    def flush(self, *, sync: bool) -> None:
+        self.log.flush()
+        self.index.flush()
+        if sync and self.dirty:
+            os.fsync(self.log.fileno())
+            os.fsync(self.index.fileno())
+            self.dirty = False
+
+    def close(self) -> None:
+        self.flush(sync=True)
+        self.log.close()
+        self.index.close()
+
+
+class SessionLog(ISessionLog):
+    """The append-only log of one chat session, written through the shared `SessionStore`."""
+
+    def __init__(self, store: 'SessionStore', session_id: str):
+        self.store: SessionStore = store
+        self.session_id: str = session_id
+
+    def append_message(self, msg: Message) -> None:
+        """Append a message record, and its offset to the index."""
+        self.store.append(self.session_id, b'm' + msg.to_json_bytes() + b'\n', indexed=True)
+
+    def save_state(self, state: dict) -> None:
+        """Append a state record: the used tokens, the summary and the current context of the chat."""
+        self.store.append(self.session_id, b's' + dumps(state) + b'\n')
+
+    def discard_messages(self, count: int) -> None:
+        """Drop the last `count` messages of the session from its index."""
+        self.store.discard(self.session_id, count)
+
+    def load(self) -> tuple[dict | None, PersistedMessages]:
+        """Get the latest state of the session and its messages, read lazily."""
+        return self.store.load(self.session_id)
+
+
+class SessionStore:
+    """
+    The persistent, append-only logs of the chat sessions, one per session under `SESSION_DIR`.
+
+    Every record is one line: a tag ("m" for a message, "s" for the chat state) and its JSON. The offsets
+    of the message records are appended to an index file, which is mmap'd to read old messages lazily.
+    Writes are buffered and the dirty files are fsync'ed together every `SESSION_FSYNC_INTERVAL` seconds
+    by a background thread; at most `SESSION_MAX_OPEN` sessions keep their files open. A crash can leave
+    a torn last record: it is skipped when a session is loaded, and truncated when its files are opened.
+
+    Compaction folds the log of a session and its snapshot into a new snapshot generation, keeping only
+    the message records and the latest state. The `<id>.gen` file names the current generation and is
+    replaced atomically, so an interrupted compaction leaves the previous generation in place.
+    """
+
+    @inject
+    def __init__(self, config: APIConfiguration):
+        self.directory: str | None = config.session_dir
+        self.fsync_interval: float = config.session_fsync_interval
+        self.max_open: int = config.session_max_open
+        self.fsyncs: int = 0
+        self._open: OrderedDict[str, _SessionFiles] = OrderedDict()
+        self._lock = threading.Lock()
+        self._flusher: threading.Thread | None = None
+        self._closed = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        """Get whether sessions are persisted, which requires `SESSION_DIR`."""
+        return self.directory is not None
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def open(self, session_id: str) -> SessionLog:
+        """Get the log of a session, new or existing."""
+        if not _SESSION_ID.fullmatch(session_id):
+            raise ValueError(f'Invalid session id: {session_id!r}')
+        return SessionLog(self, session_id)
+
+    def exists(self, session_id: str) -> bool:
+        return os.path.exists(self._paths(session_id)['index'])
+
+    def _generation(self, session_id: str) -> int:
+        try:
+            with open(self._base_path(session_id) + '.gen') as file:
+                return int(file.read())
+        except FileNotFoundError:
+            return 0
+
+    def _base_path(self, session_id: str) -> str:
+        return os.path.join(self.directory, session_id[:2], session_id)
+
+    def _paths(self, session_id: str, generation: int | None = None) -> dict[str, str]:
+        if generation is None:
+            generation = self._generation(session_id)
+        base = f'{self._base_path(session_id)}-{generation}'
+        return {'snapshot': base + '.snap', 'log': base + '.log', 'index': base + '.idx'}
+
+    def _files(self, session_id: str) -> _SessionFiles:
+        files = self._open.get(session_id)
+        if files is not None:
+            self._open.move_to_end(session_id)
+            return files
+        if len(self._open) >= self.max_open:
+            _, evicted = self._open.popitem(last=False)
+            self.fsyncs += evicted.dirty
+            evicted.close()
+        os.makedirs(os.path.dirname(self._base_path(session_id)), exist_ok=True)
+        files = self._open[session_id] = _SessionFiles(self._paths(session_id))
+        return files
+
+    def append(self, session_id: str, record: bytes, *, indexed: bool = False) -> None:
+        """Append a record to the log of a session; it is fsync'ed with the next batch."""
+        with self._lock:
+            files = self._files(session_id)
+            if indexed:
+                files.index.write(array('Q', [files.size]).tobytes())
+            files.log.write(record)
+            files.size += len(record)
+            files.dirty = True
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, daemon=True)
+                self._flusher.start()
+
+    def discard(self, session_id: str, count: int) -> None:
+        """Drop the index entries of the last `count` messages of a session; their records stay in the log."""
+        with self._lock:
+            files = self._files(session_id)
+            files.index.flush()
+            size = os.path.getsize(files.paths['index'])
+            os.truncate(files.paths['index'], max(0, size - 8 * count))
+            files.dirty = True
+
+    def _run_flusher(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write and fsync the pending records of every session."""
+        with self._lock:
+            for files in self._open.values():
+                self.fsyncs += files.dirty
+                files.flush(sync=True)
+
+    def close(self) -> None:
+        """Stop the background flusher and close every session, fsync'ing their pending records."""
+        self._closed.set()
+        with self._lock:
+            while self._open:
+                _, files = self._open.popitem()
+                files.close()
+
+    def load(self, session_id: str) -> tuple[dict | None, PersistedMessages]:
+        """
+        Get the latest state of a session and its messages, which are read lazily from the files.
+
+        Parameters:
+        session_id: The ID of the session.
+
+        Returns:
+            The latest state record, or None if there is none, and the messages of the session.
+        """
+        with self._lock:
+            if session_id in self._open:
+                self._open[session_id].flush(sync=False)
+            paths = self._paths(session_id)
+            snapshot, log = _map(paths['snapshot']), _map(paths['log'])
+            return _last_state(log, snapshot), PersistedMessages(_map(paths['index']), snapshot, log)
+
+    def compact(self, session_id: str) -> None:
+        """Fold the log and the snapshot of a session into a new snapshot generation."""
+        with self._lock:
+            files = self._open.pop(session_id, None)
+            if files is not None:
+                files.close()
+            generation = self._generation(session_id)
+            old = self._paths(session_id, generation)
+            snapshot, log = _map(old['snapshot']), _map(old['log'])
+            if not len(log):
+                return
+            state = _last_state(log, snapshot)
+            messages = PersistedMessages(_map(old['index']), snapshot, log)
+            new = self._paths(session_id, generation + 1)
+            offsets = array('Q')
+            with open(new['snapshot'], 'wb') as file:
+                for msg in messages:
+                    offsets.append(file.tell())
+                    file.write(b'm' + msg.json_bytes + b'\n')
+                if state is not None:
+                    file.write(b's' + dumps(state) + b'\n')
+                file.flush()
+                os.fsync(file.fileno())
+            with open(new['index'], 'wb') as file:
+                file.write(offsets.tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+            # Switching the generation is the commit point of the compaction
+            gen_path = self._base_path(session_id) + '.gen'
+            with open(gen_path + '.tmp', 'w') as file:
+                file.write(str(generation + 1))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(gen_path + '.tmp', gen_path)
+            del messages, snapshot, log
+            for path in old.values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def sessions(self) -> list[str]:
+        """List the IDs of the stored sessions."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return sorted({name.rsplit('-', 1)[0] for shard in os.listdir(self.directory)
+                       for name in os.listdir(os.path.join(self.directory, shard)) if name.endswith('.idx')})
+
+
+def main() -> None:
+    """Compact every stored session: python -m infrastructure.session.session_store_impl"""
+    store = SessionStore(APIConfiguration())
+    for session_id in store.sessions():
+        store.compact(session_id)
+    print(f'{len(store.sessions())} sessions compacted in {store.directory}')
+
+
+if __name__ == '__main__':
+    main()
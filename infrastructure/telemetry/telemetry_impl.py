@@ -0,0 +1,266 @@
+import bisect
+import contextvars
+import functools
+import itertools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from injector import inject
+
+from config import APIConfiguration
+from domain._json_serialize import dumps
+from domain.telemetry.i_telemetry import ITelemetry
+
+# The price in USD of 1K prompt and completion tokens, matched by the longest prefix of the model name
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    'gpt-3.5-turbo': (0.002, 0.002),
+    'gpt-4': (0.03, 0.06),
+    'gpt-4-32k': (0.06, 0.12),
+    'text-davinci-003': (0.02, 0.02),
+    'text-curie-001': (0.002, 0.002),
+    'text-babbage-001': (0.0005, 0.0005),
+    'text-ada-001': (0.0004, 0.0004),
+}
+SECONDS_BUCKETS: tuple[float, ...] = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PREFIX: str = 'chatbot_'
+
+_current_span: contextvars.ContextVar['Span | None'] = contextvars.ContextVar('current_span', default=None)
+
+
+@functools.cache
+def model_price(model: str) -> tuple[float, float]:
+    """Get the prompt and completion price of 1K tokens of a model, or zeros if it is unknown."""
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else (0.0, 0.0)
+
+
+def _labels(labels: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...], **extra: str) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """A histogram with fixed bucket bounds, exported with cumulative counts as Prometheus does."""
+
+    def __init__(self, bounds: tuple[float, ...] = SECONDS_BUCKETS):
+        self.bounds: tuple[float, ...] = bounds
+        self.counts: list[int] = [0] * (len(bounds) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Get the count of observations under every bound, the last bound being '+Inf'."""
+        bounds = [f'{bound:g}' for bound in self.bounds] + ['+Inf']
+        return list(zip(bounds, itertools.accumulate(self.counts)))
+
+
+class Span:
+    """
+    A timed stage of a turn. Spans nest through a context variable, so the parent of a span is found in
+    threads and in asyncio tasks alike, and every span of a turn shares the trace of its root span.
+    """
+    __slots__ = ('telemetry', 'name', 'attributes', 'id', 'parent', 'trace', 'start', '_token')
+
+    def __init__(self, telemetry: 'Telemetry', name: str, attributes: dict):
+        self.telemetry: Telemetry = telemetry
+        self.name: str = name
+        self.attributes: dict = attributes
+
+    def __enter__(self) -> 'Span':
+        parent = _current_span.get()
+        self.id: int = next(self.telemetry.span_ids)
+        self.parent: int | None = None if parent is None else parent.id
+        self.trace: int = self.id if parent is None else parent.trace
+        self._token = _current_span.set(self)
+        self.start: float = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        self.telemetry.end_span(self, duration, None if exc_type is None else exc_type.__name__)
+
+
+class Telemetry(ITelemetry):
+    """
+    The instrumentation of the chat: timing spans of the turn stages, counters and latency histograms.
+
+    Every span feeds the `span_seconds` histogram of its name and, when `TELEMETRY_TRACE_PATH` is set, a
+    JSONL trace record; the records are written in batches, not one by one. The counters and histograms
+    are exported in the Prometheus text format, to `TELEMETRY_PROMETHEUS_PATH` on every flush and on
+    `TELEMETRY_PROMETHEUS_PORT` when it is set. Collectors add the counters other components keep
+    themselves, such as the cache hits or the scheduler retries, when the metrics are exported.
+
+    When `TELEMETRY` is off the application uses `NullTelemetry` instead, and the instrumented code skips
+    its spans and metrics.
+
+    Attributes:
+    ----------
+    trace_path : str | None
+        The JSONL file the spans are appended to, or None.
+    prometheus_path : str | None
+        The file the metrics are written to on every flush, or None.
+    span_ids : Iterator[int]
+        The IDs given to the spans.
+    """
+
+    TRACE_BATCH: int = 1024
+    enabled: bool = True
+
+    @inject
+    def __init__(self, config: APIConfiguration):
+        self.trace_path: str | None = config.telemetry_trace_path
+        self.prometheus_path: str | None = config.telemetry_prometheus_path
+        self.span_ids = itertools.count(1)
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, Histogram]] = {}
+        self._span_histograms: dict[str, Histogram] = {}
+        self._collectors: dict[str, Callable[[], dict[str, float]]] = {}
+        self._trace: list[bytes] = []
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        if config.telemetry_prometheus_port is not None:
+            self.serve(config.telemetry_prometheus_port)
+
+    def span(self, name: str, **attributes) -> Span:
+        """Time a stage with `with telemetry.span(name):`, in sync and async code alike."""
+        return Span(self, name, attributes)
+
+    def end_span(self, span: Span, duration: float, error: str | None) -> None:
+        record = None
+        if self.trace_path is not None:
+            record = dumps({'trace': span.trace, 'span': span.id, 'parent': span.parent, 'name': span.name,
+                            'start': time.time() - duration, 'duration': duration, 'error': error,
+                            **span.attributes})
+        with self._lock:
+            histogram = self._span_histograms.get(span.name)
+            if histogram is None:
+                histogram = self._span_histograms[span.name] = self._histogram('span_seconds', (('span', span.name),))
+            histogram.observe(duration)
+            if record is not None:
+                self._trace.append(record)
+                if len(self._trace) >= self.TRACE_BATCH:
+                    self._write_trace()
+
+    def _histogram(self, name: str, labels: tuple) -> Histogram:
+        series = self._histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        return histogram
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add `value` to a counter."""
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Add an observation, in seconds, to a latency histogram."""
+        with self._lock:
+            self._histogram(name, _labels(labels)).observe(value)
+
+    def record_usage(self, model: str, usage: dict[str, int]) -> None:
+        """Count the prompt and completion tokens of a response and their cost, per model."""
+        prompt, completion = usage.get('prompt_tokens') or 0, usage.get('completion_tokens') or 0
+        prompt_price, completion_price = model_price(model)
+        self.count('tokens', prompt, model=model, kind='prompt')
+        self.count('tokens', completion, model=model, kind='completion')
+        self.count('cost_usd', (prompt * prompt_price + completion * completion_price) / 1000, model=model)
+
+    def add_collector(self, name: str, collect: Callable[[], dict[str, float]]) -> None:
+        """Export the figures returned by `collect` as `<name>_<key>` gauges, read when the metrics are exported."""
+        self._collectors[name] = collect
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Get the value of a counter."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def series(self, name: str) -> list[tuple[dict[str, str], float]]:
+        """Get the labels and value of every series of a counter."""
+        with self._lock:
+            return [(dict(labels), value) for labels, value in self._counters.get(name, {}).items()]
+
+    def histogram(self, name: str, **labels: str) -> Histogram | None:
+        """Get a histogram, or None if it has no observations."""
+        with self._lock:
+            return self._histograms.get(name, {}).get(_labels(labels))
+
+    def prometheus_text(self) -> str:
+        """Export the counters, histograms and collected figures in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f'# TYPE {PREFIX}{name}_total counter')
+                lines.extend(f'{PREFIX}{name}_total{_format_labels(labels)} {value:g}'
+                             for labels, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f'# TYPE {PREFIX}{name} histogram')
+                for labels, histogram in series.items():
+                    lines.extend(f'{PREFIX}{name}_bucket{_format_labels(labels, le=bound)} {count}'
+                                 for bound, count in histogram.cumulative())
+                    lines.append(f'{PREFIX}{name}_sum{_format_labels(labels)} {histogram.sum:g}')
+                    lines.append(f'{PREFIX}{name}_count{_format_labels(labels)} {histogram.count}')
+        for collector, collect in sorted(self._collectors.items()):
+            for key, value in sorted(collect().items()):
+                lines.append(f'# TYPE {PREFIX}{collector}_{key} gauge')
+                lines.append(f'{PREFIX}{collector}_{key} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def _write_trace(self) -> None:
+        records, self._trace = self._trace, []
+        with open(self.trace_path, 'ab') as file:
+            file.write(b'\n'.join(records) + b'\n')
+
+    def flush(self) -> None:
+        """Write the pending trace records and, when `TELEMETRY_PROMETHEUS_PATH` is set, the metrics."""
+        with self._lock:
+            if self._trace:
+                self._write_trace()
+        if self.prometheus_path is not None:
+            # Written aside and renamed, so a scraper never reads a partial file
+            with open(f'{self.prometheus_path}.tmp', 'w') as file:
+                file.write(self.prometheus_text())
+            os.replace(f'{self.prometheus_path}.tmp', self.prometheus_path)
+
+    def serve(self, port: int) -> None:
+        """Serve the metrics at http://localhost:<port>/metrics from a background thread."""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = telemetry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(('', port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+
+    def close(self) -> None:
+        self.flush()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
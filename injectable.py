@@ -1,14 +1,107 @@
-from injector import Module, provider
+from injector import Module, provider, singleton
 
 from config import APIConfiguration
+from domain.cache.i_response_cache import IResponseCache
+from domain.chat_bot.i_message_router import IMessageRouter
+from domain.dalle_img.i_img_pipeline import IImgPipeline
+from domain.scheduler.i_hedger import IHedger
+from domain.scheduler.i_request_scheduler import IRequestScheduler
+from domain.telemetry.i_telemetry import ITelemetry
+from domain.telemetry.null_telemetry import NULL_TELEMETRY
+from infrastructure.cache.response_cache_impl import ResponseCache
+from infrastructure.chat_bot.message_router_impl import MessageRouter
+from infrastructure.chat_bot.retrieval_memory_impl import SentenceEmbedder
+from infrastructure.dalle_img.img_pipeline_impl import ImgPipeline
 from infrastructure.message_classifier.message_classifier_facade_impl import MessageClassifierFacadeImpl
+from infrastructure.message_classifier.message_classifier_service_impl import MessageClassifierService
+from infrastructure.scheduler.hedging import Hedger
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+from infrastructure.session.session_store_impl import SessionStore
+from infrastructure.telemetry.telemetry_impl import Telemetry
 
 
 class AppModule(Module):
+    @singleton
     @provider
     def provide_config(self) -> APIConfiguration:
         return APIConfiguration()
 
+    @singleton
     @provider
     def provide_i_topic_predictor_facade(self) -> MessageClassifierFacadeImpl:
         return MessageClassifierFacadeImpl()
+
+    @singleton
+    @provider
+    def provide_message_classifier_service(self, config: APIConfiguration,
+                                           facade: MessageClassifierFacadeImpl) -> MessageClassifierService:
+        return MessageClassifierService(config, facade)
+
+    @singleton
+    @provider
+    def provide_response_cache(self, config: APIConfiguration) -> ResponseCache:
+        return ResponseCache(config)
+
+    @provider
+    def provide_i_response_cache(self, cache: ResponseCache) -> IResponseCache:
+        return cache
+
+    @singleton
+    @provider
+    def provide_request_scheduler(self, config: APIConfiguration) -> RequestScheduler:
+        return RequestScheduler(config)
+
+    @provider
+    def provide_i_request_scheduler(self, scheduler: RequestScheduler) -> IRequestScheduler:
+        return scheduler
+
+    @singleton
+    @provider
+    def provide_hedger(self, config: APIConfiguration) -> Hedger:
+        return Hedger(config)
+
+    @provider
+    def provide_i_hedger(self, hedger: Hedger) -> IHedger:
+        return hedger
+
+    @singleton
+    @provider
+    def provide_message_router(self, config: APIConfiguration) -> MessageRouter:
+        return MessageRouter(config)
+
+    @provider
+    def provide_i_message_router(self, router: MessageRouter) -> IMessageRouter:
+        return router
+
+    @singleton
+    @provider
+    def provide_sentence_embedder(self, config: APIConfiguration) -> SentenceEmbedder:
+        return SentenceEmbedder(config)
+
+    @singleton
+    @provider
+    def provide_session_store(self, config: APIConfiguration) -> SessionStore:
+        return SessionStore(config)
+
+    @singleton
+    @provider
+    def provide_img_pipeline(self, config: APIConfiguration, scheduler: RequestScheduler,
+                             telemetry: ITelemetry) -> ImgPipeline:
+        return ImgPipeline(config, scheduler, telemetry)
+
+    @provider
+    def provide_i_img_pipeline(self, pipeline: ImgPipeline) -> IImgPipeline:
+        return pipeline
+
+    @singleton
+    @provider
+    def provide_telemetry(self, config: APIConfiguration, cache: ResponseCache, scheduler: RequestScheduler,
+                          hedger: Hedger, router: MessageRouter) -> ITelemetry:
+        if not config.telemetry:
+            return NULL_TELEMETRY
+        telemetry = Telemetry(config)
+        telemetry.add_collector('cache', lambda: cache.stats)
+        telemetry.add_collector('scheduler', lambda: {'retries': scheduler.retries})
+        telemetry.add_collector('hedger', lambda: {'calls': hedger.calls, 'hedges': hedger.hedges})
+        telemetry.add_collector('router', lambda: dict(router.stats))
+        return telemetry
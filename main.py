@@ -1,3 +1,5 @@
+import sys
+
 from injector import Injector
 
 from infrastructure.chat_bot.chat_bot_facade_impl import ChatBotFacade
@@ -9,7 +11,8 @@ injector = Injector(AppModule())
 
 def main_chat() -> None:
     facade = injector.get(ChatBotFacade)
-    facade.run()
+    # An optional session ID resumes a persisted chat
+    facade.run(session_id=sys.argv[1] if len(sys.argv) > 1 else None)
 
 
 def main_img() -> None:
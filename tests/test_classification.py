@@ -0,0 +1,28 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from domain.message_classifier.i_message_classifier_facade import IMessageClassifierFacade
+
+
+class BrokenClassifier(IMessageClassifierFacade):
+
+    def predict(self, msg: Message):
+        raise RuntimeError('The model is not loaded')
+
+    def predict_many(self, msgs: list[Message]):
+        raise RuntimeError('The model is not loaded')
+
+    def initialize(self, config: APIConfiguration):
+        return None
+
+
+def test_a_failed_background_classification_is_logged(caplog):
+    chat = Chat(config=APIConfiguration(), classifier=BrokenClassifier())
+    chat.add(Message.from_user('Busco casa en Merida'))
+    with caplog.at_level(logging.WARNING), ThreadPoolExecutor() as executor:
+        chat._classify_last_message(executor)
+    assert 'The model is not loaded' in caplog.text
+    assert chat.last_message.classification is None
@@ -0,0 +1,53 @@
+import openai
+import pytest
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from infrastructure.cache.response_cache_impl import ResponseCache
+from infrastructure.completion.completion_facade_impl import CompletionFacadeImpl
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+
+PROMPTS = [f'Describe en una frase la colonia numero {n} de Puebla' for n in range(12)]
+
+
+def build_facade(api_base: str) -> CompletionFacadeImpl:
+    config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=api_base, MODEL='text-davinci-003',
+                              TEMPERATURE='0')
+    return CompletionFacadeImpl(config, ResponseCache(config), RequestScheduler(config))
+
+
+def test_create_many_shares_the_cache_with_create():
+    with StubServer() as server:
+        facade = build_facade(server.api_base)
+        single = facade.create(prompt=PROMPTS[0])
+        batched = facade.create_many(PROMPTS + PROMPTS[:2])
+        again = facade.create_many(PROMPTS)
+    # The first prompt is served from the cache, the others in one request, the second call from the cache
+    assert server.hits == {'completion': 2}
+    assert batched[0].message == single.message
+    assert [r.message for r in batched[-2:]] == [r.message for r in batched[:2]]
+    assert [r.message for r in again] == [r.message for r in batched[:len(PROMPTS)]]
+
+
+def test_create_and_create_many_agree_on_max_tokens():
+    with StubServer() as server:
+        facade = build_facade(server.api_base)
+        single = facade.create(prompt=PROMPTS[0], max_tokens=20)
+        batched = facade.create_many(PROMPTS[:1], max_tokens=20)
+        facade.create_many(PROMPTS[:1], max_tokens=40)
+    # The same max_tokens makes the same request, served from the cache; another one is sent again
+    assert server.hits == {'completion': 2}
+    assert batched[0].message == single.message
+
+
+def test_create_many_raises_on_missing_choices(monkeypatch):
+    def create(**request) -> dict:
+        # The API answers every prompt but the second and the fifth
+        choices = [{'index': index, 'text': prompt, 'finish_reason': 'stop', 'logprobs': None}
+                   for index, prompt in enumerate(request['prompt']) if index not in (1, 4)]
+        return {'id': 'cmpl-1', 'object': 'text_completion', 'created': 0, 'model': request['model'],
+                'choices': choices}
+
+    monkeypatch.setattr(openai.Completion, 'create', create)
+    with pytest.raises(openai.error.APIError, match=r'indices \[1, 4\]'):
+        build_facade('http://127.0.0.1:9/v1').create_many(PROMPTS[:6])
@@ -0,0 +1,31 @@
+import openai
+
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from infrastructure.chat_bot.chat_bot_facade_impl import ChatBotFacade
+from infrastructure.session.session_store_impl import SessionStore
+
+
+def test_a_failed_turn_drops_its_user_message(tmp_path, monkeypatch):
+    store = SessionStore(APIConfiguration(SESSION_DIR=str(tmp_path)))
+    chat = Chat(config=APIConfiguration(), session=store.open('failed'))
+    chat.add(Message.from_user('Busco casa en Merida'))
+    chat.add(Message.from_assistant('Tengo tres opciones en el norte'))
+    history = [msg.content for msg in chat.history]
+
+    def unavailable(**kwargs):
+        raise openai.error.APIError('The server is overloaded')
+
+    monkeypatch.setattr(chat, 'process_message_response', unavailable)
+    ChatBotFacade._run_turn(chat, Message.from_user('Y en el centro?'), stream=False, executor=None,
+                            interactive=False)
+    assert [msg.content for msg in chat.history] == history
+
+    # The message sent again is stored once, and the resumed session does not have the failed one
+    chat.add(Message.from_user('Y en el centro?'))
+    assert [msg.content for msg in chat.history] == history + ['Y en el centro?']
+    assert chat.payload_bytes_for().count(b'"Y en el centro?"') == 1
+    store.close()
+    _, messages = SessionStore(APIConfiguration(SESSION_DIR=str(tmp_path))).open('failed').load()
+    assert [msg.content for msg in messages] == history + ['Y en el centro?']
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+from infrastructure.scheduler.hedging import Hedger
+
+DEADLINE = 0.2
+
+
+def chat_for(config: APIConfiguration) -> Chat:
+    chat = Chat(config=config)
+    chat.add(Message.from_user('Busco casa en Merida'))
+    return chat
+
+
+def test_slow_call_is_abandoned_at_the_deadline():
+    hedger = Hedger(APIConfiguration(REQUEST_DEADLINE=str(DEADLINE)))
+
+    async def slow() -> dict:
+        await asyncio.sleep(5)
+        return {}
+
+    start = time.perf_counter()
+    with pytest.raises(openai.error.Timeout):
+        asyncio.run(hedger.call(slow))
+    assert time.perf_counter() - start < DEADLINE + 0.5
+
+
+def test_slow_blocking_call_is_abandoned_at_the_deadline():
+    hedger = Hedger(APIConfiguration(REQUEST_DEADLINE=str(DEADLINE), HEDGE_REQUESTS='true', HEDGE_DELAY='0.05',
+                                     HEDGE_BUDGET='1'))
+    start = time.perf_counter()
+    with pytest.raises(openai.error.Timeout):
+        hedger.call_sync(lambda: time.sleep(1))
+    assert time.perf_counter() - start < DEADLINE + 0.5
+    assert hedger.hedges == 1
+
+
+def test_hedge_wins_over_a_slow_call():
+    hedger = Hedger(APIConfiguration(HEDGE_REQUESTS='true', HEDGE_DELAY='0.05', HEDGE_BUDGET='1'))
+    latencies = iter([5, 0])
+
+    async def call() -> float:
+        latency = next(latencies)
+        await asyncio.sleep(latency)
+        return latency
+
+    assert asyncio.run(hedger.call(call)) == 0
+    assert hedger.hedges == 1
+
+
+def test_turn_past_the_deadline_raises_an_api_timeout():
+    async def main() -> None:
+        async with StubServer(latency=2) as server:
+            config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base,
+                                      REQUEST_DEADLINE=str(DEADLINE))
+            async with AsyncChatEngine(config, hedger=Hedger(config)) as engine:
+                await engine.process_message_response(chat_for(config))
+
+    with pytest.raises(openai.error.Timeout):
+        asyncio.run(main())
+
+    with StubServer(latency=2) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base,
+                                  REQUEST_DEADLINE=str(DEADLINE))
+        chat = chat_for(config)
+        chat.hedger = Hedger(config)
+        with pytest.raises(openai.error.Timeout):
+            chat.process_message_response()
@@ -0,0 +1,34 @@
+import os
+
+import aiohttp
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from infrastructure.dalle_img.img_pipeline_impl import ImgPipeline
+
+PROMPTS = [f'Fachada de una casa en Merida, estilo {n}' for n in range(6)]
+
+
+def test_a_failed_prompt_does_not_cancel_the_batch(tmp_path, monkeypatch):
+    with StubServer(image_size=1024) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, IMG_DIR=str(tmp_path),
+                                  IMG_MAX_WORKERS='3')
+        pipeline = ImgPipeline(config)
+        post = pipeline._post
+
+        async def failing_post(session: aiohttp.ClientSession, body: dict) -> dict:
+            if body['prompt'] == PROMPTS[2]:
+                raise aiohttp.ClientConnectionError('connection reset')
+            return await post(session, body)
+
+        monkeypatch.setattr(pipeline, '_post', failing_post)
+        results = pipeline.generate(PROMPTS)
+        monkeypatch.undo()
+        retried = pipeline.generate(PROMPTS)
+
+    assert [result.ok for result in results] == [True, True, False, True, True, True]
+    assert results[2].paths == () and 'connection reset' in results[2].error
+    assert all(os.path.exists(path) for result in results for path in result.paths)
+    # The failed prompt is not cached, so it is generated again on the next batch
+    assert [result.cached for result in retried] == [True, True, False, True, True, True]
+    assert all(result.ok for result in retried)
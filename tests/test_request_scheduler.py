@@ -0,0 +1,87 @@
+import asyncio
+import functools
+import time
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.message import Message
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+
+SUMMARY = {'model': 'text-davinci-003', 'prompt': 'Resume el chat sobre casas en Merida', 'temperature': .2,
+           'max_tokens': 50}
+
+
+def config_for(server: StubServer, **env: str) -> APIConfiguration:
+    return APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, **env)
+
+
+def chat_for(config: APIConfiguration) -> Chat:
+    chat = Chat(config=config)
+    chat.add(Message.from_user('Busco casa en Merida'))
+    return chat
+
+
+def test_rate_limited_calls_are_retried_after_retry_after():
+    async def main() -> None:
+        # Without the Retry-After header a retry would back off for seconds
+        async with StubServer(error_rate=0.5, error_statuses=(429,), retry_after=0.1) as server:
+            config = config_for(server, RETRY_BASE_DELAY='10', MAX_RETRIES='20')
+            scheduler = RequestScheduler(config)
+            async with AsyncChatEngine(config, scheduler=scheduler) as engine:
+                start = time.perf_counter()
+                answers = [await engine.process_message_response(chat_for(config)) for _ in range(5)]
+                answers += [await engine.process_message_response(chat_for(config), stream=True) for _ in range(5)]
+                elapsed = time.perf_counter() - start
+        assert all(answer.content for answer in answers)
+        assert scheduler.retries == server.hits['error_429'] > 0
+        assert scheduler.retries * 0.1 <= elapsed < scheduler.retries * 0.1 + 2
+
+    asyncio.run(main())
+
+
+def test_calls_stay_within_the_rpm_budget():
+    rpm, calls = 1200, 15
+
+    async def main() -> None:
+        async with StubServer() as server:
+            config = config_for(server, RATE_LIMIT_RPM=str(rpm))
+            scheduler = RequestScheduler(config)
+            scheduler.requests.take(rpm)
+            async with AsyncChatEngine(config, scheduler=scheduler) as engine:
+                start = time.perf_counter()
+                await asyncio.gather(*(engine.process_message_response(chat_for(config)) for _ in range(calls)))
+                elapsed = time.perf_counter() - start
+        assert server.hits['chat'] == calls
+        assert elapsed >= calls / (rpm / 60) * 0.9
+
+    asyncio.run(main())
+
+
+def test_interactive_call_finishes_before_a_queued_background_call():
+    finished = []
+
+    async def main() -> None:
+        async with StubServer() as server:
+            config = config_for(server, RATE_LIMIT_RPM='600')
+            scheduler = RequestScheduler(config)
+            scheduler.requests.take(600)
+            async with AsyncChatEngine(config, scheduler=scheduler) as engine:
+                loop = asyncio.get_running_loop()
+
+                async def summarize() -> None:
+                    await loop.run_in_executor(None, functools.partial(engine._summarize, scheduled=True, **SUMMARY))
+                    finished.append('background')
+
+                async def answer() -> None:
+                    await engine.process_message_response(chat_for(config))
+                    finished.append('interactive')
+
+                background = asyncio.create_task(summarize())
+                while not scheduler._waiting:
+                    await asyncio.sleep(0.001)
+                await asyncio.gather(background, answer())
+
+    asyncio.run(main())
+    assert finished == ['interactive', 'background']
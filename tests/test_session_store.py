@@ -0,0 +1,46 @@
+from array import array
+
+import pytest
+
+from config import APIConfiguration
+from domain.chat_bot.message import Message
+from infrastructure.session.session_store_impl import SessionStore
+
+
+def write_session(directory: str) -> SessionStore:
+    store = SessionStore(APIConfiguration(SESSION_DIR=directory))
+    log = store.open('torn')
+    log.append_message(Message.from_user('Busco casa en Merida'))
+    log.append_message(Message.from_assistant('Tengo tres opciones en el norte'))
+    log.save_state({'used_tokens': 42})
+    store.close()
+    return store
+
+
+@pytest.mark.parametrize('tail', [b's{"used_tok', b'm{"role":"user","cont'])
+def test_resume_from_a_log_with_a_torn_tail(tmp_path, tail):
+    store = write_session(str(tmp_path))
+    paths = store._paths('torn')
+    with open(paths['log'], 'rb') as file:
+        size = len(file.read())
+    # A crash mid-write leaves the start of a record, and the index entry of a torn message
+    if tail.startswith(b'm'):
+        with open(paths['index'], 'ab') as file:
+            file.write(array('Q', [size]).tobytes())
+    with open(paths['log'], 'ab') as file:
+        file.write(tail)
+
+    store = SessionStore(APIConfiguration(SESSION_DIR=str(tmp_path)))
+    state, messages = store.open('torn').load()
+    assert state == {'used_tokens': 42}
+    assert [msg.content for msg in messages] == ['Busco casa en Merida', 'Tengo tres opciones en el norte']
+
+    # Writing again truncates the torn records, so the new ones can be read back
+    log = store.open('torn')
+    log.append_message(Message.from_user('Y en el centro?'))
+    log.save_state({'used_tokens': 60})
+    state, messages = log.load()
+    store.close()
+    assert state == {'used_tokens': 60}
+    assert [msg.content for msg in messages][-1] == 'Y en el centro?'
+    assert len(messages) == 3
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from infrastructure.cache.response_cache_impl import ResponseCache
+from infrastructure.completion.completion_facade_impl import CompletionFacadeImpl
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+
+CALLERS = 50
+REQUEST = {'model': 'text-davinci-003', 'prompt': '¿Cual es el precio promedio del m2 en CDMX?', 'temperature': 0}
+
+
+def config_for(server: StubServer) -> APIConfiguration:
+    return APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, MODEL='text-davinci-003',
+                            TEMPERATURE='0.7')
+
+
+def run_concurrently(call, callers: int = CALLERS) -> list:
+    barrier = threading.Barrier(callers)
+
+    def start(_):
+        barrier.wait()
+        return call()
+
+    with ThreadPoolExecutor(max_workers=callers) as threads:
+        return list(threads.map(start, range(callers)))
+
+
+def test_concurrent_identical_requests_hit_upstream_once():
+    with StubServer(latency=0.2) as server:
+        config = config_for(server)
+        facade = CompletionFacadeImpl(config, ResponseCache(config), RequestScheduler(config))
+        answers = run_concurrently(lambda: facade.create(prompt=REQUEST['prompt'], cache=False).message)
+    assert server.hits == {'completion': 1}
+    assert len(set(answers)) == 1
+    assert facade.cache.stats['coalesced'] == CALLERS - 1
+
+
+def test_failed_leader_does_not_poison_followers():
+    cache = ResponseCache(APIConfiguration())
+    calls = []
+    started = threading.Event()
+
+    def create() -> dict:
+        calls.append(None)
+        started.set()
+        # Keep every call in flight until all the callers wait for it
+        time.sleep(0.2)
+        if len(calls) == 1:
+            raise ConnectionError('upstream reset the connection')
+        return {'id': 'cmpl-2', 'choices': [{'text': 'unos 40 mil pesos'}]}
+
+    def leader() -> dict:
+        return cache.get_or_create(REQUEST, create)
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as threads:
+        first = threads.submit(leader)
+        started.wait()
+        followers = [threads.submit(cache.get_or_create, REQUEST, create) for _ in range(CALLERS - 1)]
+        with pytest.raises(ConnectionError):
+            first.result()
+        answers = [follower.result() for follower in followers]
+
+    # The followers share one new call instead of failing with the leader, and the error is not cached
+    assert len(calls) == 2
+    assert all(answer['id'] == 'cmpl-2' for answer in answers)
+    assert cache.get_or_create(REQUEST, create)['id'] == 'cmpl-2'
+    assert len(calls) == 2
+
+
+def test_failed_async_leader_does_not_poison_followers():
+    cache = ResponseCache(APIConfiguration())
+    calls = []
+
+    async def create() -> dict:
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        if len(calls) == 1:
+            raise ConnectionError('upstream reset the connection')
+        return {'id': 'chatcmpl-2'}
+
+    async def run() -> list:
+        return await asyncio.gather(*(cache.aget_or_create(REQUEST, create) for _ in range(CALLERS)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], ConnectionError)
+    assert all(result == {'id': 'chatcmpl-2'} for result in results[1:])
+    assert len(calls) == 2
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from domain.chat_bot.chat import Chat
+from domain.chat_bot.i_message_router import IMessageRouter
+from domain.chat_bot.message import Message
+from domain.chat_bot.route import Route
+from infrastructure.chat_bot.async_chat_engine_impl import AsyncChatEngine
+
+GREETING = Route('greeting', answer='Hola, ¿en que zona buscas casa?')
+SHORT = Route('short', max_tokens=20, context_messages=2)
+
+
+class FixedRouter(IMessageRouter):
+
+    def __init__(self, route: Route):
+        self.fixed_route = route
+        self.routed = 0
+
+    @property
+    def needs_classification(self) -> bool:
+        return False
+
+    def route(self, msg: Message, *, classify=None) -> Route:
+        self.routed += 1
+        return self.fixed_route
+
+    def record(self, route, *, calls_saved: int, tokens_saved: int):
+        return None
+
+
+def chat_for(server: StubServer, route: Route) -> Chat:
+    config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base)
+    chat = Chat(config=config, router=FixedRouter(route))
+    chat.add(Message.from_user('Hola'))
+    return chat
+
+
+@pytest.mark.parametrize('route', [GREETING, SHORT])
+def test_streamed_turns_are_routed(route):
+    with StubServer() as server:
+        chat = chat_for(server, route)
+        turn = chat.stream_message_response()
+        deltas = list(turn)
+    assert chat.router.routed == 1
+    if route.is_canned:
+        assert deltas == [route.answer]
+        assert server.hits == {}
+    else:
+        assert turn.message.content == 'Respuesta de prueba sobre bienes raices. '
+        assert server.hits == {'chat': 1}
+
+
+@pytest.mark.parametrize('route', [GREETING, SHORT])
+def test_async_streamed_turns_are_routed(route):
+    async def main() -> list[str]:
+        async with StubServer() as server:
+            chat = chat_for(server, route)
+            async with AsyncChatEngine(chat.config) as engine:
+                turn = engine.stream_message_response(chat)
+                deltas = [delta async for delta in turn]
+        assert server.hits == ({} if route.is_canned else {'chat': 1})
+        assert chat.router.routed == 1
+        return deltas
+
+    deltas = asyncio.run(main())
+    if route.is_canned:
+        assert deltas == [route.answer]
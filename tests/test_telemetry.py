@@ -0,0 +1,33 @@
+from benchmarks.stub_server import StubServer
+from config import APIConfiguration
+from infrastructure.cache.response_cache_impl import ResponseCache
+from infrastructure.completion.completion_facade_impl import CompletionFacadeImpl
+from infrastructure.dalle_img.img_pipeline_impl import ImgPipeline
+from infrastructure.scheduler.request_scheduler_impl import RequestScheduler
+from infrastructure.telemetry.telemetry_impl import Telemetry
+
+
+def test_completions_count_their_tokens_per_model():
+    telemetry = Telemetry(APIConfiguration())
+    with StubServer() as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, MODEL='text-davinci-003',
+                                  TEMPERATURE='0')
+        facade = CompletionFacadeImpl(config, ResponseCache(config), RequestScheduler(config), telemetry)
+        completion = facade.create(prompt='Describe una casa en Puebla')
+        facade.create(prompt='Describe una casa en Puebla')
+        # The second completion is served from the cache, so its tokens are not counted again
+        assert telemetry.counter('tokens', model='text-davinci-003', kind='prompt') == completion.usage['prompt_tokens']
+        facade.create_many([f'Describe la colonia {n} de Puebla' for n in range(4)])
+    assert telemetry.histogram('span_seconds', span='completion').count == 2
+    assert telemetry.histogram('span_seconds', span='completion_batch').count == 1
+    assert telemetry.counter('tokens', model='text-davinci-003', kind='prompt') > 0
+    assert telemetry.counter('cost_usd', model='text-davinci-003') > 0
+
+
+def test_image_requests_are_timed_and_counted(tmp_path):
+    telemetry = Telemetry(APIConfiguration())
+    with StubServer(image_size=1024) as server:
+        config = APIConfiguration(OPEN_AI_TOKEN='stub', OPEN_AI_API_BASE=server.api_base, IMG_DIR=str(tmp_path))
+        ImgPipeline(config, telemetry=telemetry).generate(['Casa en Merida', 'Casa en Puebla'], size='256x256')
+    assert telemetry.histogram('span_seconds', span='image').count == 2
+    assert telemetry.counter('images', size='256x256') == 2